@@ -1,10 +1,59 @@
+import os
 from flask import Flask
 from .routes import register_routes
+from .experts.registry import ExpertRegistry
+from .pipeline.orchestrator import ExpertOrchestrator
+from .pipeline.result_cache import create_result_cache
+from .pipeline.service import IdentificationService
+from .pipeline.jobs import JobQueue
+from .persistence import IdentificationStore, ImageUploader
+from .telemetry import configure_logging, instrument_app
+from .warmup import WarmUp
 from flask_cors import CORS
+from utils.image_fetch import ImageFetcher
 
-def create_app():
+def create_app(registry=None, store=None, uploader=None):
+    """
+    Build the Flask app. `registry`, `store` and `uploader` can be passed in to
+    run the pipeline against stand-in experts, Firestore and Cloud Storage (see bench/).
+    """
+    configure_logging()
     app = Flask(__name__)
     CORS(app, supports_credentials=True)
+    instrument_app(app)
+
+    # Handlers (and the logo model) are built once and shared by all requests
+    registry = registry or ExpertRegistry()
+    app.extensions["expert_registry"] = registry
+    orchestrator = ExpertOrchestrator(registry)
+    fetcher = ImageFetcher()
+    cache = create_result_cache()
+    store = store or IdentificationStore()
+    # Keeps images uploaded straight to /identify, when UPLOAD_STORAGE_BUCKET is set
+    uploader = uploader or ImageUploader()
+    service = IdentificationService(fetcher, orchestrator, cache, store, uploader)
+    app.extensions["expert_orchestrator"] = orchestrator
+    app.extensions["image_fetcher"] = fetcher
+    app.extensions["result_cache"] = cache
+    app.extensions["identification_store"] = store
+    app.extensions["image_uploader"] = uploader
+    app.extensions["identification_service"] = service
+    # Background workers for POST /identify with "async": true
+    app.extensions["job_queue"] = JobQueue(service.run_job)
+
+    # Heavy SDKs, the logo model and the Firestore client load in the background
+    # unless EXPERT_WARMUP=sync; requests arriving earlier build what they need lazily.
+    # Steps in EXPERT_WARMUP_DEFER wait for app.lifecycle.after_fork in each worker
+    deferred = [name for name in os.getenv("EXPERT_WARMUP_DEFER", "").split(",") if name]
+    warm_up = WarmUp(registry.warm_up_steps() + [("firestore", lambda: store.client)], deferred)
+    app.extensions["warm_up"] = warm_up
+    mode = os.getenv("EXPERT_WARMUP", "background")
+    if mode == "0":
+        warm_up.skip()
+    elif mode == "sync":
+        warm_up.run()
+    else:
+        warm_up.start()
 
     register_routes(app)
 
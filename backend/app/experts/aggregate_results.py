@@ -1,17 +1,13 @@
-import os
-from openai import OpenAI
 import re
-from dotenv import load_dotenv
 import json
+from app.providers import get_provider, shared_openai_client
+from app.telemetry import record_openai_usage
 
 class AggregateResults:
-    def __init__(self):
-        load_dotenv('.env.local')
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
-
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, client=None, provider=None):
+        # Pooled client and rate limiting/retries shared with the OpenAI expert
+        self.client = client or shared_openai_client()
+        self.provider = provider or get_provider("openai")
     
     def aggregate_experts(self, openai_result, gemini_result, custom_model_result):
         """
@@ -36,28 +32,24 @@ Analyze these results and provide a final determination.
 - If there's agreement between OpenAI and Gemini, that should generally be your answer.
 - If there's disagreement, use your judgment based on the confidence levels and details provided.
 
-Once you've identified the car, provide 2-3 interesting facts about this specific model to include in details field, such as:
-- Historical significance or notable innovations
-- Performance specifications or special features
-- Cultural impact or appearances in popular media
-- Any unusual or unique aspects of this particular model
-
 Return a JSON object with these keys:
 - make: the final determination of the car's manufacturer
 - model: the final determination of the car model
 - year: the estimated year or generation
 - confidence: your overall confidence (high, medium, low)
 - details: a brief explanation of your reasoning, mentioning which experts agreed
-- insights: this is an innovative feature, give cool details and insights into the car such as mods to be made etc.."
 
 Respond ONLY with valid JSON. No markdown, no text outside of JSON.
 """
 
-            response = self.client.chat.completions.create(
+            response = self.provider.call(
+                "gpt-4o",
+                self.client.chat.completions.create,
                 model="gpt-4o",
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=400
+                max_tokens=200
             )
+            record_openai_usage(response, "gpt-4o")
 
             raw = response.choices[0].message.content
             cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip(), flags=re.IGNORECASE)
@@ -99,5 +91,21 @@ Respond ONLY with valid JSON. No markdown, no text outside of JSON.
                     "custom_model": custom_model_result
                 }
             }
-    
-   
\ No newline at end of file
+
+    def generate_insights(self, make, model, year):
+        """Short enthusiast insights for an already identified car"""
+        response = self.provider.call(
+            "gpt-4o",
+            self.client.chat.completions.create,
+            model="gpt-4o",
+            messages=[{
+                "role": "user",
+                "content": (
+                    f"Give 2-3 interesting facts and cool insights (such as popular mods) about the "
+                    f"{year} {make} {model}. Respond with a single short paragraph of plain text."
+                )
+            }],
+            max_tokens=200
+        )
+        record_openai_usage(response, "gpt-4o")
+        return response.choices[0].message.content.strip()
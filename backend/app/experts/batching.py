@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from app.telemetry import METRICS
+
+BATCH_SIZE = METRICS.histogram(
+    "kachow_logo_batch_size", "Images per batched logo model forward pass", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+
+class BatchingPredictor:
+    """
+    Dynamic batching queue in front of a model.
+
+    Concurrent callers each submit one sample; a background thread collects
+    samples until `max_batch_size` is reached or the oldest one has waited
+    `max_wait_ms`, runs them through a single batched forward pass and hands
+    each caller its own row of the output through a future.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=16, max_wait_ms=5):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._largest_batch = 0
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="logo-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, sample):
+        """Queue one sample and return a future for its row of the batched output"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((sample, future))
+        return future
+
+    def predict(self, sample, timeout=None):
+        return self.submit(sample).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Callers that gave up (cancelled their future) are dropped from the batch
+            live = [(sample, future) for sample, future in self._collect()
+                    if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            samples = [sample for sample, _ in live]
+            futures = [future for _, future in live]
+
+            with self._stats_lock:
+                self._requests += len(samples)
+                self._batches += 1
+                self._largest_batch = max(self._largest_batch, len(samples))
+            BATCH_SIZE.observe(len(samples))
+
+            try:
+                outputs = self.predict_batch(np.stack(samples))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch_size": self._requests / self._batches if self._batches else 0.0,
+                "largest_batch_size": self._largest_batch,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
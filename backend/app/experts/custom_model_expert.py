@@ -1,56 +1,109 @@
 import os
+import threading
 import numpy as np
-import tensorflow as tf
-import requests
-from io import BytesIO
-from tensorflow.keras.models import load_model
-from tensorflow.keras.utils import img_to_array, load_img
+from app.experts.batching import BatchingPredictor
+from app.experts.logo_runtime import load_runtime, softmax
+from app.telemetry import METRICS, span
 
 class CustomModelHandler:
-    def __init__(self):
+    def __init__(self, model_path=None, runtime=None, model=None):
         # Make sure paths are correct relative to this script
         base_dir = os.path.dirname(__file__)
-        model_path = os.path.join(base_dir, 'car_logo_identifier_model.h5')
         classes_path = os.path.join(base_dir, 'car_classes.txt')
 
-        self.model = load_model(model_path)
+        # Guards the model reference so reload() can swap it under live traffic
+        self._lock = threading.Lock()
+        # keras, tflite or onnx; the latter two don't import TensorFlow at serve time
+        self.model = model or load_runtime(runtime, model_path)
         self.classes = self.load_classes(classes_path)
 
+        # Concurrent requests share one batched forward pass instead of predicting one by one
+        self.batcher = None
+        if os.getenv("CUSTOM_MODEL_BATCHING", "1") != "0":
+            self.batcher = BatchingPredictor(
+                self._predict_rows,
+                max_batch_size=int(os.getenv("CUSTOM_MODEL_MAX_BATCH", "16")),
+                max_wait_ms=float(os.getenv("CUSTOM_MODEL_MAX_WAIT_MS", "5"))
+            )
+            METRICS.gauge("kachow_logo_batch_queue_depth", "Images waiting for the logo model",
+                          callback=lambda: self.batcher.stats()["queue_depth"])
+
     def load_classes(self, filepath):
         with open(filepath, 'r') as f:
             return [line.strip() for line in f.readlines()]
+
+    def reload(self, model_path=None, runtime=None):
+        """Load a model file and swap it in; the old model keeps serving if loading fails"""
+        model = load_runtime(runtime or self.model.name, model_path or self.model.model_path)
+        with self._lock:
+            self.model = model
+
+    def warm_up(self):
+        """Run one dummy prediction so the first real request doesn't trace the graph"""
+        with self._lock:
+            self.model.predict(np.zeros((1, 224, 224, 3), dtype=np.float32))
     
-    def identify_car(self, image_url: str):
-        try:
-            # Download image
-            response = requests.get(image_url)
-            response.raise_for_status()
+    def predict_batch(self, batch):
+        """Run a (N, 224, 224, 3) batch through the model and return softmax scores"""
+        with self._lock, span("logo_predict", batch_size=len(batch)):
+            predictions = self.model.predict(batch)
+        return softmax(predictions)
 
-            # Preprocess
-            img = load_img(BytesIO(response.content), target_size=(224, 224))
-            img_array = img_to_array(img)
-            img_array = np.expand_dims(img_array, axis=0)
+    def _result(self, score):
+        predicted_class = self.classes[np.argmax(score)]
+        confidence = 100 * np.max(score)
 
-            # Predict
-            predictions = self.model.predict(img_array)
-            score = tf.nn.softmax(predictions[0])
+        return {
+            "make": predicted_class,
+            "model": "Unknown", 
+            "year": "Unknown",
+            "confidence": f"{confidence:.2f}%",
+            "details": f"Predicted brand based on logo with {confidence:.2f}% confidence."
+        }
+
+    @staticmethod
+    def _error(e):
+        return {
+            "make": "Error",
+            "model": "Error",
+            "year": "Unknown",
+            "confidence": "none",
+            "error": str(e)
+        }
 
-            predicted_class = self.classes[np.argmax(score)]
-            confidence = 100 * np.max(score)
+    def predict_batch_with_embeddings(self, batch):
+        """
+        Like predict_batch, also returning the penultimate-layer embeddings from
+        the same forward pass (None if the runtime doesn't expose them)
+        """
+        with self._lock, span("logo_predict", batch_size=len(batch)):
+            if hasattr(self.model, "predict_with_embedding"):
+                predictions, embeddings = self.model.predict_with_embedding(batch)
+            else:
+                predictions, embeddings = self.model.predict(batch), None
+        return softmax(predictions), embeddings
+
+    def _predict_rows(self, batch):
+        """(score, embedding) per image, for the micro-batcher"""
+        scores, embeddings = self.predict_batch_with_embeddings(batch)
+        if embeddings is None:
+            return [(score, None) for score in scores]
+        return list(zip(scores, embeddings))
+
+    def identify_car(self, image):
+        try:
+            # 224x224 view built once when the image was fetched (nearest resize, as keras load_img does)
+            img_array = image.logo_array
+
+            # Predict
+            if self.batcher:
+                score, embedding = self.batcher.predict(img_array)
+            else:
+                score, embedding = self._predict_rows(np.expand_dims(img_array, axis=0))[0]
 
-            return {
-                "make": predicted_class,
-                "model": "Unknown", 
-                "year": "Unknown",
-                "confidence": f"{confidence:.2f}%",
-                "details": f"Predicted brand based on logo with {confidence:.2f}% confidence."
-            }
+            # Kept on the image for the nearest-neighbour index
+            image.logo_embedding = embedding
+            return self._result(score)
 
         except Exception as e:
-            return {
-                "make": "Error",
-                "model": "Error",
-                "year": "Unknown",
-                "confidence": "none",
-                "error": str(e)
-            }
\ No newline at end of file
+            return self._error(e)
@@ -1,12 +1,29 @@
 import os
 import json
-import requests
 from dotenv import load_dotenv
 from google import generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from app.providers import get_provider
+from app.providers.hedging import Hedger
+from app.telemetry import record_gemini_usage
+
+# Identification only needs a few short JSON fields; insights are generated separately, once per car
+MAX_OUTPUT_TOKENS = int(os.getenv("EXPERT_MAX_TOKENS", "200"))
 
 class GeminiHandler:
-    def __init__(self):
+    MODEL_NAME = "gemini-2.0-flash-lite"
+
+    def __init__(self, model=None, provider=None):
+        # Rate limiting, retries and circuit breaking for Gemini calls
+        self.provider = provider or get_provider("gemini")
+        # Slow calls are raced against a duplicate, or GEMINI_HEDGE_MODEL
+        self.hedger = Hedger("gemini")
+        self.hedge_model_name = self.hedger.fallback_model or self.MODEL_NAME
+        if model is not None:
+            self.model = model
+            self.hedge_model = model
+            return
+
         load_dotenv('.env.local')
 
         api_key = os.getenv('GEMINI_API_KEY')
@@ -15,8 +32,16 @@ class GeminiHandler:
 
         genai.configure(api_key=api_key)
 
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-lite",
+        self.model = self._build_model(self.MODEL_NAME)
+        if self.hedge_model_name == self.MODEL_NAME:
+            self.hedge_model = self.model
+        else:
+            self.hedge_model = self._build_model(self.hedge_model_name)
+
+    @staticmethod
+    def _build_model(model_name):
+        return genai.GenerativeModel(
+            model_name=model_name,
             safety_settings={
                 HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
                 HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
@@ -25,21 +50,22 @@ class GeminiHandler:
             }
         )
 
-    def identify_car(self, image_url, context=None):
+    def identify_car(self, image, context=None):
         """
-        Identify a car from an image URL, with optional context from other experts
+        Identify a car from a PreparedImage, with optional context from other experts
         """
         if context:
-            return self.identify_car_with_context(image_url, context)
+            call = lambda model, name: self.identify_car_with_context(image, context, model, name)
         else:
-            return self.identify_car_initial(image_url)
+            call = lambda model, name: self.identify_car_initial(image, model, name)
+        return self.hedger.call(
+            lambda: call(self.model, self.MODEL_NAME),
+            lambda: call(self.hedge_model, self.hedge_model_name),
+        )
         
-    def identify_car_initial(self, image_url):
+    def identify_car_initial(self, image, model=None, model_name=MODEL_NAME):
         """Initial car identification without context from other experts"""
         try:
-            # Download image as bytes
-            response = requests.get(image_url)
-            image_bytes = response.content
 
             prompt_text = """
             Examine this car image and identify:
@@ -57,12 +83,13 @@ class GeminiHandler:
                 "year": "Year or generation",
                 "confidence": "high/medium/low",
                 "details": "Brief explanation of your identification"
-                "insights: this is an innovative feature, give cool details and insights into the car such as mods to be made etc..""
             }
             """
 
             # Pass image as inline bytes
-            result = self.model.generate_content(
+            result = self.provider.call(
+                model_name,
+                (model or self.model).generate_content,
                 contents=[
                     {
                         "role": "user",
@@ -70,8 +97,8 @@ class GeminiHandler:
                             {"text": prompt_text},
                             {
                                 "inline_data": {
-                                    "mime_type": "image/jpeg",
-                                    "data": image_bytes
+                                    "mime_type": image.llm_mime_type,
+                                    "data": image.llm_data
                                 }
                             }
                         ]
@@ -80,10 +107,11 @@ class GeminiHandler:
                 generation_config={
                     "temperature": 0.2,
                     "top_p": 0.95,
-                    "max_output_tokens": 1024,
+                    "max_output_tokens": MAX_OUTPUT_TOKENS,
                 }
             )
 
+            record_gemini_usage(result, model_name)
             raw = result.text
             json_start = raw.find('{')
             json_end = raw.rfind('}') + 1
@@ -109,19 +137,19 @@ class GeminiHandler:
                 "error": str(e)
             }
             
-    def identify_car_with_context(self, image_url, context):
+    def identify_car_with_context(self, image, context, model=None, model_name=MODEL_NAME):
         """Car identification with context from other experts (blackboard approach)"""
+        # The orchestrator sends a compact text summary; raw result dicts are still accepted
+        if not isinstance(context, str):
+            context = json.dumps(context, indent=2)
         try:
-            # Download image as bytes
-            response = requests.get(image_url)
-            image_bytes = response.content
 
             prompt_text = f"""
             You are an expert car identifier in a blackboard AI system.
             Other AI experts have already analyzed this image and provided their opinions.
             Here's what they identified:
 
-            {json.dumps(context, indent=2)}
+            {context}
 
             Now I want you to analyze the image again, considering this information.
             You should form your own expert opinion, but take into account what others have observed.
@@ -132,13 +160,14 @@ class GeminiHandler:
             - year: estimated year or generation
             - confidence: high, medium, or low
             - details: a short sentence explaining your reasoning, and mention if/why you disagree with others
-            - insights: give cool facts and insights about the car, things like car mods etc (this is our innovative feature)
 
             Respond ONLY in this JSON format with no additional text.
             """
 
             # Pass image as inline bytes
-            result = self.model.generate_content(
+            result = self.provider.call(
+                model_name,
+                (model or self.model).generate_content,
                 contents=[
                     {
                         "role": "user",
@@ -146,8 +175,8 @@ class GeminiHandler:
                             {"text": prompt_text},
                             {
                                 "inline_data": {
-                                    "mime_type": "image/jpeg",
-                                    "data": image_bytes
+                                    "mime_type": image.llm_mime_type,
+                                    "data": image.llm_data
                                 }
                             }
                         ]
@@ -156,10 +185,11 @@ class GeminiHandler:
                 generation_config={
                     "temperature": 0.2,
                     "top_p": 0.95,
-                    "max_output_tokens": 1024,
+                    "max_output_tokens": MAX_OUTPUT_TOKENS,
                 }
             )
 
+            record_gemini_usage(result, model_name)
             raw = result.text
             json_start = raw.find('{')
             json_end = raw.rfind('}') + 1
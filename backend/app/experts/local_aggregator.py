@@ -0,0 +1,188 @@
+import os
+import re
+from app.experts.result_utils import EXPERT_LABELS, confidence_level, is_error, normalize_label
+
+CONFIDENCE_WEIGHTS = {"high": 1.0, "medium": 0.6, "low": 0.3, "none": 0.0}
+
+
+def labels_equivalent(a, b, field="model"):
+    """
+    Whether two make/model names are the same vote. Names are compared after
+    normalising case, spacing and punctuation ('F150' == 'F-150'), and one may
+    extend the other by whole trailing words: a make by a longer name
+    ('Mercedes' == 'Mercedes-Benz'), a model by a trim ('Civic' == 'Civic Type R',
+    'Mustang' == 'Mustang GT'). Names that differ in a digit or a
+    single-character token never match, so '3 Series' != '5 Series',
+    'Model 3' != 'Model Y', 'Model S' != 'Model X' and 'CX-5' != 'CX-9';
+    nor do names that only share a trailing word ('Cherokee' != 'Grand Cherokee').
+    """
+    a, b = normalize_label(a), normalize_label(b)
+    if not a or not b:
+        return False
+    if re.findall(r"\d+", a) != re.findall(r"\d+", b):
+        return False
+    if a.replace(" ", "") == b.replace(" ", ""):
+        return True
+    shorter, longer = sorted((a.split(), b.split()), key=len)
+    extra = longer[len(shorter):]
+    if longer[:len(shorter)] != shorter:
+        return False
+    if field == "make":
+        return all(len(token) > 1 and not token.isdigit() for token in extra)
+    # A trim may end in a letter ('Type R') but isn't just one ('Model' / 'Model S')
+    return any(len(token) > 1 for token in extra)
+
+
+def custom_model_score(result):
+    """The logo model's '87.52%' confidence as a 0-1 float"""
+    match = re.match(r"\s*([\d.]+)\s*%", str(result.get("confidence", "")))
+    return float(match.group(1)) / 100 if match else 0.0
+
+
+class LocalAggregator:
+    """
+    Rule-based weighted vote over the expert results, used instead of the
+    GPT-4o aggregation call whenever the experts don't genuinely conflict.
+
+    OpenAI and Gemini vote on make and model weighted by their stated
+    confidence; the custom model votes on make only, weighted by its softmax
+    score, which also breaks ties between the LLM experts.
+    """
+
+    def __init__(self, llm_weight=None, custom_model_weight=None, min_share=None):
+        self.llm_weight = llm_weight or float(os.getenv("LOCAL_AGGREGATOR_LLM_WEIGHT", "1.0"))
+        self.custom_model_weight = custom_model_weight or float(os.getenv("LOCAL_AGGREGATOR_CUSTOM_WEIGHT", "0.5"))
+        self.min_share = min_share or float(os.getenv("LOCAL_AGGREGATOR_MIN_SHARE", "0.6"))
+
+    def _votes(self, openai_result, gemini_result, custom_model_result):
+        votes = []
+        for name, result in (("openai", openai_result), ("gemini", gemini_result)):
+            if is_error(result):
+                continue
+            weight = self.llm_weight * CONFIDENCE_WEIGHTS[confidence_level(result)]
+            if weight > 0:
+                votes.append({"expert": name, "result": result, "weight": weight, "has_model": True})
+
+        if not is_error(custom_model_result):
+            weight = self.custom_model_weight * custom_model_score(custom_model_result)
+            if weight > 0:
+                votes.append({"expert": "custom_model", "result": custom_model_result,
+                              "weight": weight, "has_model": False})
+        return votes
+
+    def _cluster(self, votes, field):
+        """Group votes whose `field` names the same make/model, heaviest group first"""
+        clusters = []
+        for vote in votes:
+            for cluster in clusters:
+                if labels_equivalent(cluster["votes"][0]["result"].get(field), vote["result"].get(field), field):
+                    cluster["votes"].append(vote)
+                    cluster["weight"] += vote["weight"]
+                    break
+            else:
+                clusters.append({"votes": [vote], "weight": vote["weight"]})
+        return sorted(clusters, key=lambda cluster: cluster["weight"], reverse=True)
+
+    def aggregate_experts(self, openai_result, gemini_result, custom_model_result):
+        """
+        Combine the expert results by weighted vote. The result always has
+        aggregation_mode='local'; 'conflict' is True when the vote couldn't
+        settle the answer and an LLM should arbitrate.
+        """
+        expert_results = {
+            "openai": openai_result,
+            "gemini": gemini_result,
+            "custom_model": custom_model_result
+        }
+        votes = self._votes(openai_result, gemini_result, custom_model_result)
+        total = sum(vote["weight"] for vote in votes)
+
+        make_clusters = self._cluster(votes, "make")
+        if not make_clusters:
+            return self._conflict("No expert returned a usable identification", expert_results)
+
+        winner = make_clusters[0]
+        if len(make_clusters) > 1 and make_clusters[1]["weight"] == winner["weight"]:
+            # Tie between LLM experts: whichever side the logo model is on wins
+            tied = [cluster for cluster in make_clusters if cluster["weight"] == winner["weight"]]
+            backed = [cluster for cluster in tied
+                      if any(vote["expert"] == "custom_model" for vote in cluster["votes"])]
+            if len(backed) != 1:
+                return self._conflict("Experts are evenly split on the make", expert_results)
+            winner = backed[0]
+        elif len(make_clusters) > 1 and winner["weight"] / total < self.min_share:
+            return self._conflict("Experts disagree on the make", expert_results)
+
+        model_votes = [vote for vote in winner["votes"] if vote["has_model"]]
+        model_clusters = self._cluster(model_votes, "model")
+        if not model_clusters:
+            return self._conflict("Only the logo model identified the make", expert_results)
+        model_winner = model_clusters[0]
+        if len(model_clusters) > 1 and model_winner["weight"] / sum(c["weight"] for c in model_clusters) < self.min_share:
+            return self._conflict("Experts agree on the make but not the model", expert_results)
+
+        lead = max(model_winner["votes"], key=lambda vote: vote["weight"])["result"]
+        year = next(
+            (vote["result"]["year"] for vote in sorted(model_winner["votes"], key=lambda v: -v["weight"])
+             if vote["result"].get("year") and str(vote["result"]["year"]).lower() != "unknown"),
+            "Unknown"
+        )
+
+        # Share of the weight every expert could have contributed at full confidence
+        max_weight = 2 * self.llm_weight + self.custom_model_weight
+        support = (model_winner["weight"] + sum(
+            vote["weight"] for vote in winner["votes"] if not vote["has_model"]
+        )) / max_weight
+        confidence = "high" if support >= 0.7 else "medium" if support >= 0.4 else "low"
+
+        agreeing = [EXPERT_LABELS[vote["expert"]] for vote in winner["votes"]
+                    if not vote["has_model"] or vote in model_winner["votes"]]
+        return {
+            "make": lead.get("make"),
+            "model": lead.get("model"),
+            "year": year,
+            "confidence": confidence,
+            "details": f"Weighted vote: {', '.join(agreeing)} agreed on {lead.get('make')} {lead.get('model')}.",
+            "insights": lead.get("insights", ""),
+            "aggregation_mode": "local",
+            "conflict": False,
+            "expert_results": expert_results
+        }
+
+    def strongest_answer(self, openai_result, gemini_result, custom_model_result, reason):
+        """
+        The single heaviest expert vote as a low-confidence answer, for when a
+        conflict can't be arbitrated; None if no expert gave a usable answer.
+        """
+        votes = self._votes(openai_result, gemini_result, custom_model_result)
+        if not votes:
+            return None
+        strongest = max(votes, key=lambda vote: (vote["has_model"], vote["weight"]))
+        result = strongest["result"]
+        return {
+            "make": result.get("make"),
+            "model": result.get("model", "Unknown") if strongest["has_model"] else "Unknown",
+            "year": result.get("year", "Unknown") if strongest["has_model"] else "Unknown",
+            "confidence": "low",
+            "details": f"{reason}; showing the strongest single answer, from {EXPERT_LABELS[strongest['expert']]}.",
+            "insights": result.get("insights", ""),
+            "aggregation_mode": "fallback",
+            "conflict": False,
+            "expert_results": {
+                "openai": openai_result,
+                "gemini": gemini_result,
+                "custom_model": custom_model_result
+            }
+        }
+
+    def _conflict(self, reason, expert_results):
+        return {
+            "make": "Unknown",
+            "model": "Unknown",
+            "year": "Unknown",
+            "confidence": "low",
+            "details": reason,
+            "aggregation_mode": "local",
+            "conflict": True,
+            "expert_results": expert_results
+        }
@@ -0,0 +1,144 @@
+import os
+import threading
+import numpy as np
+
+BASE_DIR = os.path.dirname(__file__)
+
+DEFAULT_MODEL_PATHS = {
+    "keras": os.path.join(BASE_DIR, 'car_logo_identifier_model.h5'),
+    "tflite": os.path.join(BASE_DIR, 'car_logo_identifier_model.tflite'),
+    "onnx": os.path.join(BASE_DIR, 'car_logo_identifier_model.onnx'),
+}
+
+
+with open(os.path.join(BASE_DIR, 'car_classes.txt')) as _classes:
+    NUM_CLASSES = sum(1 for line in _classes if line.strip())
+
+
+def split_outputs(outputs):
+    """
+    (logits, embedding) from an exported model's outputs: the logits are the
+    output with one column per class, the embedding (penultimate layer, if the
+    model was exported with it) is the other one, else None.
+    """
+    outputs = [np.asarray(output, dtype=np.float32) for output in outputs]
+    logits = next((output for output in outputs if output.shape[-1] == NUM_CLASSES), outputs[0])
+    embedding = next((output for output in outputs if output is not logits), None)
+    return logits, embedding
+
+
+def softmax(logits):
+    """Row-wise softmax over a (N, classes) array"""
+    shifted = logits - np.max(logits, axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / np.sum(exp, axis=-1, keepdims=True)
+
+
+class KerasRuntime:
+    """Full TensorFlow/Keras runtime; the reference the lighter runtimes are checked against"""
+
+    name = "keras"
+
+    def __init__(self, model_path):
+        from tensorflow.keras import Model
+        from tensorflow.keras.models import load_model
+
+        self.model_path = model_path
+        self.model = load_model(model_path)
+        # Same forward pass, also returning the penultimate layer as an image embedding
+        self.embedding_model = Model(inputs=self.model.inputs,
+                                     outputs=[self.model.output, self.model.layers[-2].output])
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict(batch, verbose=0))
+
+    def predict_with_embedding(self, batch):
+        logits, embedding = self.embedding_model.predict(batch, verbose=0)
+        return np.asarray(logits), np.asarray(embedding, dtype=np.float32)
+
+
+class TFLiteRuntime:
+    """
+    TFLite interpreter runtime. Uses the standalone LiteRT / tflite_runtime
+    packages when installed so serving doesn't import full TensorFlow.
+    Handles int8-quantized models by (de)quantizing inputs and outputs.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                from tensorflow.lite import Interpreter
+
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        # Models exported with --embedding have a second output
+        self.outputs = self.interpreter.get_output_details()
+        # The interpreter holds per-invocation state and isn't thread-safe
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        return self.predict_with_embedding(batch)[0]
+
+    def predict_with_embedding(self, batch):
+        with self._lock:
+            input_index = self.input["index"]
+            if tuple(self.interpreter.get_input_details()[0]["shape"]) != batch.shape:
+                self.interpreter.resize_tensor_input(input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+
+            scale, zero_point = self.input["quantization"]
+            if scale:
+                batch = np.round(batch / scale + zero_point)
+            self.interpreter.set_tensor(input_index, batch.astype(self.input["dtype"]))
+            self.interpreter.invoke()
+            raw = [(self.interpreter.get_tensor(output["index"]), output["quantization"]) for output in self.outputs]
+
+        outputs = []
+        for output, (scale, zero_point) in raw:
+            if scale:
+                output = (output.astype(np.float32) - zero_point) * scale
+            outputs.append(output)
+        return split_outputs(outputs)
+
+
+class ONNXRuntime:
+    """onnxruntime CPU runtime"""
+
+    name = "onnx"
+
+    def __init__(self, model_path):
+        import onnxruntime
+
+        self.model_path = model_path
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.predict_with_embedding(batch)[0]
+
+    def predict_with_embedding(self, batch):
+        return split_outputs(self.session.run(None, {self.input_name: batch.astype(np.float32)}))
+
+
+RUNTIMES = {
+    "keras": KerasRuntime,
+    "tflite": TFLiteRuntime,
+    "onnx": ONNXRuntime,
+}
+
+
+def load_runtime(name=None, model_path=None):
+    """Load the logo model with the named runtime (CUSTOM_MODEL_RUNTIME by default)"""
+    name = name or os.getenv("CUSTOM_MODEL_RUNTIME", "keras")
+    if name not in RUNTIMES:
+        raise ValueError(f"Unknown CUSTOM_MODEL_RUNTIME: {name}")
+    model_path = model_path or os.getenv("CUSTOM_MODEL_PATH") or DEFAULT_MODEL_PATHS[name]
+    return RUNTIMES[name](model_path)
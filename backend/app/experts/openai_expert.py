@@ -1,31 +1,37 @@
 import os
-from openai import OpenAI
 import re
-from dotenv import load_dotenv
 import json
+from app.providers import get_provider, shared_openai_client
+from app.providers.hedging import Hedger
+from app.telemetry import record_openai_usage
 
-class OpenAIHandler:
-    def __init__(self):
-        load_dotenv('.env.local')
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
+# Identification only needs a few short JSON fields; insights are generated separately, once per car
+MAX_TOKENS = int(os.getenv("EXPERT_MAX_TOKENS", "200"))
 
-        self.client = OpenAI(api_key=api_key)
+class OpenAIHandler:
+    def __init__(self, client=None, provider=None):
+        # Pooled client and rate limiting/retries shared with the aggregator
+        self.client = client or shared_openai_client()
+        self.provider = provider or get_provider("openai")
+        self.model_name = "gpt-4o"
+        # Slow calls are raced against a duplicate, or OPENAI_HEDGE_MODEL (e.g. gpt-4o-mini)
+        self.hedger = Hedger("openai")
+        self.hedge_model_name = self.hedger.fallback_model or self.model_name
     
-    def identify_car(self, image_url, context=None):
+    def identify_car(self, image, context=None):
         """
-        Identify a car from an image URL, with optional context from other experts
+        Identify a car from a PreparedImage, with optional context from other experts
         """
         if context:
-            return self.identify_car_with_context(image_url, context)
+            call = lambda model: self.identify_car_with_context(image, context, model)
         else:
-            return self.identify_car_initial(image_url)
+            call = lambda model: self.identify_car_initial(image, model)
+        return self.hedger.call(lambda: call(self.model_name), lambda: call(self.hedge_model_name))
             
-    def identify_car_initial(self, image_url):
+    def identify_car_initial(self, image, model="gpt-4o"):
         """Initial car identification without context from other experts"""
         try:
-            response = self.client.chat.completions.create(model="gpt-4o",
+            response = self.provider.call(model, self.client.chat.completions.create, model=model,
             messages=[
                 {
                     "role": "user",
@@ -41,15 +47,15 @@ class OpenAIHandler:
                                 "- year: estimated year or generation\n"
                                 "- confidence: high, medium, or low\n"
                                 "- details: a short sentence explaining your reasoning\n\n"
-                                "- insights: give cool facts and insights about the car, things like car mods etc (this is our innovative feature)"
                                 "Respond ONLY in this JSON format. No explanation outside of it."
                             )
                         },
-                        {"type": "image_url", "image_url": {"url": image_url}}
+                        {"type": "image_url", "image_url": {"url": image.llm_data_url}}
                     ]
                 }
             ],
-            max_tokens=400)
+            max_tokens=MAX_TOKENS)
+            record_openai_usage(response, model)
 
             raw = response.choices[0].message.content
             
@@ -63,10 +69,13 @@ class OpenAIHandler:
         except Exception as e:
             return {"make": "Error", "model": "Error", "year": "Unknown", "confidence": "none", "error": str(e)}
             
-    def identify_car_with_context(self, image_url, context):
+    def identify_car_with_context(self, image, context, model="gpt-4o"):
         """Car identification with context from other experts (blackboard approach)"""
+        # The orchestrator sends a compact text summary; raw result dicts are still accepted
+        if not isinstance(context, str):
+            context = json.dumps(context, indent=2)
         try:
-            response = self.client.chat.completions.create(model="gpt-4o",
+            response = self.provider.call(model, self.client.chat.completions.create, model=model,
             messages=[
                 {
                     "role": "user",
@@ -76,7 +85,7 @@ class OpenAIHandler:
                             "text": (
                                 "You are an expert car identifier in a blackboard AI system. "
                                 "Other AI experts have already analyzed this image and provided their opinions. "
-                                f"Here's what they identified:\n\n{json.dumps(context, indent=2)}\n\n"
+                                f"Here's what they identified:\n\n{context}\n\n"
                                 "Now I want you to analyze the image again, considering this information. "
                                 "You should form your own expert opinion, but take into account what others have observed.\n\n"
                                 "Return a JSON object with the following keys ONLY:\n"
@@ -85,15 +94,15 @@ class OpenAIHandler:
                                 "- year: estimated year or generation\n"
                                 "- confidence: high, medium, or low\n"
                                 "- details: a short sentence explaining your reasoning, and mention if/why you disagree with others\n\n"
-                                "- insights: give cool facts and insights about the car, things like possible car mods etc (this is our innovative feature)"
                                 "Respond ONLY in this JSON format. No explanation outside of it."
                             )
                         },
-                        {"type": "image_url", "image_url": {"url": image_url}}
+                        {"type": "image_url", "image_url": {"url": image.llm_data_url}}
                     ]
                 }
             ],
-            max_tokens=400)
+            max_tokens=MAX_TOKENS)
+            record_openai_usage(response, model)
 
             raw = response.choices[0].message.content
             
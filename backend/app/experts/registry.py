@@ -0,0 +1,92 @@
+import logging
+import threading
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class ExpertRegistry:
+    """
+    Process-wide holder for the expert handlers and the aggregator.
+
+    Each handler is built once, on first use or during warm_up(), and then
+    shared by every request and thread in the process.
+    """
+
+    def __init__(self, factories=None):
+        self._lock = threading.Lock()
+        self._handlers = {}
+        # Optional overrides of how each handler is built, e.g. with stubbed clients
+        self._factories = factories or {}
+
+    def _get(self, name, factory):
+        handler = self._handlers.get(name)
+        if handler is not None:
+            return handler
+
+        factory = self._factories.get(name, factory)
+        with self._lock:
+            # Another thread may have built it while we were waiting
+            handler = self._handlers.get(name)
+            if handler is None:
+                handler = factory()
+                self._handlers[name] = handler
+            return handler
+
+    @property
+    def gemini(self):
+        from app.experts.gemini_expert import GeminiHandler
+        return self._get("gemini", GeminiHandler)
+
+    @property
+    def openai(self):
+        from app.experts.openai_expert import OpenAIHandler
+        return self._get("openai", OpenAIHandler)
+
+    @property
+    def custom_model(self):
+        from app.experts.custom_model_expert import CustomModelHandler
+        return self._get("custom_model", CustomModelHandler)
+
+    @property
+    def aggregator(self):
+        from app.experts.aggregate_results import AggregateResults
+        return self._get("aggregator", AggregateResults)
+
+    @property
+    def local_aggregator(self):
+        from app.experts.local_aggregator import LocalAggregator
+        return self._get("local_aggregator", LocalAggregator)
+
+    def _warm_custom_model(self):
+        # One dummy inference so the first real request doesn't pay for graph tracing
+        self.custom_model.warm_up()
+
+    def warm_up_steps(self):
+        """(name, callable) pairs that build every handler, for app.warmup.WarmUp"""
+        steps = [(name, lambda name=name: getattr(self, name))
+                 for name in ("gemini", "openai", "aggregator", "local_aggregator")]
+        steps.append(("custom_model", self._warm_custom_model))
+        return steps
+
+    def warm_up(self):
+        """
+        Build every handler and warm up the custom model on the calling thread.
+        Failures are reported but not raised; the handler is retried on first use.
+        """
+        for name, step in self.warm_up_steps():
+            try:
+                step()
+            except Exception as e:
+                logger.warning("Warm-up failed", extra={"fields": {"handler": name, "error": str(e)}})
+
+    def reload_custom_model(self, model_path=None):
+        """Load a (possibly new) model file and swap it in without dropping requests"""
+        handler = self.custom_model
+        handler.reload(model_path)
+        handler.warm_up()
+        return handler
+
+
+def get_registry():
+    return current_app.extensions["expert_registry"]
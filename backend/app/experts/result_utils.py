@@ -0,0 +1,34 @@
+import re
+
+CONFIDENCE_LEVELS = ("none", "low", "medium", "high")
+
+# How each expert is named in user-facing details and in prompts to other experts
+EXPERT_LABELS = {
+    "openai": "OpenAI",
+    "gemini": "Gemini",
+    "custom_model": "Custom Model",
+}
+
+
+def normalize_label(value):
+    """Lowercase a make/model string and strip punctuation so 'Mercedes-Benz' == 'mercedes benz'"""
+    if not isinstance(value, str):
+        return ""
+    return re.sub(r"[^a-z0-9]+", " ", value.lower()).strip()
+
+
+def is_error(result):
+    """True if an expert result is missing, failed or couldn't be parsed"""
+    if not isinstance(result, dict) or "error" in result or "raw_text" in result:
+        return True
+    return normalize_label(result.get("make")) in ("", "error", "unknown", "skipped")
+
+
+def confidence_level(result):
+    """The expert's self-reported confidence as one of CONFIDENCE_LEVELS"""
+    level = str(result.get("confidence", "")).strip().lower()
+    return level if level in CONFIDENCE_LEVELS else "none"
+
+
+def labels_match(a, b):
+    return normalize_label(a) != "" and normalize_label(a) == normalize_label(b)
@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from app.providers.hedging import reset_hedge_executor
+
+logger = logging.getLogger(__name__)
+
+_draining = threading.Event()
+
+
+def is_draining():
+    return _draining.is_set()
+
+
+def after_fork(app):
+    """
+    Rebuild the per-process state that doesn't survive fork(): thread pools,
+    background threads, SQLite connections and the Firestore gRPC channel.
+    Everything else built before the fork (the experts, the logo model,
+    tokenizers and SDK clients) stays shared copy-on-write with the parent.
+    Warm-up steps deferred past the fork (EXPERT_WARMUP_DEFER) run last.
+    """
+    _draining.clear()
+    extensions = app.extensions
+    extensions["expert_orchestrator"].after_fork()
+    extensions["job_queue"].after_fork()
+    extensions["identification_store"].after_fork()
+    extensions["image_uploader"].after_fork()
+    cache = extensions["result_cache"]
+    if hasattr(cache, "after_fork"):
+        cache.after_fork()
+    reset_hedge_executor()
+    extensions["warm_up"].run_deferred()
+
+
+def drain(app, timeout=30.0):
+    """
+    Graceful shutdown: fail /readyz and refuse new async jobs, wait for the
+    queued and running ones, then flush the Firestore write-behind queue and
+    finish storing uploaded images.
+    In-flight HTTP requests are drained by the server (gunicorn's graceful_timeout).
+    """
+    _draining.set()
+    deadline = time.monotonic() + timeout
+    jobs_done = app.extensions["job_queue"].drain(timeout)
+    writes_done = app.extensions["identification_store"].flush(max(0.0, deadline - time.monotonic()))
+    uploads_done = app.extensions["image_uploader"].flush(max(0.0, deadline - time.monotonic()))
+    if not (jobs_done and writes_done and uploads_done):
+        logger.error("Shutdown drain timed out", extra={"fields": {
+            "jobs_drained": jobs_done, "writes_flushed": writes_done, "uploads_stored": uploads_done
+        }})
+    return jobs_done and writes_done and uploads_done
@@ -0,0 +1,402 @@
+import atexit
+import hashlib
+import logging
+import mimetypes
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from dotenv import load_dotenv
+from flask import current_app
+from app.providers.client import is_retryable
+from app.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+_firebase_lock = threading.Lock()
+
+WRITES = METRICS.counter(
+    "kachow_firestore_writes_total", "Documents written by the write-behind queue, by outcome", ("outcome",)
+)
+BATCH_COMMITS = METRICS.histogram(
+    "kachow_firestore_batch_size", "Documents per Firestore batch commit",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+UPLOADS = METRICS.counter(
+    "kachow_image_uploads_total", "Directly uploaded images written to Cloud Storage, by outcome", ("outcome",)
+)
+
+
+def init_firebase():
+    """Initialise the Firebase app once per process, on first use"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        if not firebase_admin._apps:
+            load_dotenv('.env.local')
+
+            key_path = os.getenv('SERVICE_ACCOUNT_KEY')
+            if not key_path:
+                raise ValueError("SERVICE_ACCOUNT_KEY not found in environment variables")
+
+            cred = credentials.Certificate(key_path)
+            firebase_admin.initialize_app(cred)
+
+
+class WriteBehindQueue:
+    """
+    Buffers document writes and commits them to Firestore in batches from a
+    background thread, so requests don't wait on the round trip. A batch is
+    committed once max_batch writes are queued or the oldest has waited
+    max_delay seconds; transient failures are retried with backoff, and a batch
+    that still fails is put back at the head of the queue rather than dropped.
+    Writes are committed in the order they were queued.
+    """
+
+    # Pause before retrying a requeued batch, so an outage isn't hammered
+    REQUEUE_DELAY = 5.0
+
+    def __init__(self, client_factory, max_batch=None, max_delay=None, max_retries=None):
+        self._client_factory = client_factory
+        # Firestore caps a batch at 500 writes
+        self.max_batch = min(500, max_batch or int(os.getenv("FIRESTORE_BATCH_SIZE", "100")))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("FIRESTORE_FLUSH_MS", "50")) / 1000
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("FIRESTORE_MAX_RETRIES", "5"))
+        self._pending = deque()
+        self._pending_paths = Counter()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        METRICS.gauge("kachow_firestore_pending_writes", "Writes waiting in the write-behind queue",
+                      callback=lambda: len(self._pending) + self._in_flight)
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+            self._thread.start()
+
+    def set(self, doc_ref, fields, merge=False):
+        self.set_many([(doc_ref, fields)], merge=merge)
+
+    def set_many(self, writes, merge=False):
+        """Queue several (doc_ref, fields) writes at once, so they land in the same commit when they fit"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self._ensure_started()
+            now = time.monotonic()
+            for doc_ref, fields in writes:
+                self._pending.append((now, doc_ref, fields, merge))
+                self._pending_paths[doc_ref.path] += 1
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+
+    def after_fork(self):
+        """The writer thread doesn't survive fork(); start over with fresh state in the child"""
+        self._pending = deque()
+        self._pending_paths = Counter()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def has_pending(self, path):
+        with self._cond:
+            return self._pending_paths[path] > 0
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._pending:
+                    oldest = self._pending[0][0]
+                    wait = oldest + self.max_delay - time.monotonic()
+                    if len(self._pending) >= self.max_batch or wait <= 0 or self._closed:
+                        break
+                    self._cond.wait(wait)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            self._in_flight = len(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            if not self._commit(batch):
+                with self._cond:
+                    self._pending.extendleft(reversed(batch))
+                    self._in_flight = 0
+                    self._cond.notify_all()
+                time.sleep(self.REQUEUE_DELAY)
+                continue
+            with self._cond:
+                for _, doc_ref, _, _ in batch:
+                    self._pending_paths[doc_ref.path] -= 1
+                    if not self._pending_paths[doc_ref.path]:
+                        del self._pending_paths[doc_ref.path]
+                self._in_flight = 0
+                self._cond.notify_all()
+
+    def _commit(self, batch):
+        """Commit one batch, retrying transient errors; False if it should be requeued"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                write_batch = self._client_factory().batch()
+                for _, doc_ref, fields, merge in batch:
+                    write_batch.set(doc_ref, fields, merge=merge)
+                write_batch.commit()
+                WRITES.inc(len(batch), outcome="committed")
+                BATCH_COMMITS.observe(len(batch))
+                return True
+            except Exception as e:
+                if not is_retryable(e):
+                    # Retrying won't help (e.g. an invalid document); don't block the writes behind it
+                    WRITES.inc(len(batch), outcome="failed")
+                    logger.exception("Dropping Firestore batch", extra={"fields": {"writes": len(batch)}})
+                    return True
+                if attempt >= self.max_retries:
+                    WRITES.inc(len(batch), outcome="requeued")
+                    logger.warning("Requeueing Firestore batch", extra={"fields": {
+                        "writes": len(batch), "error": str(e)
+                    }})
+                    return False
+                WRITES.inc(len(batch), outcome="retried")
+                time.sleep(random.uniform(0, min(5.0, 0.1 * 2 ** attempt)))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                if self._thread is None or not self._thread.is_alive():
+                    self._ensure_started()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Don't hold the writer to its max_delay while someone is waiting
+                if self._pending:
+                    self._pending[0] = (0.0,) + self._pending[0][1:]
+                self._cond.notify_all()
+                self._cond.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def close(self, timeout=10.0):
+        """Flush outstanding writes and stop the writer thread"""
+        with self._cond:
+            if self._closed:
+                return
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if not flushed:
+            logger.error("Write-behind queue closed with unflushed writes",
+                         extra={"fields": {"writes": len(self._pending)}})
+
+
+class ImageUploader:
+    """
+    Keeps images uploaded straight to /identify in the Firebase Storage bucket
+    UPLOAD_STORAGE_BUCKET. Writes happen on a small background pool, so the
+    identification never waits for them. Objects are named by content hash
+    under uploads/<user_id>/, so the same photo uploaded twice is stored once.
+    Without a bucket, uploaded images aren't kept.
+    """
+
+    def __init__(self, bucket_name=None, bucket=None, workers=None):
+        self.bucket_name = bucket_name or os.getenv("UPLOAD_STORAGE_BUCKET") or getattr(bucket, "name", None)
+        self._bucket = bucket
+        self._owns_bucket = bucket is None
+        self.workers = workers or int(os.getenv("UPLOAD_STORAGE_WORKERS", "4"))
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        METRICS.gauge("kachow_image_uploads_pending", "Uploaded images waiting to be written to Cloud Storage",
+                      callback=lambda: len(self._pending))
+
+    @property
+    def enabled(self):
+        return bool(self.bucket_name)
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from firebase_admin import storage
+            init_firebase()
+            self._bucket = storage.bucket(self.bucket_name)
+        return self._bucket
+
+    def save(self, user_id, image):
+        """
+        Start writing a PreparedImage's original bytes to the bucket and return
+        the gs:// URL it will have, or None when uploads aren't kept
+        """
+        if not self.enabled:
+            return None
+        extension = mimetypes.guess_extension(image.mime_type) or ".jpg"
+        name = f"uploads/{user_id}/{hashlib.sha256(image.data).hexdigest()[:32]}{extension}"
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-upload")
+            future = self._executor.submit(self._upload, name, image.data, image.mime_type)
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return f"gs://{self.bucket_name}/{name}"
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def _upload(self, name, data, mime_type):
+        try:
+            self.bucket.blob(name).upload_from_string(data, content_type=mime_type)
+            UPLOADS.inc(outcome="stored")
+        except Exception:
+            UPLOADS.inc(outcome="failed")
+            logger.exception("Could not store uploaded image", extra={"fields": {"name": name}})
+
+    def after_fork(self):
+        """The upload pool doesn't survive fork(); the child starts its own on first use"""
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        # The storage client's HTTP connections stay with the parent
+        if self._owns_bucket:
+            self._bucket = None
+
+    def flush(self, timeout=None):
+        """Wait for the uploads started so far; returns False on timeout"""
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout=timeout)
+        return not not_done
+
+
+class IdentificationStore:
+    """
+    Reads and writes the per-user identification documents in Firestore.
+    Document ids are allocated client-side and, unless FIRESTORE_WRITE_BEHIND=0,
+    the writes themselves go through a WriteBehindQueue: transient failures
+    are requeued rather than dropped, and the queue is flushed on reads of a
+    pending document, in gunicorn's worker_exit and at interpreter exit.
+    """
+
+    def __init__(self, client=None, write_behind=None):
+        self._client = client
+        self._owns_client = client is None
+        if write_behind is None:
+            write_behind = os.getenv("FIRESTORE_WRITE_BEHIND", "1") != "0"
+        self.writer = WriteBehindQueue(lambda: self.client) if write_behind else None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from firebase_admin import firestore
+            init_firebase()
+            self._client = firestore.client()
+        return self._client
+
+    @staticmethod
+    def server_timestamp():
+        from firebase_admin import firestore
+        return firestore.SERVER_TIMESTAMP
+
+    def collection(self, user_id):
+        return self.client.collection(f"users/{user_id}/identifications")
+
+    def _set(self, doc_ref, fields, merge=False):
+        if self.writer is not None:
+            self.writer.set(doc_ref, fields, merge=merge)
+        else:
+            doc_ref.set(fields, merge=merge)
+
+    def create(self, user_id, image_url, user_guess, results_payload, status="done"):
+        """Store a finished identification and return its (pre-allocated) document id"""
+        doc_ref = self.collection(user_id).document()
+        self._set(doc_ref, {
+            "user_id": user_id,
+            "image_url": image_url,
+            "user_guess": user_guess,
+            "results": results_payload,
+            "status": status,
+            "timestamp": self.server_timestamp()
+        })
+        return doc_ref.id
+
+    def create_many(self, user_id, records):
+        """
+        Store finished identifications given as (image_url, user_guess, results_payload)
+        records, committed together in Firestore batches; returns their document ids
+        """
+        collection = self.collection(user_id)
+        writes = [
+            (collection.document(), {
+                "user_id": user_id,
+                "image_url": image_url,
+                "user_guess": user_guess,
+                "results": results_payload,
+                "status": "done",
+                "timestamp": self.server_timestamp()
+            })
+            for image_url, user_guess, results_payload in records
+        ]
+        if self.writer is not None:
+            self.writer.set_many(writes)
+        else:
+            # Firestore caps a batch at 500 writes
+            for start in range(0, len(writes), 500):
+                batch = self.client.batch()
+                for doc_ref, fields in writes[start:start + 500]:
+                    batch.set(doc_ref, fields)
+                batch.commit()
+        return [doc_ref.id for doc_ref, _ in writes]
+
+    def create_pending(self, user_id, image_url, user_guess):
+        """Store a placeholder for an identification that will be completed in the background"""
+        doc_ref = self.collection(user_id).document()
+        self._set(doc_ref, {
+            "user_id": user_id,
+            "image_url": image_url,
+            "user_guess": user_guess,
+            "status": "pending",
+            "timestamp": self.server_timestamp()
+        })
+        return doc_ref.id
+
+    def update(self, user_id, doc_id, fields):
+        self._set(self.collection(user_id).document(doc_id), fields, merge=True)
+
+    def get(self, user_id, doc_id):
+        doc_ref = self.collection(user_id).document(doc_id)
+        # Read our own writes
+        if self.writer is not None and self.writer.has_pending(doc_ref.path):
+            self.writer.flush(timeout=5.0)
+        snapshot = doc_ref.get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def after_fork(self):
+        # gRPC channels can't be shared with the parent; each process opens its own
+        if self._owns_client:
+            self._client = None
+        if self.writer is not None:
+            self.writer.after_fork()
+
+    def flush(self, timeout=None):
+        return self.writer.flush(timeout) if self.writer is not None else True
+
+    def close(self, timeout=10.0):
+        if self.writer is not None:
+            self.writer.close(timeout)
+
+
+def get_store():
+    return current_app.extensions["identification_store"]
@@ -0,0 +1,210 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+from app.telemetry import METRICS
+
+SHED = METRICS.counter(
+    "kachow_admission_shed_total", "Identifications turned away by admission control, by reason", ("reason",)
+)
+QUEUE_SECONDS = METRICS.histogram(
+    "kachow_admission_queue_seconds", "Time identifications waited for a pipeline slot",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+class Overloaded(Exception):
+    """Raised instead of running the pipeline when admission control sheds the request"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Server is overloaded ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AIMDLimit:
+    """
+    Additive increase, multiplicative decrease: the limit grows by about one
+    per limit's worth of fast completions and is cut by `backoff` whenever a
+    run takes longer than `timeout` seconds or fails.
+    """
+
+    name = "aimd"
+
+    def __init__(self, timeout=20.0, backoff=0.9):
+        self.timeout = timeout
+        self.backoff = backoff
+
+    def update(self, limit, rtt, in_flight, dropped):
+        if dropped or rtt > self.timeout:
+            return limit * self.backoff
+        # Only grow when the limit is actually what's holding requests back
+        if in_flight * 2 >= limit:
+            return limit + 1 / limit
+        return limit
+
+
+class GradientLimit:
+    """
+    Gradient algorithm (after Netflix's Gradient2): compares a short-term
+    average of pipeline latency with a long-term one. While they match, the
+    limit grows by a queue allowance of sqrt(limit); when latency climbs above
+    its long-term level (by more than `tolerance`), the limit shrinks in
+    proportion, down to half per update. Changes are smoothed.
+    """
+
+    name = "gradient"
+
+    def __init__(self, tolerance=1.5, smoothing=0.2, short_window=10, long_window=600):
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.short_decay = 2 / (short_window + 1)
+        self.long_decay = 2 / (long_window + 1)
+        self.short_rtt = None
+        self.long_rtt = None
+
+    def update(self, limit, rtt, in_flight, dropped):
+        if self.short_rtt is None:
+            self.short_rtt = self.long_rtt = rtt
+        self.short_rtt += self.short_decay * (rtt - self.short_rtt)
+        self.long_rtt += self.long_decay * (rtt - self.long_rtt)
+        # Let the baseline catch up quickly after a sustained drop in latency
+        if self.long_rtt / self.short_rtt > 2:
+            self.long_rtt *= 0.95
+
+        if in_flight * 2 < limit and not dropped:
+            return limit
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        target = limit * gradient + math.sqrt(limit)
+        return limit * (1 - self.smoothing) + target * self.smoothing
+
+
+LIMIT_ALGORITHMS = {
+    "aimd": lambda: AIMDLimit(
+        timeout=float(os.getenv("ADMISSION_AIMD_TIMEOUT", "20")),
+        backoff=float(os.getenv("ADMISSION_AIMD_BACKOFF", "0.9")),
+    ),
+    "gradient": lambda: GradientLimit(tolerance=float(os.getenv("ADMISSION_GRADIENT_TOLERANCE", "1.5"))),
+}
+
+
+class AdmissionController:
+    """
+    Adaptive concurrency limit in front of the expert pipeline.
+
+    At most `limit` identifications run the pipeline at once; the limit is
+    re-estimated from the latency of every completed run by `algorithm`
+    (AIMDLimit or GradientLimit) between min_limit and max_limit. Callers over
+    the limit wait in a FIFO queue of at most `max_queue`, each for at most
+    its queue timeout; a full queue or an expired wait raises Overloaded with
+    a Retry-After hint, so threads are given back quickly instead of piling up.
+    Background callers (async jobs, already bounded by the job queue) don't
+    count toward max_queue and always wait out their timeout.
+    """
+
+    def __init__(self, algorithm, initial_limit=16, min_limit=2, max_limit=128, max_queue=16, queue_timeout=2.0):
+        self.algorithm = algorithm
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._limit = float(min(max_limit, max(self.min_limit, initial_limit)))
+        self._in_flight = 0
+        self._waiters = deque()
+        self._queued_requests = 0
+        self._lock = threading.Lock()
+        self._rtt = None
+        METRICS.gauge("kachow_admission_in_flight", "Identifications running the expert pipeline",
+                      callback=lambda: self._in_flight)
+        METRICS.gauge("kachow_admission_queued", "Identifications waiting for a pipeline slot",
+                      callback=lambda: len(self._waiters))
+        METRICS.gauge("kachow_admission_limit", "Current adaptive limit on concurrent pipeline runs",
+                      callback=lambda: self.limit)
+
+    @property
+    def limit(self):
+        return max(1, int(self._limit))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "algorithm": self.algorithm.name,
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "max_queue": self.max_queue,
+            }
+
+    def retry_after(self):
+        """Seconds a shed caller should wait: about one pipeline run, at least 1"""
+        return max(1, math.ceil(self._rtt or 1.0))
+
+    def _shed(self, reason):
+        SHED.inc(reason=reason)
+        return Overloaded(reason, self.retry_after())
+
+    def _wake(self):
+        # With the lock held: hand freed slots to the oldest waiters
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter["background"]:
+                self._queued_requests -= 1
+            self._in_flight += 1
+            waiter["admitted"] = True
+            waiter["event"].set()
+
+    def acquire(self, timeout=None, background=False):
+        """
+        Take a pipeline slot, waiting up to `timeout` (default queue_timeout)
+        seconds; raises Overloaded. `background` callers bypass max_queue.
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.monotonic()
+        with self._lock:
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                QUEUE_SECONDS.observe(0.0)
+                return
+            if timeout <= 0 or (not background and self._queued_requests >= self.max_queue):
+                raise self._shed("queue_full")
+            waiter = {"event": threading.Event(), "admitted": False, "background": background}
+            self._waiters.append(waiter)
+            if not background:
+                self._queued_requests += 1
+
+        waiter["event"].wait(timeout)
+        with self._lock:
+            if not waiter["admitted"]:
+                self._waiters.remove(waiter)
+                if not background:
+                    self._queued_requests -= 1
+                raise self._shed("queue_timeout")
+        QUEUE_SECONDS.observe(time.monotonic() - started)
+
+    def release(self, rtt, dropped=False):
+        """Give back a slot, feeding the run's latency into the limit"""
+        with self._lock:
+            in_flight = self._in_flight
+            self._in_flight -= 1
+            self._rtt = rtt if self._rtt is None else 0.9 * self._rtt + 0.1 * rtt
+            limit = self.algorithm.update(self._limit, rtt, in_flight, dropped)
+            self._limit = min(self.max_limit, max(self.min_limit, limit))
+            self._wake()
+
+
+def create_admission_controller():
+    """The admission controller configured by the environment, or None if ADMISSION_CONTROL=0"""
+    if os.getenv("ADMISSION_CONTROL", "1") == "0":
+        return None
+    algorithm = os.getenv("ADMISSION_ALGORITHM", "gradient")
+    if algorithm not in LIMIT_ALGORITHMS:
+        raise ValueError(f"Unknown ADMISSION_ALGORITHM: {algorithm}")
+    return AdmissionController(
+        LIMIT_ALGORITHMS[algorithm](),
+        initial_limit=int(os.getenv("ADMISSION_INITIAL_LIMIT", "16")),
+        min_limit=int(os.getenv("ADMISSION_MIN_LIMIT", "2")),
+        max_limit=int(os.getenv("ADMISSION_MAX_LIMIT", "128")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "16")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000")) / 1000,
+    )
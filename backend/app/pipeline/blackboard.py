@@ -0,0 +1,92 @@
+import json
+import math
+import os
+from app.experts.result_utils import EXPERT_LABELS, is_error, normalize_label
+from app.telemetry import METRICS
+
+CONTEXT_TOKENS = METRICS.counter(
+    "kachow_blackboard_context_tokens_total",
+    "Estimated prompt tokens of blackboard-round context, as sent and as the full JSON would have been",
+    ("kind",)
+)
+
+MAX_FIELD_CHARS = 40
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _encoding = None
+
+
+def estimate_tokens(text):
+    """GPT-4o token count with tiktoken if installed, else the ~4 characters per token rule of thumb"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _field(result, name):
+    value = str(result.get(name, "")).strip()
+    if normalize_label(value) in ("", "unknown"):
+        return ""
+    return value[:MAX_FIELD_CHARS]
+
+
+def _label(result):
+    return " ".join(filter(None, (_field(result, "make"), _field(result, "model"), _field(result, "year"))))
+
+
+class BlackboardContext:
+    """
+    Builds the context the second round's experts see: one line per distinct
+    answer from the other experts, plus the first-round consensus, in place of
+    the full JSON of every result. Lines are added in priority order until
+    max_tokens (BLACKBOARD_CONTEXT_MAX_TOKENS) is reached. BLACKBOARD_CONTEXT=full
+    sends the full JSON instead.
+    """
+
+    def __init__(self, max_tokens=None, mode=None):
+        self.max_tokens = max_tokens or int(os.getenv("BLACKBOARD_CONTEXT_MAX_TOKENS", "150"))
+        self.mode = mode or os.getenv("BLACKBOARD_CONTEXT", "compact")
+
+    def lines(self, others, aggregation):
+        consensus = f"Consensus so far: {_label(aggregation) or 'none'}"
+        consensus += f" ({_field(aggregation, 'confidence') or 'no'} confidence"
+        consensus += ", experts disagree)" if aggregation.get("conflict") else ")"
+        lines = [consensus]
+
+        # Experts that gave the same answer share a line
+        answers = {}
+        failed = []
+        for name, result in others.items():
+            label = EXPERT_LABELS.get(name, name)
+            if is_error(result):
+                failed.append(label)
+                continue
+            answer = answers.setdefault(normalize_label(_label(result)), {"label": _label(result), "experts": []})
+            answer["experts"].append(f"{label}, {_field(result, 'confidence') or 'unknown'} confidence")
+        for answer in answers.values():
+            lines.append(f"{answer['label']} ({'; '.join(answer['experts'])})")
+        if failed:
+            lines.append(f"No answer from: {', '.join(failed)}")
+        return lines
+
+    def build(self, others, aggregation):
+        """Returns (context, report), where report compares the tokens sent with the full JSON"""
+        full = json.dumps(dict(others, first_aggregation=aggregation), indent=2)
+        full_tokens = estimate_tokens(full)
+        if self.mode == "full":
+            context, tokens = full, full_tokens
+        else:
+            kept = []
+            for line in self.lines(others, aggregation):
+                if kept and estimate_tokens("\n".join(kept + [line])) > self.max_tokens:
+                    break
+                kept.append(line)
+            context = "\n".join(kept)
+            tokens = estimate_tokens(context)
+
+        CONTEXT_TOKENS.inc(tokens, kind="sent")
+        CONTEXT_TOKENS.inc(full_tokens, kind="full")
+        return context, {"tokens": tokens, "full_tokens": full_tokens, "saved_tokens": full_tokens - tokens}
@@ -0,0 +1,87 @@
+import logging
+import os
+import re
+from app.experts.result_utils import normalize_label
+from app.pipeline.result_cache import MemoryResultCache, SQLiteResultCache
+from app.pipeline.single_flight import SingleFlight
+from app.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_LOOKUPS = METRICS.counter(
+    "kachow_insights_lookups_total", "Per-vehicle insights lookups, by outcome", ("outcome",)
+)
+
+GENERATION_PATTERN = re.compile(r"\b(?:gen(?:eration)?\s*(\d+)|(\d+)(?:st|nd|rd|th)\s*gen(?:eration)?)\b")
+YEAR_PATTERN = re.compile(r"\b(19\d{2}|20\d{2})\b")
+
+
+class InsightsCache:
+    """
+    Enthusiast insights per vehicle, generated once and reused for every later
+    identification of the same car instead of asking each expert for them.
+
+    Entries are keyed by normalised make, model and generation: an explicit
+    generation ("10th gen", "Gen 3") when the year mentions one, otherwise the
+    year rounded down to a `year_bucket`-year window. A missing key is filled by
+    one `generate(make, model, year)` call however many requests ask for it at
+    once; results live in `store` (a result cache) for its TTL.
+    """
+
+    def __init__(self, generate, store=None, year_bucket=5):
+        self.generate = generate
+        self.store = store or MemoryResultCache(ttl=30 * 24 * 3600, max_entries=10000)
+        self.year_bucket = year_bucket
+        self.single_flight = SingleFlight()
+
+    def after_fork(self):
+        if hasattr(self.store, "after_fork"):
+            self.store.after_fork()
+
+    def key_for(self, make, model, year):
+        year = str(year or "").lower()
+        generation = GENERATION_PATTERN.search(year)
+        if generation:
+            generation = "gen" + (generation.group(1) or generation.group(2))
+        else:
+            found = YEAR_PATTERN.search(year)
+            generation = (str(int(found.group(1)) // self.year_bucket * self.year_bucket)
+                          if found else "any")
+        return f"insights:{normalize_label(make)}|{normalize_label(model)}|{generation}"
+
+    def get(self, make, model, year):
+        """Insights text for the car, generating and storing it on a miss"""
+        key = self.key_for(make, model, year)
+        cached = self.store.get(key)
+        if cached is not None:
+            INSIGHTS_LOOKUPS.inc(outcome="hit")
+            return cached["insights"]
+
+        def fill(on_event):
+            insights = self.generate(make, model, year)
+            if insights:
+                self.store.set(key, {"insights": insights})
+            return insights
+
+        insights, shared = self.single_flight.do(key, fill)
+        INSIGHTS_LOOKUPS.inc(outcome="coalesced" if shared else "miss")
+        return insights
+
+
+def create_insights_cache(generate):
+    """The insights cache configured by the environment, or None if AGGREGATION_LLM_INSIGHTS=0"""
+    if os.getenv("AGGREGATION_LLM_INSIGHTS", "1") == "0":
+        return None
+
+    backend = os.getenv("INSIGHTS_CACHE_BACKEND", "memory")
+    ttl = float(os.getenv("INSIGHTS_CACHE_TTL", str(30 * 24 * 3600)))
+    max_entries = int(os.getenv("INSIGHTS_CACHE_MAX_ENTRIES", "10000"))
+    year_bucket = int(os.getenv("INSIGHTS_YEAR_BUCKET", "5"))
+
+    if backend == "sqlite":
+        store = SQLiteResultCache(os.getenv("INSIGHTS_CACHE_PATH", "insights_cache.sqlite3"), ttl, max_entries)
+    elif backend == "memory":
+        store = MemoryResultCache(ttl, max_entries)
+    else:
+        raise ValueError(f"Unknown INSIGHTS_CACHE_BACKEND: {backend}")
+    return InsightsCache(generate, store, year_bucket)
@@ -0,0 +1,135 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from app.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class IdentificationJob:
+    def __init__(self, doc_id, user_id, image_url, user_guess, image=None):
+        self.doc_id = doc_id
+        self.user_id = user_id
+        self.image_url = image_url
+        self.user_guess = user_guess
+        # PreparedImage of a direct upload; None to download image_url
+        self.image = image
+        self.status = "pending"
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def set_status(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.updated_at = time.time()
+
+    def to_dict(self):
+        job = {
+            "doc_id": self.doc_id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if self.error:
+            job["error"] = self.error
+        return job
+
+
+class JobQueue:
+    """
+    In-process queue of identification jobs drained by a fixed pool of
+    background workers.
+
+    Capacity (queued + running jobs) is bounded; reserve() fails fast when the
+    queue is full so the route can push back with a 503 instead of piling up work.
+    """
+
+    def __init__(self, run_job, workers=None, max_pending=None, history=1000):
+        self.run_job = run_job
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.max_pending = max_pending or int(os.getenv("JOB_MAX_PENDING", "64"))
+        self._capacity = threading.BoundedSemaphore(self.max_pending)
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self._history = history
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._accepting = True
+        METRICS.gauge("kachow_jobs_queued", "Async identification jobs waiting for a worker",
+                      callback=lambda: self._queue.qsize())
+
+    def _ensure_started(self):
+        with self._start_lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f"identify-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def after_fork(self):
+        """Workers are restarted in the child on the next submit()"""
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def reserve(self):
+        """Claim a slot for a new job; False if the queue is at capacity or draining"""
+        return self._accepting and self._capacity.acquire(blocking=False)
+
+    def release(self):
+        """Give back a slot claimed by reserve() that won't be submitted"""
+        self._capacity.release()
+
+    def submit(self, job):
+        """Queue a job for a slot previously claimed with reserve()"""
+        self._ensure_started()
+        with self._jobs_lock:
+            self._jobs[job.doc_id] = job
+            while len(self._jobs) > self._history:
+                self._jobs.popitem(last=False)
+        self._queue.put(job)
+
+    def drain(self, timeout=None):
+        """Stop taking new jobs and wait for queued and running ones; False if some are still unfinished"""
+        self._accepting = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def get(self, doc_id):
+        with self._jobs_lock:
+            return self._jobs.get(doc_id)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "max_pending": self.max_pending,
+            "workers": self.workers,
+        }
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self.run_job(job)
+            except Exception as e:
+                logger.exception("Job failed", extra={"fields": {"doc_id": job.doc_id}})
+                job.set_status("failed", str(e))
+            finally:
+                self._capacity.release()
+                self._queue.task_done()
+
+
+def get_job_queue():
+    return current_app.extensions["job_queue"]
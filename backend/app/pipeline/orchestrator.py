@@ -0,0 +1,364 @@
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import current_app
+from app.experts.result_utils import is_error
+from app.pipeline.blackboard import BlackboardContext
+from app.pipeline.insights import create_insights_cache
+from app.pipeline.scheduling import PROVIDER_DEGRADED, SchedulingPolicy, skipped_result
+from app.pipeline.vector_index import create_matcher
+from app.providers import is_degraded
+from app.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+
+def expert_error(message):
+    """Result returned in place of an expert that failed or timed out"""
+    return {
+        "make": "Error",
+        "model": "Error",
+        "year": "Unknown",
+        "confidence": "none",
+        "error": message
+    }
+
+
+class ExpertOrchestrator:
+    """
+    Runs each round of the identification pipeline concurrently.
+
+    Every expert call in a round is submitted to a shared thread pool and given
+    its own timeout, so a round costs as much as its slowest expert (capped by
+    that expert's timeout) instead of the sum of all of them.
+    """
+
+    def __init__(self, registry, max_workers=None, timeouts=None, policy=None, matcher=None):
+        self.registry = registry
+        self.policy = policy or SchedulingPolicy.from_env()
+        # Nearest-neighbour lookup over past identifications (VECTOR_INDEX=1)
+        self.matcher = matcher or create_matcher()
+        # hybrid (local vote, LLM for conflicts), local or llm
+        self.aggregation_mode = os.getenv("AGGREGATION_MODE", "hybrid")
+        # Insights are looked up per vehicle after identification, not asked of every expert
+        self.insights = create_insights_cache(
+            lambda make, model, year: self.registry.aggregator.generate_insights(make, model, year)
+        )
+        self.blackboard = BlackboardContext()
+        self.max_workers = max_workers or int(os.getenv("EXPERT_POOL_SIZE", "32"))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="expert")
+        self.timeouts = {
+            "openai": float(os.getenv("EXPERT_TIMEOUT_OPENAI", "30")),
+            "gemini": float(os.getenv("EXPERT_TIMEOUT_GEMINI", "30")),
+            "custom_model": float(os.getenv("EXPERT_TIMEOUT_CUSTOM_MODEL", "15")),
+            "aggregator": float(os.getenv("EXPERT_TIMEOUT_AGGREGATOR", "30")),
+        }
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+    def after_fork(self):
+        """Worker threads don't survive fork(); give the child process its own pool"""
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="expert")
+        if self.insights is not None:
+            self.insights.after_fork()
+
+    def _call(self, timeout_key, round_number, fn, args):
+        with span("expert_call", expert=timeout_key, round=str(round_number)):
+            return fn(*args)
+
+    def run_round(self, calls, on_result=None, round_number=1):
+        """
+        Run a set of expert calls in parallel.
+
+        `calls` maps a result name to (timeout_key, fn, args). Returns a dict with
+        the same names mapped to each call's result, or an error result if the
+        call raised or did not finish within its timeout. `on_result(name, result)`
+        is called as each call finishes, fastest first.
+        """
+        started = time.monotonic()
+        results = {}
+
+        def finish(name, result):
+            results[name] = result
+            if on_result:
+                on_result(name, result)
+
+        # Each call runs in a copy of the caller's context so its spans land in the request's trace
+        pending = {}
+        for name, (timeout_key, fn, args) in calls.items():
+            if is_degraded(timeout_key):
+                # Don't wait on a provider whose circuit breaker is open
+                finish(name, skipped_result(PROVIDER_DEGRADED))
+                continue
+            future = self.executor.submit(contextvars.copy_context().run, self._call, timeout_key, round_number, fn, args)
+            pending[future] = (name, timeout_key)
+
+        while pending:
+            next_deadline = min(started + self.timeouts[key] for _, key in pending.values())
+            done, _ = wait(pending, timeout=max(0.0, next_deadline - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, _ = pending.pop(future)
+                try:
+                    finish(name, future.result())
+                except Exception as e:
+                    logger.warning("Expert call failed", extra={"fields": {"expert": name, "error": str(e)}})
+                    finish(name, expert_error(str(e)))
+
+            now = time.monotonic()
+            for future, (name, timeout_key) in list(pending.items()):
+                timeout = self.timeouts[timeout_key]
+                if now >= started + timeout:
+                    # Drops the call if it hasn't started yet; a call already running
+                    # finishes in the background and its result is discarded.
+                    future.cancel()
+                    del pending[future]
+                    logger.warning("Expert call timed out", extra={"fields": {"expert": name, "timeout_s": timeout}})
+                    finish(name, expert_error(f"Timed out after {timeout}s"))
+
+        return {name: results[name] for name in calls}
+
+    def aggregate(self, openai_result, gemini_result, custom_model_result, round_number=1):
+        """
+        Combine expert results. In hybrid mode the local weighted vote decides
+        and GPT-4o is only asked to arbitrate genuine conflicts.
+        """
+        with span("aggregate", round=str(round_number)) as attrs:
+            aggregated = self._aggregate(openai_result, gemini_result, custom_model_result, round_number)
+            attrs["mode"] = aggregated.get("aggregation_mode")
+            return aggregated
+
+    def _aggregate(self, openai_result, gemini_result, custom_model_result, round_number):
+        if self.aggregation_mode != "llm":
+            local = self.registry.local_aggregator.aggregate_experts(
+                openai_result, gemini_result, custom_model_result
+            )
+            if not local["conflict"] or self.aggregation_mode == "local":
+                return local
+            if is_degraded("aggregator"):
+                # Nobody can arbitrate: show the strongest single answer rather than "Unknown",
+                # or mark the identification degraded if no expert answered at all
+                fallback = self.registry.local_aggregator.strongest_answer(
+                    openai_result, gemini_result, custom_model_result,
+                    f"Aggregator unavailable: {local['details'].lower()}"
+                )
+                return fallback or dict(local, aggregation_mode="degraded")
+
+        aggregator = self.registry.aggregator
+        aggregated = self.run_round({
+            "aggregated": ("aggregator", aggregator.aggregate_experts,
+                           (openai_result, gemini_result, custom_model_result)),
+        }, round_number=round_number)["aggregated"]
+        aggregated["aggregation_mode"] = "llm"
+        return aggregated
+
+    def identify(self, image, on_event=None, precomputed=None):
+        """
+        Run the full identification pipeline on a PreparedImage and return the results payload.
+        `on_event(event, data)` is called with 'expert' as each expert answers and
+        with 'first_round' and 'second_round' and the aggregated result as each
+        round completes. `precomputed` maps expert names to first-round results
+        already obtained elsewhere (e.g. a batched logo prediction); those experts
+        aren't called again.
+        """
+        results_payload = self._identify(image, on_event, precomputed)
+        if results_payload["aggregated"].get("aggregation_mode") == "degraded":
+            # Not a real identification: keep it out of the cache and the vector index
+            results_payload["process"] = "degraded"
+        self.add_insights(results_payload["aggregated"])
+        if self.matcher is not None:
+            self.matcher.remember(image.logo_embedding, results_payload["aggregated"])
+        return results_payload
+
+    def identify_degraded(self, image, reason):
+        """
+        Logo-model-only answer for when the server is shedding load: no LLM
+        calls, and never better than low confidence.
+        """
+        custom_model_result = self.run_round({
+            "custom_model": ("custom_model", self.registry.custom_model.identify_car, (image,)),
+        })["custom_model"]
+        aggregated = {
+            "make": "Unknown" if is_error(custom_model_result) else custom_model_result["make"],
+            "model": "Unknown",
+            "year": "Unknown",
+            "confidence": "none" if is_error(custom_model_result) else "low",
+            "details": f"{reason}; identified from the logo only.",
+            "aggregation_mode": "degraded",
+        }
+        skipped = skipped_result("Skipped: " + reason)
+        return {
+            "custom_model": custom_model_result,
+            "process": "degraded",
+            "openai": skipped,
+            "gemini": skipped,
+            "aggregated": aggregated,
+            "schedule": {"policy": self.policy.name, "path": ["degraded"]},
+        }
+
+    def add_insights(self, aggregated):
+        """Fill in insights for an identified car from the per-vehicle insights cache"""
+        if self.insights is None or aggregated.get("insights") or aggregated.get("conflict") or is_error(aggregated):
+            return
+        with span("insights") as attrs:
+            insights = self.run_round({
+                "insights": ("aggregator", self.insights.get,
+                             (aggregated["make"], aggregated["model"], aggregated.get("year", "Unknown"))),
+            })["insights"]
+            attrs["key"] = self.insights.key_for(aggregated["make"], aggregated["model"], aggregated.get("year"))
+        # A failed or timed-out lookup comes back as an error dict
+        aggregated["insights"] = insights if isinstance(insights, str) else ""
+
+    def _identify(self, image, on_event, precomputed):
+        emit = on_event or (lambda event, data: None)
+
+        def expert_done(round_number):
+            return lambda name, result: emit("expert", {"expert": name, "round": round_number, "result": result})
+        registry = self.registry
+        gemini_handler = registry.gemini
+        openai_handler = registry.openai
+        policy = self.policy
+        path = []
+        precomputed = dict(precomputed or {})
+
+        if self.matcher is not None:
+            # The logo model goes first: its embedding may settle the answer without the LLM experts
+            if "custom_model" not in precomputed:
+                precomputed["custom_model"] = self.run_round({
+                    "custom_model": ("custom_model", registry.custom_model.identify_car, (image,)),
+                }, round_number=1)["custom_model"]
+            with span("vector_index_search"):
+                match = self.matcher.match(image.logo_embedding)
+            if match:
+                logger.info("Answered from the nearest-neighbour index",
+                            extra={"fields": {"make": match["make"], "model": match["model"]}})
+                expert_done(1)("custom_model", precomputed["custom_model"])
+                emit("first_round", match)
+                reason = "Skipped: " + match["details"]
+                return {
+                    "custom_model": precomputed["custom_model"],
+                    "process": "nearest_neighbour",
+                    "openai": skipped_result(reason),
+                    "gemini": skipped_result(reason),
+                    "aggregated": match,
+                    "schedule": {"policy": policy.name, "path": ["stage:custom_model", "nearest_neighbour"]},
+                }
+
+        # First round - get initial opinions, stage by stage as the policy orders them
+        logger.info("Starting first round of identification")
+        first_round = {}
+        for stage in policy.stages:
+            for name in stage:
+                if name in precomputed:
+                    first_round[name] = precomputed[name]
+                    expert_done(1)(name, precomputed[name])
+            first_round.update(self.run_round({
+                name: (name, getattr(registry, name).identify_car, (image,))
+                for name in stage if name not in precomputed
+            }, on_result=expert_done(1), round_number=1))
+            path.append("stage:" + ",".join(stage))
+
+            decision = policy.early_decision(first_round)
+            if decision:
+                logger.info("Experts agreed, skipping remaining work",
+                            extra={"fields": {"make": decision["make"], "model": decision["model"]}})
+                path.append("early_exit")
+                emit("first_round", decision)
+                reason = "Skipped: " + decision["details"]
+                return {
+                    "custom_model": first_round.get("custom_model") or skipped_result(reason),
+                    "process": "early_exit",
+                    "openai": first_round.get("openai") or skipped_result(reason),
+                    "gemini": first_round.get("gemini") or skipped_result(reason),
+                    "aggregated": decision,
+                    "schedule": {"policy": policy.name, "path": path},
+                }
+
+        not_scheduled = skipped_result("Not scheduled by the identification policy")
+        gemini_result = first_round.get("gemini", not_scheduled)
+        openai_result = first_round.get("openai", not_scheduled)
+        custom_model_result = first_round.get("custom_model", not_scheduled)
+        logger.debug("First round results", extra={"fields": {
+            "gemini": gemini_result, "openai": openai_result, "custom_model": custom_model_result
+        }})
+
+        # Aggregate the expert results
+        first_round_aggregated = self.aggregate(openai_result, gemini_result, custom_model_result)
+        path.append("aggregate")
+        logger.info("First round aggregated", extra={"fields": {
+            "make": first_round_aggregated.get("make"),
+            "model": first_round_aggregated.get("model"),
+            "confidence": first_round_aggregated.get("confidence"),
+            "aggregation_mode": first_round_aggregated.get("aggregation_mode"),
+        }})
+        emit("first_round", first_round_aggregated)
+
+        results_payload = {
+            "custom_model": custom_model_result,
+            "process": "single_round",  # default
+            "openai": openai_result,
+            "gemini": gemini_result,
+            "aggregated": first_round_aggregated,
+            "schedule": {"policy": policy.name, "path": path},
+        }
+
+        # Check confidence level - if not high, do a second round with blackboard approach
+        if first_round_aggregated.get("confidence", "").lower() != "high":
+            logger.info("Confidence not high enough, initiating second round with blackboard approach")
+            # Create context for experts - a compact summary of what the other experts thought
+            with span("blackboard_context", round="2") as attrs:
+                openai_context, openai_report = self.blackboard.build(
+                    {"gemini": gemini_result, "custom_model": custom_model_result}, first_round_aggregated
+                )
+                gemini_context, gemini_report = self.blackboard.build(
+                    {"openai": openai_result, "custom_model": custom_model_result}, first_round_aggregated
+                )
+                attrs.update(
+                    tokens=openai_report["tokens"] + gemini_report["tokens"],
+                    saved_tokens=openai_report["saved_tokens"] + gemini_report["saved_tokens"],
+                )
+
+            # Second round - with context
+            second_round = self.run_round({
+                "openai": ("openai", openai_handler.identify_car, (image, openai_context)),
+                "gemini": ("gemini", gemini_handler.identify_car, (image, gemini_context)),
+            }, on_result=expert_done(2), round_number=2)
+            openai_second_result = second_round["openai"]
+            gemini_second_result = second_round["gemini"]
+            path.append("blackboard")
+            logger.debug("Second round results", extra={"fields": {
+                "openai": openai_second_result, "gemini": gemini_second_result
+            }})
+
+            # Final aggregation with second round results
+            final_aggregated = self.aggregate(
+                openai_second_result,
+                gemini_second_result,
+                custom_model_result,
+                round_number=2
+            )
+            path.append("aggregate")
+            emit("second_round", final_aggregated)
+
+            results_payload.update({
+                "openai": {
+                    "first_round": openai_result,
+                    "second_round": openai_second_result
+                },
+                "gemini": {
+                    "first_round": gemini_result,
+                    "second_round": gemini_second_result
+                },
+                "aggregated": final_aggregated,
+                "process": "blackboard_two_rounds",
+                "blackboard_context": {"openai": openai_report, "gemini": gemini_report},
+            })
+
+        return results_payload
+
+
+def get_orchestrator():
+    return current_app.extensions["expert_orchestrator"]
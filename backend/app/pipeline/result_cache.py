@@ -0,0 +1,179 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from app.experts.result_utils import is_error, normalize_label
+from app.pipeline.scheduling import PROVIDER_DEGRADED
+
+
+def sha256_key(image):
+    return "sha256:" + hashlib.sha256(image.data).hexdigest()
+
+
+def dhash_key(image, size=8):
+    """
+    Perceptual difference hash of the decoded image, so re-encoded or resized
+    copies of the same photo share a key.
+    """
+    gray = image.image.convert("L").resize((size + 1, size))
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"dhash:{bits:0{size * size // 4}x}"
+
+
+KEY_FUNCTIONS = {
+    "sha256": sha256_key,
+    "dhash": dhash_key,
+}
+
+
+def _expert_results(results_payload):
+    for name in ("openai", "gemini", "custom_model"):
+        result = results_payload.get(name)
+        if isinstance(result, dict) and "first_round" in result:
+            yield from (result["first_round"], result.get("second_round"))
+        elif result is not None:
+            yield result
+
+
+def _expert_failed(result):
+    """An error, a timeout or a provider skipped for being degraded; a skip the policy chose is fine"""
+    if not is_error(result):
+        return False
+    return normalize_label(result.get("make")) != "skipped" or result.get("details") == PROVIDER_DEGRADED
+
+
+def is_cacheable(results_payload):
+    """
+    Only identifications every expert took part in as scheduled, ending in a
+    settled answer, are worth serving again: no conflicts, no Unknown/Error
+    answers, no failed or degraded experts, no load-shedding fallbacks.
+    """
+    aggregated = results_payload.get("aggregated") or {}
+    if results_payload.get("process") == "degraded" or aggregated.get("conflict"):
+        return False
+    if aggregated.get("aggregation_mode") == "fallback":
+        # A guess from one expert while the aggregator was down
+        return False
+    if is_error(aggregated) or normalize_label(aggregated.get("make")) == "aggregation error":
+        return False
+    return not any(_expert_failed(result) for result in _expert_results(results_payload))
+
+
+class MemoryResultCache:
+    """In-process TTL + LRU cache of identification results"""
+
+    def __init__(self, ttl, max_entries, key_function=sha256_key):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_for = key_function
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, payload = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(payload)
+
+    def set(self, key, payload):
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteResultCache:
+    """
+    File-backed TTL + LRU cache of identification results, shared by every
+    worker process on the box.
+    """
+
+    def __init__(self, path, ttl, max_entries, key_function=sha256_key):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_for = key_function
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, payload TEXT NOT NULL, "
+                "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)")
+
+    def after_fork(self):
+        """SQLite connections must not be shared across fork(); open this process's own"""
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload, stored_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, stored_at = row
+            if now - stored_at > self.ttl:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(payload)
+
+    def set(self, key, payload):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, payload, stored_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload), now, now)
+            )
+            self._conn.execute("DELETE FROM results WHERE stored_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+
+def create_result_cache():
+    """Build the result cache configured by the environment, or None if disabled"""
+    backend = os.getenv("RESULT_CACHE_BACKEND", "memory")
+    if backend == "none":
+        return None
+
+    ttl = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+    max_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+    key_function = KEY_FUNCTIONS[os.getenv("RESULT_CACHE_KEY", "sha256")]
+
+    if backend == "sqlite":
+        path = os.getenv("RESULT_CACHE_PATH", "result_cache.sqlite3")
+        return SQLiteResultCache(path, ttl, max_entries, key_function)
+    if backend == "memory":
+        return MemoryResultCache(ttl, max_entries, key_function)
+    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {backend}")
+
+
+def get_result_cache():
+    return current_app.extensions["result_cache"]
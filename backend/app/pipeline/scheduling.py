@@ -0,0 +1,96 @@
+import os
+from app.experts.result_utils import EXPERT_LABELS, confidence_level, is_error, labels_match
+
+# Details of the placeholder for an expert whose provider's circuit breaker is open
+PROVIDER_DEGRADED = "Skipped: provider is degraded"
+
+
+def skipped_result(reason):
+    """Placeholder for an expert the scheduler decided not to call"""
+    return {
+        "make": "Skipped",
+        "model": "Skipped",
+        "year": "Unknown",
+        "confidence": "none",
+        "details": reason
+    }
+
+
+class SchedulingPolicy:
+    """
+    Decides which experts run, in what order, and when the pipeline can stop.
+
+    Experts run stage by stage (each stage concurrently). After every stage,
+    if all of `agree_experts` have answered with `required_confidence` and
+    agree on `match_fields`, the answer is decided deterministically and the
+    remaining stages, the LLM aggregation and the blackboard round are skipped.
+    Otherwise the pipeline escalates to the next stage and finally to the
+    aggregation and blackboard rounds.
+    """
+
+    def __init__(self, name, stages, agree_experts=("openai", "gemini"),
+                 match_fields=("make", "model"), required_confidence="high", early_exit=True):
+        self.name = name
+        self.stages = [list(stage) for stage in stages]
+        self.agree_experts = list(agree_experts)
+        self.match_fields = list(match_fields)
+        self.required_confidence = required_confidence
+        self.early_exit = early_exit
+
+    @classmethod
+    def from_env(cls):
+        """
+        IDENTIFY_POLICY=adaptive (default) or full (always aggregate, original behaviour).
+        IDENTIFY_STAGES lists experts per stage, stages separated by ';',
+        e.g. 'gemini,custom_model;openai' to try the cheaper experts first.
+        """
+        name = os.getenv("IDENTIFY_POLICY", "adaptive")
+        stages = [
+            [expert.strip() for expert in stage.split(",") if expert.strip()]
+            for stage in os.getenv("IDENTIFY_STAGES", "openai,gemini,custom_model").split(";")
+        ]
+        if name == "full":
+            return cls(name, [sum(stages, [])], early_exit=False)
+        if name != "adaptive":
+            raise ValueError(f"Unknown IDENTIFY_POLICY: {name}")
+
+        agree_experts = os.getenv("EARLY_EXIT_EXPERTS", "openai,gemini").split(",")
+        return cls(
+            name,
+            stages,
+            agree_experts=[expert.strip() for expert in agree_experts],
+            required_confidence=os.getenv("EARLY_EXIT_CONFIDENCE", "high")
+        )
+
+    def early_decision(self, results):
+        """Return a final aggregated result if the agreeing experts settle it, else None"""
+        if not self.early_exit:
+            return None
+
+        agreeing = [results.get(name) for name in self.agree_experts]
+        if any(result is None or is_error(result) for result in agreeing):
+            return None
+        if any(confidence_level(result) != self.required_confidence for result in agreeing):
+            return None
+
+        first = agreeing[0]
+        for field in self.match_fields:
+            if not all(labels_match(first.get(field), result.get(field)) for result in agreeing[1:]):
+                return None
+
+        year = next(
+            (result["year"] for result in agreeing
+             if result.get("year") and str(result["year"]).lower() != "unknown"),
+            "Unknown"
+        )
+        names = " and ".join(EXPERT_LABELS.get(name, name) for name in self.agree_experts)
+        return {
+            "make": first.get("make"),
+            "model": first.get("model"),
+            "year": year,
+            "confidence": self.required_confidence,
+            "details": f"{names} independently agreed with {self.required_confidence} confidence.",
+            "insights": next((result["insights"] for result in agreeing if result.get("insights")), ""),
+            "aggregation_mode": "early_exit",
+            "expert_results": dict(results)
+        }
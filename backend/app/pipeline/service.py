@@ -0,0 +1,220 @@
+import contextvars
+import copy
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.pipeline.admission import Overloaded, create_admission_controller
+from app.pipeline.result_cache import is_cacheable, sha256_key
+from app.pipeline.single_flight import SingleFlight
+from app.telemetry import IDENTIFICATIONS, IMAGE_BYTES, METRICS, RequestTrace, current_trace, span
+from utils.image_fetch import ImageFetchError
+
+logger = logging.getLogger(__name__)
+
+DEGRADED = METRICS.counter(
+    "kachow_admission_degraded_total", "Identifications answered by the logo model alone because the server was overloaded"
+)
+
+
+class IdentificationService:
+    """
+    Runs an identification end to end - cache lookup, expert pipeline and
+    persistence - for both the synchronous route and the background job workers.
+    """
+
+    def __init__(self, fetcher, orchestrator, cache, store, uploader=None):
+        self.fetcher = fetcher
+        self.orchestrator = orchestrator
+        self.cache = cache
+        self.store = store
+        self.uploader = uploader
+        # Adaptive limit on concurrent pipeline runs (ADMISSION_CONTROL=0 to disable)
+        self.admission = create_admission_controller()
+        # Under overload, answer from the logo model alone instead of refusing
+        self.degraded_mode = os.getenv("ADMISSION_DEGRADED", "0") == "1"
+        self.job_queue_timeout = float(os.getenv("ADMISSION_JOB_QUEUE_TIMEOUT", "30"))
+        # Concurrent requests for the same image share one run of the experts
+        self.single_flight = SingleFlight() if os.getenv("SINGLE_FLIGHT", "1") != "0" else None
+        # Images of one /identify/batch request downloaded / identified at the same time
+        self.batch_fetch_concurrency = int(os.getenv("BATCH_FETCH_CONCURRENCY", "8"))
+        self.batch_concurrency = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+    def fetch(self, image_url):
+        with span("image_fetch") as attrs:
+            image = self.fetcher.fetch(image_url)
+            attrs.update(original_bytes=len(image.data), llm_bytes=len(image.llm_data))
+        IMAGE_BYTES.observe(len(image.data), view="original")
+        IMAGE_BYTES.observe(len(image.llm_data), view="llm")
+        return image
+
+    def receive(self, stream):
+        """Read and decode an image uploaded with the request, instead of downloading it"""
+        with span("image_upload") as attrs:
+            image = self.fetcher.receive(stream)
+            attrs.update(original_bytes=len(image.data), llm_bytes=len(image.llm_data))
+        IMAGE_BYTES.observe(len(image.data), view="original")
+        IMAGE_BYTES.observe(len(image.llm_data), view="llm")
+        return image
+
+    def keep_upload(self, user_id, image):
+        """Start storing an uploaded image in the background; its gs:// URL, or None if uploads aren't kept"""
+        return self.uploader.save(user_id, image) if self.uploader is not None else None
+
+    def run_pipeline(self, image, on_event=None, precomputed=None, queue_timeout=None, background=False):
+        """
+        Run the experts on a PreparedImage within admission control. Over
+        capacity this raises Overloaded, or with ADMISSION_DEGRADED=1 answers
+        from the logo model alone (process "degraded"). `background` (async
+        jobs) waits up to queue_timeout even when the request queue is full.
+        """
+        if self.admission is None:
+            return self.orchestrator.identify(image, on_event=on_event, precomputed=precomputed)
+        try:
+            with span("admission_wait"):
+                self.admission.acquire(queue_timeout, background=background)
+        except Overloaded as e:
+            if not self.degraded_mode:
+                raise
+            DEGRADED.inc()
+            logger.warning("Overloaded, answering from the logo model only", extra={"fields": {"reason": e.reason}})
+            return self.orchestrator.identify_degraded(image, "Server overloaded")
+
+        started = time.monotonic()
+        dropped = True
+        try:
+            results_payload = self.orchestrator.identify(image, on_event=on_event, precomputed=precomputed)
+            dropped = False
+            return results_payload
+        finally:
+            self.admission.release(time.monotonic() - started, dropped)
+
+    def identify(self, image, on_event=None, queue_timeout=None, background=False):
+        """
+        Identify a PreparedImage. Returns (results_payload, cache_status);
+        identical images are answered from the cache without calling any expert,
+        and a request for an image that is already being identified waits for
+        that run (cache_status "coalesced"). Raises Overloaded when admission
+        control turns the request away.
+        The current request's timing breakdown is attached as results_payload["timings"].
+        """
+        cache = self.cache
+        with span("cache_lookup"):
+            cache_key = cache.key_for(image) if cache else None
+            results_payload = cache.get(cache_key) if cache else None
+        cache_status = "hit" if results_payload is not None else "miss"
+
+        if results_payload is None:
+            def run(on_event):
+                # Expert rounds run concurrently on the shared orchestrator
+                results_payload = self.run_pipeline(image, on_event=on_event, queue_timeout=queue_timeout,
+                                                    background=background)
+                if cache and is_cacheable(results_payload):
+                    cache.set(cache_key, results_payload)
+                return results_payload
+
+            if self.single_flight is None:
+                results_payload = run(on_event)
+            else:
+                shared_payload, shared = self.single_flight.do(cache_key or sha256_key(image), run, on_event)
+                # Leader and followers each annotate and store their own copy
+                results_payload = copy.deepcopy(shared_payload)
+                if shared:
+                    cache_status = "coalesced"
+
+        return self._finish(results_payload, cache_status)
+
+    def _finish(self, results_payload, cache_status):
+        IDENTIFICATIONS.inc(
+            process=results_payload.get("process", ""),
+            aggregation_mode=results_payload.get("aggregated", {}).get("aggregation_mode", ""),
+            cache=cache_status
+        )
+        trace = current_trace()
+        if trace is not None:
+            results_payload["timings"] = trace.summary()
+        return results_payload, cache_status
+
+    def identify_many(self, image_urls):
+        """
+        Fetch and identify several images. Each image goes to the experts as
+        soon as it has downloaded, BATCH_LLM_CONCURRENCY at a time, and its logo
+        prediction shares the micro-batcher's forward passes with the other
+        images in flight. Returns one entry per URL, in input order:
+        (results_payload, cache_status), the ImageFetchError of an image that
+        couldn't be downloaded, or the Overloaded of one admission control shed.
+        """
+        if not image_urls:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.batch_concurrency, len(image_urls)))) as identify_pool, \
+                ThreadPoolExecutor(max_workers=max(1, min(self.batch_fetch_concurrency, len(image_urls)))) as fetch_pool:
+            def identify(image):
+                try:
+                    return self.identify(image)
+                except Overloaded as e:
+                    return e
+
+            def fetch_then_identify(image_url):
+                try:
+                    image = self.fetch(image_url)
+                except ImageFetchError as e:
+                    return e
+                return identify_pool.submit(contextvars.copy_context().run, identify, image)
+
+            # Both pools run in copies of the caller's context, so spans land on the request's trace
+            fetches = [fetch_pool.submit(contextvars.copy_context().run, fetch_then_identify, image_url)
+                       for image_url in image_urls]
+            results = [fetch.result() for fetch in fetches]
+            return [result if isinstance(result, ImageFetchError) else result.result() for result in results]
+
+    def save(self, user_id, image_url, user_guess, results_payload):
+        with span("firestore_write"):
+            return self.store.create(user_id, image_url, user_guess, results_payload)
+
+    def save_many(self, user_id, records):
+        """Store (image_url, user_guess, results_payload) records with one Firestore batch"""
+        with span("firestore_write", batch_size=len(records)):
+            return self.store.create_many(user_id, records)
+
+    def run_job(self, job):
+        """Complete a queued identification, recording its progress on the Firestore document"""
+        with RequestTrace("identify_job").activate():
+            self._run_job(job)
+
+    def _run_job(self, job):
+        store = self.store
+
+        def set_status(status, fields=None, error=None):
+            job.set_status(status, error)
+            store.update(job.user_id, job.doc_id, dict(fields or {}, status=status))
+
+        set_status("first_round")
+        # Uploaded images come with the job; the job history shouldn't keep them alive
+        image, job.image = job.image, None
+        try:
+            image = image or self.fetch(job.image_url)
+        except ImageFetchError as e:
+            set_status("failed", {"error": str(e)}, error=str(e))
+            return
+
+        def on_event(event, data):
+            # The blackboard round only runs when the first round wasn't conclusive
+            if event == "first_round" and data.get("confidence", "").lower() != "high":
+                set_status("second_round")
+
+        try:
+            # Background jobs can afford to wait longer for a pipeline slot than a request thread,
+            # and don't take the request threads' places in the admission queue
+            results_payload, cache_status = self.identify(image, on_event=on_event,
+                                                          queue_timeout=self.job_queue_timeout, background=True)
+        except Exception as e:
+            logger.exception("Error during identification", extra={"fields": {"doc_id": job.doc_id}})
+            set_status("failed", {"error": str(e)}, error=str(e))
+            return
+
+        set_status("done", {"results": results_payload, "cache": cache_status})
+
+
+def get_identification_service():
+    return current_app.extensions["identification_service"]
@@ -0,0 +1,86 @@
+import threading
+from app.telemetry import METRICS
+
+COALESCED = METRICS.counter(
+    "kachow_coalesced_requests_total", "Identifications that joined an identical in-flight one instead of running the experts"
+)
+
+
+class _Flight:
+    """One in-flight computation: its outcome plus the events it has emitted so far"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+        self._events = []
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def publish(self, event, data):
+        with self._lock:
+            self._events.append((event, data))
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(event, data)
+
+    def subscribe(self, callback):
+        """Replay what has already happened, then deliver events live"""
+        with self._lock:
+            past = list(self._events)
+            self._subscribers.append(callback)
+        for event, data in past:
+            callback(event, data)
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent work by key. The first caller for a key (the
+    leader) runs fn; callers arriving while it is in flight (followers) wait
+    for its result instead of repeating the work, and receive the leader's
+    progress events. Nothing is remembered once the leader finishes; that is
+    the result cache's job.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def do(self, key, fn, on_event=None):
+        """
+        Run fn(on_event) once per in-flight key. Returns (result, shared), where
+        shared is True for followers; the leader's exception is raised for everyone.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+
+        if on_event is not None:
+            flight.subscribe(on_event)
+
+        if not leader:
+            COALESCED.inc()
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(flight.publish)
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+from app.experts.result_utils import confidence_level, normalize_label
+from app.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+INDEX_LOOKUPS = METRICS.counter(
+    "kachow_vector_index_lookups_total", "Nearest-neighbour lookups before the LLM experts, by outcome", ("outcome",)
+)
+INDEX_SECONDS = METRICS.histogram(
+    "kachow_vector_index_search_seconds", "Time to search the nearest-neighbour index",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+
+class VectorIndex:
+    """
+    Append-only index of unit-normalised logo-model embeddings, labelled with
+    the make/model/year they were identified as, searched by brute-force cosine
+    similarity (one matrix-vector product in NumPy).
+
+    On disk, under `path`:
+      vectors.f32   float32 matrix, memory-mapped; grows by doubling
+      labels.jsonl  one JSON label per row, in row order
+      meta.json     {"dim", "count"}; rows past count are not yet committed
+
+    Appends and compaction take an exclusive flock, so several worker
+    processes can share one index; each remaps when another process has
+    appended. compact() drops near-duplicate rows and keeps at most
+    max_entries (the newest).
+    """
+
+    def __init__(self, path, max_entries=100_000, duplicate_similarity=0.995):
+        self.path = path
+        self.max_entries = max_entries
+        self.duplicate_similarity = duplicate_similarity
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._labels_path = os.path.join(path, "labels.jsonl")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._lock = threading.RLock()
+        self._dim = None
+        self._count = 0
+        self._vectors = None
+        self._labels = []
+        self._labels_offset = 0
+        self._labels_inode = None
+        self._meta_mtime = None
+        with self._file_lock(exclusive=False):
+            self._reload()
+        METRICS.gauge("kachow_vector_index_entries", "Embeddings in the nearest-neighbour index",
+                      callback=lambda: self._count)
+
+    def __len__(self):
+        return self._count
+
+    @contextmanager
+    def _file_lock(self, exclusive=True):
+        # POSIX only; imported here so the orchestrator still imports where the index is off
+        import fcntl
+        with open(os.path.join(self.path, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        try:
+            with open(self._meta_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"dim": None, "count": 0}
+
+    def _write_meta(self, meta):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path)
+
+    def _capacity(self):
+        if self._dim is None or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (4 * self._dim)
+
+    def _remap(self):
+        capacity = self._capacity()
+        self._vectors = (np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+                         if capacity else None)
+
+    def _reload(self):
+        """Pick up rows appended (or a compaction done) by another process"""
+        meta = self._read_meta()
+        self._dim = meta["dim"]
+        if meta["count"] > len(self._labels) or meta["count"] < self._count:
+            inode = os.stat(self._labels_path).st_ino
+            if inode != self._labels_inode or meta["count"] < self._count:
+                # Compacted (rewritten) since we last looked
+                self._labels, self._labels_offset, self._labels_inode = [], 0, inode
+            with open(self._labels_path) as f:
+                f.seek(self._labels_offset)
+                while len(self._labels) < meta["count"]:
+                    self._labels.append(json.loads(f.readline()))
+                self._labels_offset = f.tell()
+        self._count = meta["count"]
+        self._remap()
+        self._meta_mtime = os.path.getmtime(self._meta_path) if os.path.exists(self._meta_path) else None
+
+    def _refresh(self):
+        mtime = os.path.getmtime(self._meta_path) if os.path.exists(self._meta_path) else None
+        if mtime != self._meta_mtime:
+            # Same lock order as add_many() and compact(): searches never see a half-reloaded index
+            with self._lock, self._file_lock(exclusive=False):
+                self._reload()
+
+    @staticmethod
+    def _normalise(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, embedding, label):
+        self.add_many([embedding], [label])
+
+    def add_many(self, embeddings, labels):
+        """Append labelled embeddings; label is a dict such as {"make", "model", "year"}"""
+        vectors = self._normalise(embeddings)
+        with self._lock, self._file_lock():
+            self._reload()
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dimensions, the index {self._dim}")
+
+            needed = self._count + len(vectors)
+            if needed > self._capacity():
+                capacity = max(1024, self._capacity())
+                while capacity < needed:
+                    capacity *= 2
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(capacity * self._dim * 4)
+                self._remap()
+
+            self._vectors[self._count:needed] = vectors
+            self._vectors.flush()
+            with open(self._labels_path, "a") as f:
+                for label in labels:
+                    f.write(json.dumps(label) + "\n")
+                self._labels_offset = f.tell()
+            self._labels_inode = os.stat(self._labels_path).st_ino
+            self._labels.extend(labels)
+            self._count = needed
+            self._write_meta({"dim": self._dim, "count": self._count})
+            self._meta_mtime = os.path.getmtime(self._meta_path)
+
+    def search(self, embedding, k=5):
+        """The k most similar entries as [(similarity, label)], most similar first"""
+        started = time.perf_counter()
+        self._refresh()
+        with self._lock:
+            if not self._count:
+                return []
+            query = self._normalise([embedding])[0]
+            similarities = self._vectors[:self._count] @ query
+            k = min(k, self._count)
+            top = np.argpartition(-similarities, k - 1)[:k]
+            top = top[np.argsort(-similarities[top])]
+            neighbours = [(float(similarities[i]), self._labels[i]) for i in top]
+        INDEX_SECONDS.observe(time.perf_counter() - started)
+        return neighbours
+
+    def compact(self):
+        """
+        Rewrite the index without near-duplicates (same label, similarity above
+        duplicate_similarity) and without the oldest rows beyond max_entries.
+        """
+        with self._lock, self._file_lock():
+            self._reload()
+            if not self._count:
+                return 0
+            vectors = np.array(self._vectors[:self._count])
+            groups = {}
+            for i, label in enumerate(self._labels):
+                groups.setdefault(json.dumps(label, sort_keys=True), []).append(i)
+
+            survivors = []
+            for rows in groups.values():
+                # Newest first, so the most recent copy of a duplicate survives
+                kept = np.empty((len(rows), self._dim), dtype=np.float32)
+                count = 0
+                for i in reversed(rows):
+                    if count and np.max(kept[:count] @ vectors[i]) >= self.duplicate_similarity:
+                        continue
+                    kept[count] = vectors[i]
+                    count += 1
+                    survivors.append(i)
+            keep = sorted(survivors)[-self.max_entries:]
+
+            removed = self._count - len(keep)
+            if removed:
+                tmp_vectors = self._vectors_path + ".tmp"
+                vectors[keep].tofile(tmp_vectors)
+                tmp_labels = self._labels_path + ".tmp"
+                with open(tmp_labels, "w") as f:
+                    for i in keep:
+                        f.write(json.dumps(self._labels[i]) + "\n")
+                self._vectors = None
+                os.replace(tmp_vectors, self._vectors_path)
+                os.replace(tmp_labels, self._labels_path)
+                self._labels, self._labels_offset, self._labels_inode = [], 0, None
+                self._count = 0
+                self._write_meta({"dim": self._dim, "count": len(keep)})
+                self._reload()
+            logger.info("Vector index compacted", extra={"fields": {"removed": removed, "entries": self._count}})
+            return removed
+
+
+class NearestNeighbourMatcher:
+    """
+    Answers an identification from the vector index when the image's nearest
+    past identifications agree, and records new confident identifications.
+
+    A match needs at least `min_votes` of the `k` nearest entries above
+    `threshold` cosine similarity, all with the same make and model. Configured
+    by VECTOR_INDEX_* environment variables; see create_matcher().
+    """
+
+    def __init__(self, index, k=5, threshold=0.92, min_votes=3, compact_every=1000):
+        self.index = index
+        self.k = k
+        self.threshold = threshold
+        self.min_votes = min_votes
+        self.compact_every = compact_every
+        self._appends = 0
+        self._compacting = threading.Lock()
+
+    def match(self, embedding):
+        """An aggregated result built from the neighbours, or None"""
+        if embedding is None:
+            return None
+        neighbours = [(similarity, label) for similarity, label in self.index.search(embedding, self.k)
+                      if similarity >= self.threshold]
+        votes = Counter((normalize_label(label["make"]), normalize_label(label["model"])) for _, label in neighbours)
+        if not votes or len(votes) > 1 or len(neighbours) < self.min_votes:
+            INDEX_LOOKUPS.inc(outcome="miss")
+            return None
+
+        INDEX_LOOKUPS.inc(outcome="match")
+        similarity, label = neighbours[0]
+        years = Counter(label.get("year", "Unknown") for _, label in neighbours)
+        return {
+            "make": label["make"],
+            "model": label["model"],
+            "year": years.most_common(1)[0][0],
+            "confidence": "high",
+            "details": f"Matched {len(neighbours)} similar past identifications (best similarity {similarity:.3f}).",
+            "aggregation_mode": "nearest_neighbour",
+        }
+
+    def remember(self, embedding, aggregated):
+        """Add a confidently identified image to the index"""
+        if embedding is None or confidence_level(aggregated) != "high" or aggregated.get("conflict"):
+            return
+        if aggregated.get("aggregation_mode") == "nearest_neighbour":
+            return
+        label = {field: aggregated.get(field, "Unknown") for field in ("make", "model", "year")}
+        if normalize_label(label["make"]) in ("", "unknown", "error"):
+            return
+        try:
+            self.index.add(embedding, label)
+        except Exception as e:
+            logger.warning("Could not add to vector index", extra={"fields": {"error": str(e)}})
+            return
+
+        self._appends += 1
+        if self.compact_every and self._appends % self.compact_every == 0 and self._compacting.acquire(blocking=False):
+            def compact():
+                try:
+                    self.index.compact()
+                finally:
+                    self._compacting.release()
+            threading.Thread(target=compact, name="vector-index-compact", daemon=True).start()
+
+
+def create_matcher():
+    """The nearest-neighbour matcher configured by the environment, or None unless VECTOR_INDEX=1"""
+    if os.getenv("VECTOR_INDEX", "0") != "1":
+        return None
+    index = VectorIndex(
+        os.getenv("VECTOR_INDEX_PATH", "vector_index"),
+        max_entries=int(os.getenv("VECTOR_INDEX_MAX_ENTRIES", "100000")),
+    )
+    return NearestNeighbourMatcher(
+        index,
+        k=int(os.getenv("VECTOR_INDEX_K", "5")),
+        threshold=float(os.getenv("VECTOR_INDEX_THRESHOLD", "0.92")),
+        min_votes=int(os.getenv("VECTOR_INDEX_MIN_VOTES", "3")),
+        compact_every=int(os.getenv("VECTOR_INDEX_COMPACT_EVERY", "1000")),
+    )
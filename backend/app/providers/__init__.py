@@ -0,0 +1,77 @@
+# app/providers/__init__.py
+"""
+Shared provider client layer: one pooled SDK client per provider for the
+whole process, wrapped in ProviderClient for rate limiting, retries and
+circuit breaking. OpenAIHandler, GeminiHandler and AggregateResults all go
+through it, and the orchestrator skips providers it reports as degraded.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+from app.providers.client import ProviderClient
+from app.telemetry import METRICS
+
+_lock = threading.Lock()
+_providers = {}
+_openai_client = None
+
+# Which provider each expert (or the aggregator) depends on
+EXPERT_PROVIDERS = {
+    "openai": "openai",
+    "gemini": "gemini",
+    "aggregator": "openai",
+}
+
+
+def get_provider(name):
+    provider = _providers.get(name)
+    if provider is None:
+        with _lock:
+            provider = _providers.get(name)
+            if provider is None:
+                provider = _providers[name] = ProviderClient(name)
+    return provider
+
+
+def is_degraded(expert):
+    """True if the provider behind an expert has its circuit open"""
+    name = EXPERT_PROVIDERS.get(expert)
+    return name is not None and name in _providers and _providers[name].degraded
+
+
+def shared_openai_client():
+    """
+    One OpenAI client per process with a keep-alive connection pool. SDK
+    retries are off because ProviderClient does them, with rate limiting
+    and the circuit breaker in the loop.
+    """
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                import httpx
+                from openai import OpenAI
+
+                load_dotenv('.env.local')
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY not found in environment variables")
+
+                max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+                _openai_client = OpenAI(
+                    api_key=api_key,
+                    max_retries=0,
+                    timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+                    http_client=httpx.Client(limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                        keepalive_expiry=60
+                    ))
+                )
+    return _openai_client
+
+
+METRICS.gauge(
+    "kachow_provider_degraded", "1 while a provider's circuit breaker is open", ("provider",),
+    callback=lambda: {(name,): int(provider.degraded) for name, provider in list(_providers.items())}
+)
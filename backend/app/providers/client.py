@@ -0,0 +1,140 @@
+import logging
+import os
+import random
+import time
+from app.providers.circuit import CircuitBreaker
+from app.providers.rate_limit import TokenBucket
+from app.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {
+    # openai
+    "APIConnectionError", "APITimeoutError", "InternalServerError", "RateLimitError",
+    # google.api_core
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+    "TooManyRequests",
+}
+
+RETRIES = METRICS.counter(
+    "kachow_provider_retries_total", "Provider calls retried, by reason", ("provider", "reason")
+)
+FAILURES = METRICS.counter(
+    "kachow_provider_failures_total", "Provider calls that failed after retries", ("provider",)
+)
+RATE_LIMIT_WAIT = METRICS.histogram(
+    "kachow_provider_rate_limit_wait_seconds", "Time spent waiting on the local rate limiter", ("provider",)
+)
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose circuit is open or whose rate limit can't be met in time"""
+
+
+def status_code(error):
+    """HTTP-ish status of an SDK error, if it carries one"""
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+        if hasattr(value, "value") and isinstance(value.value, int):
+            return value.value
+    return None
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from the error or its response headers"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class ProviderClient:
+    """
+    Wraps calls to one provider with per-model token-bucket rate limiting,
+    exponential backoff with full jitter (honouring Retry-After) and a circuit
+    breaker that marks the provider degraded after repeated failures.
+    """
+
+    def __init__(self, name, rate=None, burst=None, max_retries=None, backoff_base=None,
+                 backoff_max=None, rate_limit_timeout=None, breaker=None):
+        prefix = name.upper()
+        self.name = name
+        self.rate = rate or float(os.getenv(f"{prefix}_RATE_LIMIT", "50"))
+        self.burst = burst or float(os.getenv(f"{prefix}_RATE_BURST", str(self.rate)))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("PROVIDER_MAX_RETRIES", "2"))
+        self.backoff_base = backoff_base or float(os.getenv("PROVIDER_BACKOFF_BASE", "0.5"))
+        self.backoff_max = backoff_max or float(os.getenv("PROVIDER_BACKOFF_MAX", "8"))
+        self.rate_limit_timeout = rate_limit_timeout or float(os.getenv("PROVIDER_RATE_LIMIT_TIMEOUT", "10"))
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+        )
+        self._buckets = {}
+
+    @property
+    def degraded(self):
+        return self.breaker.degraded
+
+    def _bucket(self, model):
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            bucket = self._buckets.setdefault(model, TokenBucket(self.rate, self.burst))
+        return bucket
+
+    def _backoff(self, attempt, error):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        requested = retry_after(error)
+        if requested is not None:
+            delay = max(delay, min(requested, self.backoff_max))
+        return delay
+
+    def call(self, model, fn, /, *args, **kwargs):
+        """Call fn(*args, **kwargs) against `model` with rate limiting, retries and the circuit breaker"""
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise ProviderUnavailable(f"{self.name} is degraded (circuit open)")
+
+            waited = time.monotonic()
+            if not self._bucket(model).acquire(timeout=self.rate_limit_timeout):
+                self.breaker.release()  # nothing was sent
+                raise ProviderUnavailable(f"{self.name} {model} rate limit exceeded")
+            RATE_LIMIT_WAIT.observe(time.monotonic() - waited, provider=self.name)
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The provider answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    FAILURES.inc(provider=self.name)
+                    raise
+                reason = str(status_code(e) or type(e).__name__)
+                RETRIES.inc(provider=self.name, reason=reason)
+                delay = self._backoff(attempt, e)
+                logger.warning("Retrying provider call", extra={"fields": {
+                    "provider": self.name, "model": model, "attempt": attempt + 1,
+                    "reason": reason, "delay_s": round(delay, 2)
+                }})
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
@@ -0,0 +1,131 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app.telemetry import METRICS
+
+HEDGES = METRICS.counter(
+    "kachow_hedges_total", "Hedged expert calls, by outcome (fired, won, lost)", ("expert", "outcome")
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def hedge_executor():
+    """Pool for primary and hedge calls, separate from the orchestrator's so hedges can't starve rounds"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("HEDGE_POOL_SIZE", "32")), thread_name_prefix="hedge"
+                )
+    return _executor
+
+
+def reset_hedge_executor():
+    """Drop the pool inherited across fork(); the next hedged call builds a fresh one"""
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+def is_valid_result(result):
+    """A parsed JSON identification, as opposed to an error or unparseable response"""
+    return isinstance(result, dict) and not ({"error", "raw_text", "note"} & result.keys())
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class Hedger:
+    """
+    Issues a second request when the first hasn't answered by the expert's
+    recent latency percentile (clamped to [min_delay, max_delay]; initial_delay
+    until enough samples exist). The hedge repeats the call or uses a fallback
+    model; the first valid JSON result wins and the other is cancelled, or its
+    result discarded if it is already running.
+
+    Configured per expert from {PREFIX}_HEDGE, _HEDGE_PERCENTILE, _HEDGE_MODEL,
+    _HEDGE_MIN_DELAY, _HEDGE_MAX_DELAY and _HEDGE_INITIAL_DELAY.
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, expert, prefix=None):
+        prefix = (prefix or expert).upper()
+        self.expert = expert
+        self.enabled = os.getenv(f"{prefix}_HEDGE", "0") == "1"
+        self.percentile = float(os.getenv(f"{prefix}_HEDGE_PERCENTILE", "95"))
+        self.fallback_model = os.getenv(f"{prefix}_HEDGE_MODEL") or None
+        self.min_delay = float(os.getenv(f"{prefix}_HEDGE_MIN_DELAY", "1"))
+        self.max_delay = float(os.getenv(f"{prefix}_HEDGE_MAX_DELAY", "20"))
+        self.initial_delay = float(os.getenv(f"{prefix}_HEDGE_INITIAL_DELAY", "8"))
+        self.latencies = LatencyTracker()
+
+    def delay(self):
+        if len(self.latencies) < self.MIN_SAMPLES:
+            return self.initial_delay
+        return min(self.max_delay, max(self.min_delay, self.latencies.percentile(self.percentile)))
+
+    def _timed(self, fn):
+        started = time.monotonic()
+        result = fn()
+        if is_valid_result(result):
+            self.latencies.add(time.monotonic() - started)
+        return result
+
+    def call(self, primary, hedge=None):
+        """Run primary(); if it is slow, race it against hedge() (or a second primary())"""
+        if not self.enabled:
+            return self._timed(primary)
+
+        executor = hedge_executor()
+        futures = {executor.submit(contextvars.copy_context().run, self._timed, primary): "primary"}
+        done, _ = wait(futures, timeout=self.delay())
+        if done:
+            return next(iter(done)).result()
+
+        HEDGES.inc(expert=self.expert, outcome="fired")
+        futures[executor.submit(contextvars.copy_context().run, self._timed, hedge or primary)] = "hedge"
+
+        fallback = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                if is_valid_result(result):
+                    for loser in pending:
+                        loser.cancel()
+                    HEDGES.inc(expert=self.expert, outcome="won" if futures[future] == "hedge" else "lost")
+                    return result
+                fallback = fallback or result
+
+        # Neither produced valid JSON; surface what the primary (or hedge) returned
+        return fallback
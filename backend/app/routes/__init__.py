@@ -1,6 +1,9 @@
 # app/routes/__init__.py
-from flask import Blueprint
 from .identify import identify_bp
+from .metrics import metrics_bp
+from .health import health_bp
 
 def register_routes(app):
     app.register_blueprint(identify_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(health_bp)
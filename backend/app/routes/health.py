@@ -0,0 +1,27 @@
+# app/routes/health.py
+from flask import Blueprint, jsonify
+from app.lifecycle import is_draining
+from app.pipeline.service import get_identification_service
+from app.warmup import get_warm_up
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving, whether or not warm-up has finished"""
+    return jsonify({"status": "ok"})
+
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: 503 with per-step progress until the background warm-up is
+    done, and while draining. Admission-control load is reported but doesn't
+    affect readiness: shedding already protects the process.
+    """
+    report = get_warm_up().report()
+    if is_draining():
+        report.update(ready=False, draining=True)
+    admission = get_identification_service().admission
+    if admission is not None:
+        report["admission"] = admission.stats()
+    return jsonify(report), 200 if report["ready"] else 503
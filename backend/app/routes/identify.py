@@ -1,148 +1,334 @@
 # app/routes/identify.py
-from flask import Blueprint, request, jsonify
-from app.experts.openai_expert import OpenAIHandler
-from app.experts.gemini_expert import GeminiHandler
-from app.experts.custom_model_expert import CustomModelHandler
+import json
+import logging
 import os
-from app.experts.aggregate_results import AggregateResults
-from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
+import queue
+import threading
+from flask import Blueprint, Response, request, jsonify
+from app.persistence import get_store
+from app.pipeline.admission import Overloaded
+from app.pipeline.jobs import IdentificationJob, get_job_queue
+from app.pipeline.service import get_identification_service
+from app.telemetry import RequestTrace
+from utils.image_fetch import ImageFetchError
 
-if not firebase_admin._apps:
-    load_dotenv('.env.local')
+logger = logging.getLogger(__name__)
 
-    key_path = os.getenv('SERVICE_ACCOUNT_KEY')
-    if not key_path:
-        raise ValueError("SERVICE_ACCOUNT_KEY not found in environment variables")
+identify_bp = Blueprint('identify', __name__)
 
-    cred = credentials.Certificate(key_path)
-    firebase_admin.initialize_app(cred)
+# Room for the multipart framing and form fields around an uploaded image
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+
+def read_identify_request():
+    """
+    The fields of an identification request and, for a direct upload, a
+    stream of the image. Besides JSON with an image_url, the image can be
+    sent as the `image` part of a multipart/form-data body (fields as form
+    fields) or as a raw image/* body (fields as query parameters).
+    """
+    mimetype = request.mimetype
+    raw_upload = mimetype.startswith("image/") or mimetype == "application/octet-stream"
+    if mimetype == "multipart/form-data" or raw_upload:
+        # Refuse oversized bodies with a 413 before reading them; Werkzeug spools large parts to disk
+        request.max_content_length = get_identification_service().fetcher.max_bytes + UPLOAD_OVERHEAD_BYTES
+    if mimetype == "multipart/form-data":
+        upload = request.files.get("image")
+        return request.form, upload.stream if upload else None
+    if raw_upload:
+        return request.args, request.stream
+    return request.get_json(), None
+
+
+def read_user_guess(data):
+    """
+    The user's {"make", "model"} guess, or None. JSON bodies send it as an
+    object; form fields and query parameters as a JSON string in `user_guess`
+    or as separate `user_guess_make` / `user_guess_model` fields. Raises
+    ValueError for anything else.
+    """
+    guess = data.get("user_guess")
+    if isinstance(guess, str):
+        try:
+            guess = json.loads(guess) if guess.strip() else None
+        except ValueError:
+            raise ValueError("user_guess must be a JSON object with make and model")
+    if guess is None and ("user_guess_make" in data or "user_guess_model" in data):
+        guess = {"make": data.get("user_guess_make", ""), "model": data.get("user_guess_model", "")}
+    if guess is None:
+        return None
+    if not isinstance(guess, dict) or not all(isinstance(guess.get(field, ""), str) for field in ("make", "model")):
+        raise ValueError("user_guess must be a JSON object with make and model")
+    return {"make": guess.get("make", ""), "model": guess.get("model", "")}
+
+
+def overloaded(e):
+    """503 telling the client when to come back, for a request admission control shed"""
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
+
+
+def wants_async(data):
+    value = data.get("async")
+    return value is True or str(value).lower() in ("1", "true") or request.args.get("async") == "1"
 
-identify_bp = Blueprint('identify', __name__)
 
 @identify_bp.route('/identify', methods=['POST', 'OPTIONS'])
 def identify_car():
     if request.method == 'OPTIONS':
         return '', 200
     
-    data = request.get_json()
+    data, upload = read_identify_request()
     image_url = data.get("image_url")
     user_id = data.get("user_id")
-    user_guess = data.get("user_guess")
-    print(image_url)
+    logger.info("Identification requested", extra={"fields": {
+        "image_url": image_url, "user_id": user_id, "upload": upload is not None
+    }})
 
-    if not image_url:
-        return jsonify({"error": "No image_url provided"}), 400
+    if not image_url and upload is None:
+        return jsonify({"error": "No image_url or image provided"}), 400
 
     if not user_id:
         return jsonify({"error": "No user_id provided"}), 400
 
     try:
-        # Initialize experts and aggregator
-        gemini_handler = GeminiHandler()
-        openai_handler = OpenAIHandler()
-        custom_model_handler = CustomModelHandler()
-        aggregator = AggregateResults()
-        # First round - get initial opinions
-        print("Starting first round of identification...")
-        gemini_result = gemini_handler.identify_car(image_url)
-        openai_result = openai_handler.identify_car(image_url)
-        custom_model_result = custom_model_handler.identify_car(image_url)
-        #openai_result = {'make': 'Ford', 'model': 'Transit Custom', 'year': '2018', 'confidence': 'high', 'details': "The vehicle's front design and badges are consistent with the Ford Transit Custom model, particularly from the 2018 generation."}
-        print("Gemini Result:", gemini_result)
-        print("OpenAI Result:", openai_result)
-        print("Custom Model Result:", custom_model_result)
-        # Aggregate the expert results
-
-        first_round_aggregated = aggregator.aggregate_experts(
-            openai_result,
-            gemini_result,
-            custom_model_result
-        )
-
-        print("First round aggregated results:", first_round_aggregated)
-        
-        # Check confidence level - if not high, do a second round with blackboard approach
-
-        results_payload = {
-            "custom_model": custom_model_result,
-            "process": "single_round",  # default
-            "openai": openai_result,
-            "gemini": gemini_result,
-            "aggregated": first_round_aggregated,
-        }
+        user_guess = read_user_guess(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Second round if needed
-        if first_round_aggregated.get("confidence", "").lower() != "high":
-            print("Confidence not high enough, initiating second round with blackboard approach...")            
-            # Create context for experts - what other experts thought
-
-
-            openai_context = {
-                "gemini": gemini_result,
-                "custom_model": custom_model_result,
-                "first_aggregation": first_round_aggregated
-            }
-
-            gemini_context = {
-                "openai": openai_result,
-                "custom_model": custom_model_result,
-                "first_aggregation": first_round_aggregated
-            }            
-            # Second round - with context
-
-
-            openai_second_result = openai_handler.identify_car(image_url, openai_context)
-            gemini_second_result = gemini_handler.identify_car(image_url, gemini_context)
-            
-            print("OpenAI Second Round Result:", openai_second_result)
-            print("Gemini Second Round Result:", gemini_second_result)
-            
-            # Final aggregation with second round results
-
-            final_aggregated = aggregator.aggregate_experts(
-                openai_second_result,
-                gemini_second_result,
-                custom_model_result
-            )
+    service = get_identification_service()
+
+    # Job mode: answer with the document id straight away and identify in the background
+    if wants_async(data):
+        if upload is None:
+            return enqueue_identification(user_id, image_url, user_guess)
+        try:
+            image = service.receive(upload)
+        except ImageFetchError as e:
+            return jsonify({"error": str(e)}), 400
+        return enqueue_identification(user_id, image_url, user_guess, image)
+
+    with RequestTrace().activate():
+        # Decode the image once, uploaded or downloaded; every expert shares the result
+        try:
+            image = service.receive(upload) if upload is not None else service.fetch(image_url)
+        except ImageFetchError as e:
+            return jsonify({"error": str(e)}), 400
+        if upload is not None:
+            # Stored in the background while the experts run
+            image_url = service.keep_upload(user_id, image) or image_url
+
+        try:
+            results_payload, cache_status = service.identify(image)
+
+            # Store results in Firestore
+            doc_id = service.save(user_id, image_url, user_guess, results_payload)
+            logger.info("Identification stored", extra={"fields": {"doc_id": doc_id, "cache": cache_status}})
 
-            results_payload.update({
-                "openai": {
-                    "first_round": openai_result,
-                    "second_round": openai_second_result
-                },
-                "gemini": {
-                    "first_round": gemini_result,
-                    "second_round": gemini_second_result
-                },
-                "aggregated": final_aggregated,
-                "process": "blackboard_two_rounds"
-            })
-
-        # Store results in Firestore
-        _, doc_ref = firestore.client().collection(
-                f"users/{user_id}/identifications"
-            ).add({
-                "user_id": user_id,
-                "image_url": image_url,
-                "user_guess": user_guess,
-                "results": results_payload,
-                "timestamp": firestore.SERVER_TIMESTAMP
-            })
-
-        print(doc_ref)
-        
-
-        return jsonify({"doc_id": doc_ref.id})
+            return jsonify({"doc_id": doc_id, "cache": cache_status})
 
+        except Overloaded as e:
+            return overloaded(e)
+        except Exception as e:
+            logger.exception("Error during identification")
+            return jsonify({"error": str(e)}), 500
+
+
+def enqueue_identification(user_id, image_url, user_guess, image=None):
+    if image is None and not image_url.startswith(("http://", "https://")):
+        return jsonify({"error": "image_url must be an http(s) URL"}), 400
+
+    job_queue = get_job_queue()
+    if not job_queue.reserve():
+        response = jsonify({"error": "Too many identifications in progress, try again shortly"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+
+    if image is not None:
+        image_url = get_identification_service().keep_upload(user_id, image) or image_url
+
+    try:
+        doc_id = get_store().create_pending(user_id, image_url, user_guess)
     except Exception as e:
-        print("Error during identification:", e)
+        job_queue.release()
+        logger.exception("Error creating identification")
         return jsonify({"error": str(e)}), 500
 
+    job_queue.submit(IdentificationJob(doc_id, user_id, image_url, user_guess, image))
+    return jsonify({"doc_id": doc_id, "status": "pending"}), 202
+
+
+@identify_bp.route('/identify/batch', methods=['POST', 'OPTIONS'])
+def identify_car_batch():
+    """
+    Identify up to BATCH_MAX_IMAGES images in one call. Images are fetched
+    concurrently, each goes to the experts as soon as it arrives, and the
+    results are stored with one Firestore batch. Returns one entry per
+    image_url, in order: {"image_url", "doc_id", "cache", "aggregated"},
+    {"image_url", "error"} for images that couldn't be downloaded, or
+    {"image_url", "error", "retry_after"} for images admission control shed.
+    Only when every image is shed does the whole call get a 503.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    data = request.get_json()
+    image_urls = data.get("image_urls")
+    user_id = data.get("user_id")
+    user_guess = data.get("user_guess")
+    max_images = int(os.getenv("BATCH_MAX_IMAGES", "50"))
+    logger.info("Batch identification requested", extra={"fields": {
+        "images": len(image_urls) if isinstance(image_urls, list) else None, "user_id": user_id
+    }})
+
+    if not isinstance(image_urls, list) or not image_urls or not all(isinstance(url, str) for url in image_urls):
+        return jsonify({"error": "image_urls must be a non-empty list of URLs"}), 400
+
+    if len(image_urls) > max_images:
+        return jsonify({"error": f"At most {max_images} images per batch"}), 400
+
+    if not user_id:
+        return jsonify({"error": "No user_id provided"}), 400
+
+    service = get_identification_service()
+    with RequestTrace("identify_batch").activate():
+        try:
+            identified = service.identify_many(image_urls)
+            ok = [i for i, result in enumerate(identified) if not isinstance(result, Exception)]
+            shed = [result for result in identified if isinstance(result, Overloaded)]
+            if shed and not ok:
+                return overloaded(shed[0])
+            doc_ids = service.save_many(user_id, [(image_urls[i], user_guess, identified[i][0]) for i in ok])
+        except Exception as e:
+            logger.exception("Error during batch identification")
+            return jsonify({"error": str(e)}), 500
+
+    results = [{"image_url": url, "error": str(result)} for url, result in zip(image_urls, identified)]
+    for i, result in enumerate(identified):
+        if isinstance(result, Overloaded):
+            results[i]["retry_after"] = result.retry_after
+    for i, doc_id in zip(ok, doc_ids):
+        results_payload, cache_status = identified[i]
+        results[i] = {
+            "image_url": image_urls[i],
+            "doc_id": doc_id,
+            "cache": cache_status,
+            "aggregated": results_payload.get("aggregated"),
+        }
+    logger.info("Batch identification stored", extra={"fields": {"images": len(image_urls), "stored": len(doc_ids)}})
+    return jsonify({"results": results})
+
+
+@identify_bp.route('/identify/stream', methods=['GET', 'POST', 'OPTIONS'])
+def identify_car_stream():
+    """
+    Same pipeline as /identify, streamed as Server-Sent Events: an `expert`
+    event as each expert answers, `first_round` / `second_round` with each
+    aggregate, then `done` with the stored doc_id (or `error`).
+    GET takes the same fields as query parameters, for EventSource clients
+    (user_guess as for an upload, see read_user_guess); POST also takes a
+    direct upload like /identify.
+    """
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    data, upload = read_identify_request() if request.method == 'POST' else (request.args, None)
+    image_url = data.get("image_url")
+    user_id = data.get("user_id")
+
+    if not image_url and upload is None:
+        return jsonify({"error": "No image_url or image provided"}), 400
+
+    if not user_id:
+        return jsonify({"error": "No user_id provided"}), 400
+
+    try:
+        user_guess = read_user_guess(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    service = get_identification_service()
+    trace = RequestTrace("identify_stream")
+    with trace.activate():
+        try:
+            image = service.receive(upload) if upload is not None else service.fetch(image_url)
+        except ImageFetchError as e:
+            return jsonify({"error": str(e)}), 400
+        if upload is not None:
+            image_url = service.keep_upload(user_id, image) or image_url
+
+    events = queue.Queue()
+
+    def run():
+        try:
+            results_payload, cache_status = service.identify(
+                image, on_event=lambda event, data: events.put((event, data))
+            )
+            # Stored exactly as the blocking route does, so history keeps working
+            doc_id = service.save(user_id, image_url, user_guess, results_payload)
+            events.put(("done", {
+                "doc_id": doc_id,
+                "cache": cache_status,
+                "aggregated": results_payload["aggregated"]
+            }))
+        except Overloaded as e:
+            events.put(("error", {"error": str(e), "retry_after": e.retry_after}))
+        except Exception as e:
+            logger.exception("Error during identification")
+            events.put(("error", {"error": str(e)}))
+        finally:
+            events.put(None)
+
+    def run_traced():
+        with trace.activate():
+            run()
+
+    threading.Thread(target=run_traced, name="identify-stream", daemon=True).start()
+
+    def generate():
+        while True:
+            try:
+                item = events.get(timeout=15)
+            except queue.Empty:
+                # Keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                return
+            event, payload = item
+            yield f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@identify_bp.route('/identify/<doc_id>', methods=['GET'])
+def identification_status(doc_id):
+    user_id = request.args.get("user_id")
+    if not user_id:
+        return jsonify({"error": "No user_id provided"}), 400
+
+    job = get_job_queue().get(doc_id)
+    if job and job.user_id == user_id:
+        return jsonify(job.to_dict()), 200
+
+    # Not a recent job of this process - fall back to the stored document
+
+    document = get_store().get(user_id, doc_id)
+    if document is None:
+        return jsonify({"error": "Identification not found"}), 404
+
+    return jsonify({
+        "doc_id": doc_id,
+        "user_id": user_id,
+        "status": document.get("status", "done"),
+        "error": document.get("error"),
+    }), 200
 
 
 @identify_bp.route('/test', methods=['GET'])
 def test():
-    print("Start /test endpoint")
     return jsonify({"message": "Test endpoint reached successfully!"}), 200
@@ -0,0 +1,9 @@
+# app/routes/metrics.py
+from flask import Blueprint, Response
+from app.telemetry import METRICS
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
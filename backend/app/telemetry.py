@@ -0,0 +1,336 @@
+"""
+Low-overhead observability: a JSON structured logger, an in-process
+Prometheus-style metrics registry and per-request traces that record how long
+each pipeline stage took and how many tokens each provider call used.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per million (input, output) tokens, for the estimated cost counters
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+
+# --- Logging -----------------------------------------------------------------
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; extra fields go in via logger.info(msg, extra={"fields": {...}})"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace = _current_trace.get()
+        if trace is not None:
+            entry["trace_id"] = trace.trace_id
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Route the app's loggers through the JSON formatter (LOG_LEVEL, default INFO)"""
+    logger = logging.getLogger("app")
+    if any(isinstance(handler.formatter, JSONFormatter) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JSONFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+
+# --- Metrics -----------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Set directly, or computed at scrape time by a callback returning {label tuple: value}"""
+
+    type = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                return []
+            if not isinstance(values, dict):
+                values = {(): values}
+            return [(self.name, tuple(key), (), value) for key, value in values.items()]
+        return super().samples()
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            # [per-bucket counts, sum, count]
+            state = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    samples.append((self.name + "_bucket", key, (f'le="{bound}"',), bucket_count))
+                samples.append((self.name + "_bucket", key, ('le="+Inf"',), count))
+                samples.append((self.name + "_sum", key, (), total))
+                samples.append((self.name + "_count", key, (), count))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        gauge = self._register(Gauge, name, help_text, labels)
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_label_text(metric.labels, key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    "kachow_stage_seconds", "Time spent in each pipeline stage", ("stage", "expert", "round")
+)
+TOKENS = METRICS.counter(
+    "kachow_tokens_total", "Tokens used per provider call", ("provider", "model", "kind")
+)
+COST = METRICS.counter(
+    "kachow_estimated_cost_usd_total", "Estimated provider spend from token usage", ("provider", "model")
+)
+REQUESTS = METRICS.counter(
+    "kachow_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status")
+)
+REQUEST_SECONDS = METRICS.histogram(
+    "kachow_request_seconds", "HTTP request latency by endpoint", ("endpoint",)
+)
+IMAGE_BYTES = METRICS.histogram(
+    "kachow_image_bytes", "Image size as downloaded and as sent to the LLM experts", ("view",),
+    buckets=(50e3, 100e3, 250e3, 500e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+)
+IDENTIFICATIONS = METRICS.counter(
+    "kachow_identifications_total", "Identifications by pipeline path", ("process", "aggregation_mode", "cache")
+)
+
+
+# --- Tracing -----------------------------------------------------------------
+
+_current_trace = contextvars.ContextVar("kachow_trace", default=None)
+
+
+class RequestTrace:
+    """Timeline of one identification: a span per stage plus provider token usage"""
+
+    def __init__(self, name="identify"):
+        self.name = name
+        self.trace_id = os.urandom(8).hex()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.usage = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def add_span(self, stage, started, duration, attrs):
+        with self._lock:
+            self.spans.append(dict(
+                attrs,
+                stage=stage,
+                start_ms=round((started - self.started) * 1000, 1),
+                ms=round(duration * 1000, 1)
+            ))
+
+    def add_usage(self, usage):
+        with self._lock:
+            self.usage.append(usage)
+
+    def summary(self):
+        """Timing breakdown stored alongside results_payload"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+            usage = list(self.usage)
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": spans,
+            "tokens": {
+                "prompt": sum(u["prompt_tokens"] for u in usage),
+                "completion": sum(u["completion_tokens"] for u in usage),
+            },
+            "estimated_cost_usd": round(sum(u["estimated_cost_usd"] for u in usage), 6),
+            "provider_calls": usage,
+        }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage, expert="", round="", **attrs):
+    """Time a block into the stage histogram and, if a request is being traced, its timeline"""
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.observe(duration, stage=stage, expert=expert, round=round)
+        trace = _current_trace.get()
+        if trace is not None:
+            labels = {key: value for key, value in (("expert", expert), ("round", round)) if value}
+            trace.add_span(stage, started, duration, dict(labels, **attrs))
+
+
+def record_usage(provider, model, prompt_tokens, completion_tokens):
+    """Count a provider call's token usage and estimated cost"""
+    prompt_tokens = int(prompt_tokens or 0)
+    completion_tokens = int(completion_tokens or 0)
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    TOKENS.inc(prompt_tokens, provider=provider, model=model, kind="prompt")
+    TOKENS.inc(completion_tokens, provider=provider, model=model, kind="completion")
+    COST.inc(cost, provider=provider, model=model)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_usage({
+            "provider": provider,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated_cost_usd": round(cost, 6),
+        })
+
+
+def record_openai_usage(response, model, provider="openai"):
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_usage(provider, model, getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0))
+
+
+def record_gemini_usage(result, model):
+    usage = getattr(result, "usage_metadata", None)
+    if usage is not None:
+        record_usage("gemini", model, getattr(usage, "prompt_token_count", 0),
+                     getattr(usage, "candidates_token_count", 0))
+
+
+def instrument_app(app):
+    """Count and time every request by endpoint"""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        started = g.get("request_started")
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        return response
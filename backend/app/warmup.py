@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+from flask import current_app
+from app.telemetry import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """
+    Runs the named start-up steps (building the experts, loading the logo
+    model, connecting to Firestore) in order, normally on a background thread
+    so the app can accept traffic straight away. Progress is reported by
+    /readyz. A failed step is logged and retried lazily on first use.
+
+    Steps named in `deferred` are left out of run() and only run by
+    run_deferred(), which app.lifecycle.after_fork calls in each worker: for
+    work that must not happen in a pre-fork master, like a TensorFlow predict.
+    """
+
+    def __init__(self, steps, deferred=()):
+        self.steps = list(steps)
+        self.deferred = set(deferred)
+        self.status = {name: "deferred" if name in self.deferred else "pending" for name, _ in self.steps}
+        self.errors = {}
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+        METRICS.gauge("kachow_ready", "1 once start-up warm-up has finished",
+                      callback=lambda: int(self.ready))
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def start(self):
+        """Run the steps on a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+            self._thread.start()
+        return self
+
+    def run(self):
+        self.started_at = time.monotonic()
+        self._run_steps([(name, step) for name, step in self.steps if name not in self.deferred])
+        self.finished_at = time.monotonic()
+        self._done.set()
+
+    def run_deferred(self):
+        """Run the deferred steps on the calling thread"""
+        self._run_steps([(name, step) for name, step in self.steps if self.status[name] == "deferred"])
+
+    def _run_steps(self, steps):
+        for name, step in steps:
+            self.status[name] = "running"
+            step_started = time.monotonic()
+            try:
+                step()
+                self.status[name] = "ready"
+            except Exception as e:
+                self.status[name] = "failed"
+                self.errors[name] = str(e)
+                logger.warning("Warm-up failed", extra={"fields": {"step": name, "error": str(e)}})
+            logger.info("Warm-up step finished", extra={"fields": {
+                "step": name, "status": self.status[name], "seconds": round(time.monotonic() - step_started, 3)
+            }})
+
+    def skip(self):
+        """Mark warm-up as done without running anything; handlers are built on first use"""
+        self.status = {name: "skipped" for name in self.status}
+        self._done.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def report(self):
+        report = {"ready": self.ready, "steps": dict(self.status)}
+        if self.errors:
+            report["errors"] = dict(self.errors)
+        if self.started_at is not None:
+            report["seconds"] = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return report
+
+
+def get_warm_up():
+    return current_app.extensions["warm_up"]
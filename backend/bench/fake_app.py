@@ -0,0 +1,19 @@
+"""
+The bench app (create_app() wired to the stand-in experts and Firestore) as a
+WSGI app, for load-testing serving setups without API keys:
+
+    python -m bench.fake_app                                    # Flask dev server, as run.py
+    gunicorn -c gunicorn.conf.py bench.fake_app:app             # production config
+    python -m bench.run_bench --target http://127.0.0.1:5001 --requests 200 --concurrency 32
+
+Stand-in options are taken from BENCH_ARGS, e.g. BENCH_ARGS="--latency-scale 0.5 --error-rate 0.05".
+"""
+import os
+import shlex
+from bench.fakes import StageRecorder
+from bench.run_bench import build_app, make_parser
+
+app = build_app(make_parser().parse_args(shlex.split(os.getenv("BENCH_ARGS", ""))), StageRecorder())
+
+if __name__ == '__main__':
+    app.run(debug=True, use_reloader=False, host="0.0.0.0", port=5001)
@@ -0,0 +1,305 @@
+"""
+Local stand-ins for OpenAI, Gemini, the logo model and Firestore, shaped like
+the parts of each SDK the experts use, with configurable latency and error rates.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+import numpy as np
+
+CARS = [
+    ("Honda", "Civic", "2021"),
+    ("Toyota", "Corolla", "2019"),
+    ("Ford", "Mustang", "2018"),
+    ("BMW", "3 Series", "2020"),
+    ("Tesla", "Model 3", "2022"),
+]
+
+
+class StageRecorder:
+    """Thread-safe collection of (stage, seconds) samples"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+
+class LatencyModel:
+    """Log-normal latency around a median, plus an independent error rate"""
+
+    def __init__(self, median, sigma=0.3, error_rate=0.0, rng=None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def parse(cls, spec, error_rate=0.0, scale=1.0):
+        """'0.8' or '0.8:0.4' (median seconds : sigma)"""
+        median, _, sigma = spec.partition(":")
+        return cls(float(median) * scale, float(sigma or 0.3), error_rate)
+
+    def sleep(self):
+        seconds = self.median * self.rng.lognormvariate(0, self.sigma) if self.median else 0.0
+        time.sleep(seconds)
+        return seconds
+
+    def should_fail(self):
+        return self.rng.random() < self.error_rate
+
+
+class FakeProviderError(Exception):
+    """Looks enough like an SDK API error for retry/rate-limit handling"""
+
+    def __init__(self, status_code=500, retry_after=None):
+        super().__init__(f"Fake provider error {status_code}")
+        self.status_code = status_code
+        self.response = None
+        self.retry_after = retry_after
+
+
+class Answers:
+    """Picks the car each expert 'sees', with a tunable chance the LLM experts disagree"""
+
+    def __init__(self, agreement=0.8, rng=None):
+        self.agreement = agreement
+        self.rng = rng or random.Random()
+
+    def pick(self, seed_car):
+        if self.rng.random() < self.agreement:
+            return seed_car
+        return self.rng.choice(CARS)
+
+    def expert_json(self, seed_car):
+        make, model, year = self.pick(seed_car)
+        return json.dumps({
+            "make": make,
+            "model": model,
+            "year": year,
+            "confidence": self.rng.choice(["high", "high", "medium"]),
+            "details": f"Grille and headlights match a {year} {make} {model}."
+        })
+
+
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeOpenAI:
+    """Implements client.chat.completions.create(...) like the OpenAI SDK"""
+
+    def __init__(self, stage, latency, answers, recorder, seed_car=CARS[0]):
+        self.stage = stage
+        self.latency = latency
+        self.answers = answers
+        self.recorder = recorder
+        self.seed_car = seed_car
+        self.chat = _Obj(completions=_Obj(create=self.create))
+
+    def create(self, model=None, messages=None, max_tokens=None, **kwargs):
+        seconds = self.latency.sleep()
+        self.recorder.record(self.stage, seconds)
+        if self.latency.should_fail():
+            raise FakeProviderError(self.latency.rng.choice([429, 500, 503]))
+
+        content = self.answers.expert_json(self.seed_car)
+        prompt_tokens = sum(len(json.dumps(m)) for m in messages or []) // 4
+        completion_tokens = len(content) // 4
+        return _Obj(
+            choices=[_Obj(message=_Obj(content=content))],
+            usage=_Obj(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                       total_tokens=prompt_tokens + completion_tokens),
+            model=model
+        )
+
+
+class FakeGenerativeModel:
+    """Implements generate_content(...) like google.generativeai.GenerativeModel"""
+
+    def __init__(self, latency, answers, recorder, seed_car=CARS[0]):
+        self.latency = latency
+        self.answers = answers
+        self.recorder = recorder
+        self.seed_car = seed_car
+
+    def generate_content(self, contents=None, generation_config=None, **kwargs):
+        seconds = self.latency.sleep()
+        self.recorder.record("gemini", seconds)
+        if self.latency.should_fail():
+            raise FakeProviderError(self.latency.rng.choice([429, 500, 503]))
+
+        text = self.answers.expert_json(self.seed_car)
+        prompt_tokens = 258 + sum(len(p.get("text", "")) for c in contents or [] for p in c["parts"]) // 4
+        return _Obj(
+            text=text,
+            usage_metadata=_Obj(prompt_token_count=prompt_tokens, candidates_token_count=len(text) // 4,
+                                total_token_count=prompt_tokens + len(text) // 4)
+        )
+
+
+class FakeLogoRuntime:
+    """Logo model runtime with a fixed per-call cost plus a per-image cost, like Keras predict"""
+
+    name = "fake"
+    model_path = "fake"
+
+    def __init__(self, recorder, call_overhead=0.015, per_image=0.003, classes=19, seed=0):
+        self.recorder = recorder
+        self.call_overhead = call_overhead
+        self.per_image = per_image
+        self.classes = classes
+        self.rng = np.random.default_rng(seed)
+        self.projection = np.random.default_rng(seed + 1).normal(size=(14 * 14 * 3, 64)).astype(np.float32)
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        return self.predict_with_embedding(batch)[0]
+
+    def predict_with_embedding(self, batch):
+        """Logits plus a deterministic 64-d embedding of the image (a random projection of its pooled pixels)"""
+        seconds = self.call_overhead + self.per_image * len(batch)
+        time.sleep(seconds)
+        self.recorder.record("custom_model_predict", seconds)
+        with self._lock:
+            logits = self.rng.normal(size=(len(batch), self.classes)).astype(np.float32)
+        logits[:, 18] += 4.0  # mostly 'Honda'
+        pooled = batch.reshape(len(batch), 14, 16, 14, 16, 3).mean(axis=(2, 4)).reshape(len(batch), -1)
+        embeddings = (pooled - pooled.mean(axis=1, keepdims=True)) @ self.projection
+        return logits, embeddings.astype(np.float32)
+
+
+class InMemoryFirestore:
+    """
+    Firestore double covering collection().add/document().set/get/update and
+    batch().set/commit, with a configurable round-trip latency.
+    """
+
+    def __init__(self, latency=None, recorder=None):
+        self.latency = latency or LatencyModel(0.0)
+        self.recorder = recorder or StageRecorder()
+        self.documents = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self, stage):
+        seconds = self.latency.sleep()
+        self.recorder.record(stage, seconds)
+        if self.latency.should_fail():
+            raise FakeProviderError(503)
+
+    def collection(self, path):
+        return _FakeCollection(self, path)
+
+    def batch(self):
+        return _FakeBatch(self)
+
+    def _write(self, path, doc_id, fields, merge):
+        with self._lock:
+            key = (path, doc_id)
+            if merge and key in self.documents:
+                self.documents[key].update(fields)
+            else:
+                self.documents[key] = dict(fields)
+
+
+class _FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _FakeDocument:
+    def __init__(self, db, path, doc_id):
+        self._db = db
+        self._path = path
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._path}/{self.id}"
+
+    def set(self, fields, merge=False):
+        self._db._round_trip("firestore_write")
+        self._db._write(self._path, self.id, fields, merge)
+
+    def update(self, fields):
+        self.set(fields, merge=True)
+
+    def get(self):
+        self._db._round_trip("firestore_read")
+        with self._db._lock:
+            return _FakeSnapshot(self.id, self._db.documents.get((self._path, self.id)))
+
+
+class _FakeCollection:
+    def __init__(self, db, path):
+        self._db = db
+        self._path = path
+
+    def document(self, doc_id=None):
+        return _FakeDocument(self._db, self._path, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, fields):
+        doc = self.document()
+        doc.set(fields)
+        return None, doc
+
+
+class _FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, doc, fields, merge=False):
+        self._writes.append((doc, fields, merge))
+
+    def update(self, doc, fields):
+        self.set(doc, fields, merge=True)
+
+    def commit(self):
+        self._db._round_trip("firestore_commit")
+        for doc, fields, merge in self._writes:
+            self._db._write(doc._path, doc.id, fields, merge)
+        return [None] * len(self._writes)
+
+
+class InMemoryBucket:
+    """Cloud Storage bucket double covering blob().upload_from_string, with a configurable write latency"""
+
+    name = "bench-bucket"
+
+    def __init__(self, latency=None, recorder=None):
+        self.latency = latency or LatencyModel(0.0)
+        self.recorder = recorder or StageRecorder()
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def blob(self, name):
+        return _FakeBlob(self, name)
+
+
+class _FakeBlob:
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self.name = name
+
+    def upload_from_string(self, data, content_type=None):
+        seconds = self._bucket.latency.sleep()
+        self._bucket.recorder.record("storage_write", seconds)
+        with self._bucket._lock:
+            self._bucket.objects[self.name] = (bytes(data), content_type)
@@ -0,0 +1,78 @@
+"""
+Static image server for benchmarks. Serves files from a directory; a `nonce`
+query parameter appends that many trailing bytes after the image data, which
+decoders ignore but which changes the SHA-256, so each nonce is a cache miss.
+An optional latency model delays each response, standing in for a storage read.
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class ImageServer:
+    def __init__(self, directory="public", host="127.0.0.1", port=0, latency=None):
+        self.directory = os.path.abspath(directory)
+        self.latency = latency
+        self._files = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if server.latency is not None:
+                    server.latency.sleep()
+                data = server.load(url.path.lstrip("/"))
+                if data is None:
+                    self.send_error(404)
+                    return
+                nonce = parse_qs(url.query).get("nonce", ["0"])[0]
+                if nonce.isdigit() and int(nonce):
+                    data = data + int(nonce).to_bytes(8, "big")
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # Batch requests open many connections at once; the default backlog of 5 turns that into SYN retries
+            request_queue_size = 128
+
+        self.httpd = Server((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    def load(self, name):
+        if name not in self._files:
+            path = os.path.abspath(os.path.join(self.directory, name))
+            if not path.startswith(self.directory + os.sep) or not os.path.isfile(path):
+                return None
+            with open(path, "rb") as f:
+                self._files[name] = f.read()
+        return self._files[name]
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def image(self, name, nonce=0):
+        """The bytes url(name, nonce) serves"""
+        data = self.load(name)
+        return data + int(nonce).to_bytes(8, "big") if nonce else data
+
+    def url(self, name, nonce=0):
+        return f"{self.base_url}/{name}" + (f"?nonce={nonce}" if nonce else "")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="bench-images", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
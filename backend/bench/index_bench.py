@@ -0,0 +1,126 @@
+"""
+Recall and latency benchmark for the nearest-neighbour vector index.
+
+Builds indexes of synthetic clustered embeddings (one cluster per car class,
+like logo-model embeddings of the same model) in a temporary directory and
+reports, for each size:
+
+- append throughput, one row at a time and in blocks
+- search latency percentiles
+- recall@k of the memory-mapped float32 search against an exact float64 search
+- how often the matcher answers, and how often that answer is right, at the
+  configured similarity threshold
+- compaction time and rows removed after re-adding near-duplicates
+
+    python -m bench.index_bench
+    python -m bench.index_bench --sizes 1000,10000,100000 --dim 128 --threshold 0.9 --json index.json
+"""
+import argparse
+import json
+import tempfile
+import time
+import numpy as np
+from app.pipeline.vector_index import NearestNeighbourMatcher, VectorIndex
+from bench.run_bench import percentile
+
+
+def synthetic(rng, centers, count, noise):
+    classes = rng.integers(0, len(centers), size=count)
+    vectors = centers[classes] + noise * rng.normal(size=(count, centers.shape[1]))
+    return vectors.astype(np.float32), classes
+
+
+def label(cls):
+    return {"make": f"Make {cls % 40}", "model": f"Model {cls}", "year": "2020"}
+
+
+def run(size, args, rng, centers):
+    with tempfile.TemporaryDirectory() as directory:
+        index = VectorIndex(directory, max_entries=size * 2)
+        vectors, classes = synthetic(rng, centers, size, args.noise)
+
+        started = time.perf_counter()
+        single = min(200, size)
+        for vector, cls in zip(vectors[:single], classes[:single]):
+            index.add(vector, label(cls))
+        single_rate = single / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for start in range(single, size, 1000):
+            index.add_many(vectors[start:start + 1000], [label(cls) for cls in classes[start:start + 1000]])
+        block_rate = (size - single) / (time.perf_counter() - started) if size > single else 0.0
+
+        queries, truth = synthetic(rng, centers, args.queries, args.noise)
+        reference = vectors.astype(np.float64)
+        reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+
+        latencies, recalls = [], []
+        for query in queries:
+            started = time.perf_counter()
+            found = index.search(query, args.k)
+            latencies.append(time.perf_counter() - started)
+            # Rows are identified by their similarity to the query
+            exact = np.sort(reference @ (query / np.linalg.norm(query)))[::-1][:args.k]
+            recalls.append(np.mean(np.abs(np.array([similarity for similarity, _ in found]) - exact) < 1e-4))
+
+        matcher = NearestNeighbourMatcher(index, k=args.k, threshold=args.threshold, min_votes=args.min_votes,
+                                          compact_every=0)
+        answered = correct = 0
+        for query, cls in zip(queries, truth):
+            match = matcher.match(query)
+            if match:
+                answered += 1
+                correct += match["model"] == label(cls)["model"]
+
+        duplicates = vectors[:size // 10] + 1e-4 * rng.normal(size=(size // 10, vectors.shape[1]))
+        index.add_many(duplicates, [label(cls) for cls in classes[:size // 10]])
+        started = time.perf_counter()
+        removed = index.compact()
+        compaction = time.perf_counter() - started
+
+        return {
+            "entries": size,
+            "append_single_per_s": single_rate,
+            "append_block_per_s": block_rate,
+            "search_p50_ms": percentile(latencies, 50) * 1000,
+            "search_p95_ms": percentile(latencies, 95) * 1000,
+            f"recall@{args.k}": float(np.mean(recalls)),
+            "answered": answered / len(queries),
+            "precision": correct / answered if answered else 0.0,
+            "compaction_s": compaction,
+            "compaction_removed": removed,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--classes", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=0.2, help="per-dimension within-class spread; centres have unit variance")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.92)
+    parser.add_argument("--min-votes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.classes, args.dim))
+    reports = [run(int(size), args, rng, centers) for size in args.sizes.split(",")]
+
+    columns = ["entries", "append_single_per_s", "append_block_per_s", "search_p50_ms", "search_p95_ms",
+               f"recall@{args.k}", "answered", "precision", "compaction_s", "compaction_removed"]
+    print("  ".join(f"{column:>20}" for column in columns))
+    for report in reports:
+        print("  ".join(f"{report[column]:>20.3f}" if isinstance(report[column], float) else f"{report[column]:>20}"
+                        for column in columns))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Offline benchmark and replay harness for the /identify pipeline.
+
+Runs create_app() in process against stubbed OpenAI/Gemini clients, a fake
+logo model and an in-memory Firestore, serves images from a local static
+server, replays a request trace at a fixed concurrency and reports latency
+percentiles, throughput and per-stage timings.
+
+    python -m bench.run_bench --requests 200 --concurrency 16
+    python -m bench.run_bench --trace traces/sample.jsonl --mode stream --json out.json
+    python -m bench.run_bench --target http://127.0.0.1:5001 --requests 100
+    python -m bench.run_bench --mode batch --batch-size 20 --requests 200
+    python -m bench.run_bench --storage-latency 0.15 --upload
+
+With --storage-latency, URL requests pay a client-side storage write before
+they are sent and a storage read when the server downloads the image;
+--upload sends the image bytes with the request instead (multipart), and the
+server stores them in the background.
+
+Trace files are JSON lines with `image` (a file under --images) or `image_url`,
+and optionally `user_id`, `nonce` (distinct nonces are distinct images to the
+result cache) and `mode` (sync, async or stream).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from bench.fakes import (
+    Answers, FakeGenerativeModel, FakeLogoRuntime, FakeOpenAI, InMemoryBucket, InMemoryFirestore,
+    LatencyModel, StageRecorder
+)
+from bench.image_server import ImageServer
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "max": max(values) if values else 0.0,
+    }
+
+
+def build_app(args, recorder):
+    """create_app() wired to the stand-ins instead of the real providers"""
+    from app import create_app
+    from app.experts.aggregate_results import AggregateResults
+    from app.experts.custom_model_expert import CustomModelHandler
+    from app.experts.gemini_expert import GeminiHandler
+    from app.experts.openai_expert import OpenAIHandler
+    from app.experts.registry import ExpertRegistry
+    from app.persistence import IdentificationStore, ImageUploader
+
+    if not args.cache:
+        os.environ["RESULT_CACHE_BACKEND"] = "none"
+
+    answers = Answers(args.agreement, random.Random(args.seed))
+
+    def latency(spec):
+        return LatencyModel.parse(spec, args.error_rate, args.latency_scale)
+
+    registry = ExpertRegistry(factories={
+        "openai": lambda: OpenAIHandler(client=FakeOpenAI("openai", latency(args.openai_latency), answers, recorder)),
+        "gemini": lambda: GeminiHandler(model=FakeGenerativeModel(latency(args.gemini_latency), answers, recorder)),
+        "aggregator": lambda: AggregateResults(
+            client=FakeOpenAI("aggregator", latency(args.aggregator_latency), answers, recorder)
+        ),
+        "custom_model": lambda: CustomModelHandler(model=FakeLogoRuntime(recorder)),
+    })
+    firestore = InMemoryFirestore(LatencyModel.parse(args.firestore_latency, 0.0, args.latency_scale), recorder)
+    store = IdentificationStore(client=firestore, write_behind=not args.sync_writes)
+    uploader = ImageUploader(bucket=InMemoryBucket(latency(args.storage_latency), recorder))
+    app = create_app(registry=registry, store=store, uploader=uploader)
+
+    # Time the image fetch stage
+    fetcher = app.extensions["image_fetcher"]
+    fetch = fetcher.fetch
+
+    def timed_fetch(*fetch_args, **fetch_kwargs):
+        started = time.perf_counter()
+        try:
+            return fetch(*fetch_args, **fetch_kwargs)
+        finally:
+            recorder.record("image_fetch", time.perf_counter() - started)
+
+    fetcher.fetch = timed_fetch
+    return app
+
+
+def load_trace(args, images):
+    if args.trace:
+        with open(args.trace) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    rng = random.Random(args.seed)
+    names = sorted(name for name in os.listdir(args.images) if name.lower().endswith((".jpg", ".jpeg", ".png")))
+    return [
+        {"image": rng.choice(names), "user_id": f"bench-user-{i % 10}", "nonce": i + 1 if not args.repeat_images else 0}
+        for i in range(args.requests)
+    ]
+
+
+class Client:
+    """Sends one traced request, in process via the Flask test client or over HTTP to --target"""
+
+    def __init__(self, app=None, target=None):
+        self.app = app
+        self.target = target
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, "client"):
+            if self.app is not None:
+                self._local.client = self.app.test_client()
+            else:
+                import requests
+                self._local.client = requests.Session()
+        return self._local.client
+
+    def post(self, path, body, stream=False):
+        client = self._client()
+        if self.app is not None:
+            response = client.post(path, json=body, buffered=not stream)
+            return response.status_code, response
+        response = client.post(self.target + path, json=body, stream=stream, timeout=300)
+        return response.status_code, response
+
+    def upload(self, path, fields, data, stream=False):
+        """POST the image bytes as multipart/form-data, with the other fields as form fields"""
+        client = self._client()
+        if self.app is not None:
+            response = client.post(path, data=dict(fields, image=(io.BytesIO(data), "photo.jpg", "image/jpeg")),
+                                   content_type="multipart/form-data", buffered=not stream)
+            return response.status_code, response
+        response = client.post(self.target + path, data=fields, files={"image": ("photo.jpg", data, "image/jpeg")},
+                               stream=stream, timeout=300)
+        return response.status_code, response
+
+    def get(self, path):
+        client = self._client()
+        if self.app is not None:
+            response = client.get(path)
+            return response.status_code, response.get_json()
+        response = client.get(self.target + path, timeout=60)
+        return response.status_code, response.json()
+
+
+def iter_chunks(response):
+    if hasattr(response, "iter_content"):
+        return response.iter_content(chunk_size=None)
+    return response.response
+
+
+def response_json(response):
+    return response.json() if callable(getattr(response, "json", None)) else response.get_json()
+
+
+def run_one(client, entry, image_server, default_mode, storage=None, upload=False):
+    image_url = entry.get("image_url") or image_server.url(entry["image"], entry.get("nonce", 0))
+    body = {"image_url": image_url, "user_id": entry.get("user_id", "bench-user")}
+    mode = entry.get("mode", default_mode)
+    started = time.perf_counter()
+    outcome = {"mode": mode, "ok": False}
+
+    upload = upload and "image" in entry
+    if upload:
+        data = image_server.image(entry["image"], entry.get("nonce", 0))
+        body = {"user_id": body["user_id"]}
+        post = lambda path, fields, stream=False: client.upload(path, fields, data, stream=stream)
+    else:
+        if storage is not None:
+            # The app puts the photo in storage before it can send the URL
+            storage.sleep()
+        post = client.post
+
+    if mode == "stream":
+        status, response = post("/identify/stream", body, stream=True)
+        first_event = None
+        text = b""
+        for chunk in iter_chunks(response):
+            if first_event is None and chunk.startswith(b"event"):
+                first_event = time.perf_counter() - started
+            text += chunk
+        outcome.update(ok=status == 200 and b"event: done" in text, first_event=first_event)
+    elif mode == "async":
+        status, response = post("/identify", dict(body, **{"async": "1"}))
+        job = response_json(response)
+        outcome["accepted"] = time.perf_counter() - started
+        while status == 202:
+            time.sleep(0.05)
+            poll_status, state = client.get(f"/identify/{job['doc_id']}?user_id={body['user_id']}")
+            if poll_status != 200 or state["status"] in ("done", "failed"):
+                outcome.update(ok=state.get("status") == "done")
+                break
+        status = status if status != 202 else 200
+    else:
+        status, response = post("/identify", body)
+        outcome.update(ok=status == 200)
+        if status == 200:
+            outcome["cache"] = response_json(response).get("cache")
+
+    outcome.update(status=status, latency=time.perf_counter() - started)
+    return outcome
+
+
+def run_batch(client, entries, image_server):
+    """One /identify/batch call for a group of trace entries"""
+    image_urls = [entry.get("image_url") or image_server.url(entry["image"], entry.get("nonce", 0)) for entry in entries]
+    started = time.perf_counter()
+    status, response = client.post("/identify/batch", {"image_urls": image_urls, "user_id": entries[0].get("user_id", "bench-user")})
+    results = response_json(response).get("results", []) if status == 200 else []
+    return {
+        "mode": "batch",
+        "ok": status == 200 and all("doc_id" in result for result in results),
+        "images": len(entries),
+        "stored": sum("doc_id" in result for result in results),
+        "status": status,
+        "latency": time.perf_counter() - started,
+    }
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--trace", help="JSON lines request trace to replay")
+    parser.add_argument("--mode", choices=["sync", "async", "stream", "batch"], default="sync")
+    parser.add_argument("--batch-size", type=int, default=10, help="images per /identify/batch call in batch mode")
+    parser.add_argument("--images", default="public", help="directory served by the local image server")
+    parser.add_argument("--repeat-images", action="store_true", help="reuse identical image bytes across requests")
+    parser.add_argument("--cache", action="store_true", help="keep the result cache enabled")
+    parser.add_argument("--openai-latency", default="0.8:0.3", help="median seconds[:sigma]")
+    parser.add_argument("--gemini-latency", default="0.5:0.3")
+    parser.add_argument("--aggregator-latency", default="0.8:0.3")
+    parser.add_argument("--firestore-latency", default="0.05:0.2")
+    parser.add_argument("--storage-latency", default="0", help="median seconds[:sigma] of a storage read or write")
+    parser.add_argument("--upload", action="store_true", help="send image bytes with the request instead of a URL")
+    parser.add_argument("--sync-writes", action="store_true", help="write Firestore documents on the request thread")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every stand-in latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="chance each provider call fails")
+    parser.add_argument("--agreement", type=float, default=0.8, help="chance an LLM expert sees the 'true' car")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", help="benchmark a running server instead of an in-process app")
+    parser.add_argument("--json", help="also write the report to this file")
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+
+    recorder = StageRecorder()
+    storage = LatencyModel.parse(args.storage_latency, 0.0, args.latency_scale)
+    storage = storage if storage.median else None
+    image_server = ImageServer(args.images, latency=storage).start()
+    app = None if args.target else build_app(args, recorder)
+    client = Client(app=app, target=args.target)
+    trace = load_trace(args, image_server)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        if args.mode == "batch":
+            groups = [trace[i:i + args.batch_size] for i in range(0, len(trace), args.batch_size)]
+            outcomes = list(executor.map(lambda group: run_batch(client, group, image_server), groups))
+        else:
+            outcomes = list(executor.map(
+                lambda entry: run_one(client, entry, image_server, args.mode, storage, args.upload), trace
+            ))
+    elapsed = time.perf_counter() - started
+    image_server.stop()
+    if app is not None:
+        app.extensions["identification_store"].flush()
+        app.extensions["image_uploader"].flush()
+
+    ok = [o for o in outcomes if o["ok"]]
+    report = {
+        "requests": len(outcomes),
+        "ok": len(ok),
+        "errors": len(outcomes) - len(ok),
+        "concurrency": args.concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(outcomes) / elapsed if elapsed else 0.0,
+        "latency_s": summarize([o["latency"] for o in ok]),
+        "stages_s": {stage: summarize(values) for stage, values in sorted(recorder.samples.items())},
+    }
+    first_events = [o["first_event"] for o in ok if o.get("first_event") is not None]
+    if first_events:
+        report["first_event_s"] = summarize(first_events)
+    accepted = [o["accepted"] for o in outcomes if "accepted" in o]
+    if accepted:
+        report["accepted_s"] = summarize(accepted)
+    cache_statuses = Counter(o["cache"] for o in ok if o.get("cache"))
+    if cache_statuses:
+        report["cache"] = dict(cache_statuses)
+
+    print(f"{report['requests']} requests, {report['errors']} errors, "
+          f"{report['throughput_rps']:.2f} req/s at concurrency {args.concurrency}")
+    images = sum(o.get("images", 1) for o in outcomes)
+    if args.mode == "batch":
+        # Shed or undownloadable images come back as per-image errors; only stored ones count
+        stored = sum(o.get("stored", 0) for o in outcomes)
+        report["images"] = images
+        report["images_stored"] = stored
+        report["images_per_s"] = stored / elapsed if elapsed else 0.0
+        print(f"{images} images, {stored} stored, {report['images_per_s']:.2f} images/s")
+    if cache_statuses:
+        print("cache: " + ", ".join(f"{status} {count}" for status, count in sorted(cache_statuses.items())))
+    rows = [("end to end", report["latency_s"])]
+    rows += [(name, report[key]) for name, key in (("first event", "first_event_s"), ("accepted", "accepted_s")) if key in report]
+    rows += [(stage, stats) for stage, stats in report["stages_s"].items()]
+    print(f"{'stage':<22}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, stats in rows:
+        print(f"{name:<22}{stats['count']:>7}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
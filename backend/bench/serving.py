@@ -0,0 +1,93 @@
+"""
+Serving-setup benchmark.
+
+Starts the stand-in app (bench/fake_app.py) under the Flask development
+server, as run.py serves it, and under gunicorn with gunicorn.conf.py, then
+replays the same load against each with run_bench --target:
+
+    python -m bench.serving
+    python -m bench.serving --requests 150 --concurrency 32 --workers 2 --bench-args "--latency-scale 0.3"
+
+--bench-args configures the stand-ins (BENCH_ARGS of bench/fake_app.py).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Both servers listen where run.py does
+URL = "http://127.0.0.1:5001"
+
+SERVERS = {
+    "dev server": [sys.executable, "-m", "bench.fake_app"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "bench.fake_app:app"],
+}
+
+
+def wait_healthy(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(URL + "/healthz", timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def measure(name, command, args):
+    env = dict(os.environ, BENCH_ARGS=args.bench_args,
+               GUNICORN_WORKERS=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    server = subprocess.Popen(command, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_healthy(args.startup_timeout):
+            return {"server": name, "error": "did not answer /healthz"}
+        with tempfile.NamedTemporaryFile(suffix=".json") as report:
+            subprocess.run(
+                [sys.executable, "-m", "bench.run_bench", "--target", URL, "--requests", str(args.requests),
+                 "--concurrency", str(args.concurrency), "--seed", str(args.seed), "--json", report.name],
+                cwd=BACKEND, check=True, stdout=subprocess.DEVNULL,
+            )
+            return dict(json.load(open(report.name)), server=name)
+    finally:
+        server.terminate()
+        server.wait(timeout=args.startup_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=150)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    # Enough threads that admission control (sized from the thread count) doesn't shed this load
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads per worker")
+    parser.add_argument("--bench-args", default="--latency-scale 0.3", help="stand-in options for fake_app")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = [measure(name, command, args) for name, command in SERVERS.items()]
+    print(f"{args.requests} requests at concurrency {args.concurrency}, BENCH_ARGS={args.bench_args!r}")
+    for result in report:
+        if "error" in result:
+            print(f"{result['server']:<12} failed: {result['error']}")
+            continue
+        latency = result["latency_s"]
+        ok_rps = result["ok"] / result["elapsed_s"]
+        print(f"{result['server']:<12}{ok_rps:>8.2f} successful req/s  p50 {latency['p50']:.3f}s  "
+              f"p95 {latency['p95']:.3f}s  errors {result['errors']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Startup-time benchmark.
+
+Measures, each in a fresh interpreter:
+
+- the `python -X importtime` cost of importing the app package and the
+  slowest modules it pulls in, optionally against another git revision
+  (`--baseline REV`, e.g. the commit before lazy startup)
+- how long create_app() takes before it can serve /healthz, and how long
+  until /readyz reports the background warm-up done, with EXPERT_WARMUP=sync
+  (everything loaded before serving) and the default background warm-up
+
+    python -m bench.startup_time
+    python -m bench.startup_time --baseline HEAD~1 --module app.routes.identify --json startup.json
+
+Warm-up steps that can't complete here (no API keys, credentials or model
+file) fail fast and are reported as failed rather than timed.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_PROBE = """
+import json, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+client = app.test_client()
+healthy = client.get("/healthz").status_code
+serving = time.perf_counter() - started
+while client.get("/readyz").status_code != 200:
+    time.sleep(0.01)
+ready = time.perf_counter() - started
+print(json.dumps({"healthz": healthy, "serving": serving, "ready": ready,
+                  "warm_up": client.get("/readyz").get_json()}))
+"""
+
+
+def import_time(module, cwd=BACKEND, top=8):
+    """Total and slowest cumulative import times, in seconds, from -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by indentation after the single separating space
+        rows.append((int(cumulative) / 1e6, name.rstrip()[1:]))
+    if proc.returncode != 0:
+        return {"module": module, "error": proc.stderr.strip().splitlines()[-1]}
+    total = sum(seconds for seconds, name in rows if not name.startswith(" "))
+    slowest = sorted(rows, reverse=True)[:top]
+    return {
+        "module": module,
+        "total": round(total, 3),
+        "slowest": [{"module": name.strip(), "seconds": round(seconds, 3)} for seconds, name in slowest],
+    }
+
+
+def startup(mode):
+    proc = subprocess.run(
+        [sys.executable, "-c", STARTUP_PROBE],
+        cwd=BACKEND, capture_output=True, text=True, env=dict(os.environ, EXPERT_WARMUP=mode),
+    )
+    if proc.returncode != 0:
+        return {"mode": mode, "error": proc.stderr.strip().splitlines()[-1]}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return dict(result, mode=mode)
+
+
+def checkout(rev, directory):
+    """Extract backend/ at `rev` into `directory` and return its path"""
+    root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=BACKEND,
+                          capture_output=True, text=True, check=True).stdout.strip()
+    prefix = os.path.relpath(BACKEND, root)
+    archive = os.path.join(directory, "rev.tar")
+    subprocess.run(["git", "archive", "-o", archive, rev, prefix], cwd=root, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory)
+    return os.path.join(directory, prefix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="module to time with -X importtime")
+    parser.add_argument("--baseline", help="git revision to compare import time against")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {"import": {"current": import_time(args.module)}}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as directory:
+            report["import"]["baseline"] = dict(
+                import_time(args.module, cwd=checkout(args.baseline, directory)), rev=args.baseline
+            )
+    report["startup"] = [startup("sync"), startup("background")]
+
+    for label, result in report["import"].items():
+        if "error" in result:
+            print(f"import {args.module} ({label}): failed: {result['error']}")
+            continue
+        print(f"import {args.module} ({label}): {result['total']:.3f}s")
+        for row in result["slowest"]:
+            print(f"  {row['seconds']:8.3f}  {row['module']}")
+    for result in report["startup"]:
+        if "error" in result:
+            print(f"EXPERT_WARMUP={result['mode']}: failed: {result['error']}")
+            continue
+        print(f"EXPERT_WARMUP={result['mode']:<10} serving /healthz after {result['serving']:.3f}s, "
+              f"ready after {result['ready']:.3f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Production serving: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app the app is built once in the master, including the experts,
+the logo model and the SDK clients, and the workers fork from it and share
+those pages copy-on-write. Thread pools, background threads and
+connections are rebuilt in each worker by post_fork. TensorFlow can't run
+before a fork, so with the Keras logo runtime preload is off by default, and
+if it is turned on the logo model is loaded and warmed up in each worker. On SIGTERM each worker
+stops accepting, finishes in-flight requests within graceful_timeout, then
+drains async jobs and pending Firestore writes in worker_exit.
+
+Every knob is an environment variable, see the readme.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+# Requests spend most of their time waiting on the LLM providers, so a few
+# processes with many threads each go further than many single-threaded ones
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(4, multiprocessing.cpu_count()))))
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+_fork_safe_runtime = os.getenv("CUSTOM_MODEL_RUNTIME", "keras") != "keras"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1" if _fork_safe_runtime else "0") != "0"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+
+# Pipeline runs plus their admission queue stay below the thread count, so a
+# few threads per worker always remain for health checks and cache hits
+_admission_queue = max(1, threads // 4)
+os.environ.setdefault("ADMISSION_MAX_QUEUE", str(_admission_queue))
+os.environ.setdefault("ADMISSION_MAX_LIMIT", str(max(1, threads - max(2, threads // 4) - _admission_queue)))
+
+if preload_app:
+    # Load everything in the master so the workers inherit it; a background
+    # warm-up thread would not survive the fork
+    os.environ.setdefault("EXPERT_WARMUP", "sync")
+    if not _fork_safe_runtime:
+        os.environ.setdefault("EXPERT_WARMUP_DEFER", "custom_model")
+
+
+def _loaded_app(server):
+    """The app module gunicorn has already imported (wsgi:app unless overridden), if any"""
+    module_name, _, attribute = (getattr(server.app, "app_uri", None) or "wsgi:app").partition(":")
+    module = sys.modules.get(module_name)
+    return getattr(module, attribute or "app", None) if module else None
+
+
+def post_fork(server, worker):
+    from app.lifecycle import after_fork
+    app = _loaded_app(server)
+    if app is not None:
+        after_fork(app)
+
+
+def worker_exit(server, worker):
+    from app.lifecycle import drain
+    app = _loaded_app(server)
+    if app is not None:
+        drain(app, timeout=graceful_timeout)
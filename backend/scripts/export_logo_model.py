@@ -0,0 +1,132 @@
+"""
+Export the Keras logo model to TFLite (optionally int8-quantized) or ONNX and
+check the exported model against the Keras output.
+
+Run from the backend directory:
+
+    python -m scripts.export_logo_model --format tflite --quantize int8
+    python -m scripts.export_logo_model --format onnx
+    python -m scripts.export_logo_model --format tflite --check-only
+
+Exporting needs full TensorFlow (plus tf2onnx for ONNX); serving the exported
+model only needs ai-edge-litert / tflite-runtime or onnxruntime.
+"""
+import argparse
+import glob
+import os
+import numpy as np
+from PIL import Image
+from app.experts.logo_runtime import DEFAULT_MODEL_PATHS, load_runtime, softmax
+from utils.image_processing import process_image
+
+IMAGE_SIZE = (224, 224)
+
+
+def load_samples(calibration_dir, count):
+    """Calibration/parity images from a directory, padded with random images if there are too few"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(calibration_dir, "*")))[:count]:
+        try:
+            img = process_image(path).resize(IMAGE_SIZE, Image.NEAREST)
+        except Exception:
+            continue
+        samples.append(np.asarray(img, dtype=np.float32))
+
+    rng = np.random.default_rng(0)
+    while len(samples) < count:
+        samples.append(rng.uniform(0, 255, IMAGE_SIZE + (3,)).astype(np.float32))
+    return np.stack(samples)
+
+
+def load_keras(keras_path, embedding):
+    """The Keras model, optionally with the penultimate layer as a second (embedding) output"""
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(keras_path)
+    if embedding:
+        model = tf.keras.Model(inputs=model.inputs, outputs=[model.output, model.layers[-2].output])
+    return model
+
+
+def export_tflite(keras_path, output_path, quantize, samples, embedding=True):
+    import tensorflow as tf
+
+    model = load_keras(keras_path, embedding)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantize == "int8":
+        def representative_dataset():
+            for sample in samples:
+                yield [np.expand_dims(sample, axis=0)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(keras_path, output_path, embedding=True):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = load_keras(keras_path, embedding)
+    spec = (tf.TensorSpec((None,) + IMAGE_SIZE + (3,), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=output_path)
+
+
+def check_parity(reference, candidate, samples):
+    """Compare softmax scores of two runtimes image by image"""
+    expected = softmax(np.concatenate([reference.predict(s[None]) for s in samples]))
+    actual = softmax(np.concatenate([candidate.predict(s[None]) for s in samples]))
+    return {
+        "samples": len(samples),
+        "top1_agreement": float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))),
+        "max_abs_diff": float(np.max(np.abs(expected - actual))),
+        "mean_abs_diff": float(np.mean(np.abs(expected - actual))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["tflite", "onnx"], required=True)
+    parser.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="none",
+                        help="TFLite only; int8 uses the calibration images")
+    parser.add_argument("--keras-model", default=DEFAULT_MODEL_PATHS["keras"])
+    parser.add_argument("--output", help="defaults to the path CUSTOM_MODEL_RUNTIME looks for")
+    parser.add_argument("--calibration-dir", default="public")
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--no-embedding", action="store_true",
+                        help="export the class scores only, without the penultimate-layer embedding output")
+    parser.add_argument("--check-only", action="store_true", help="skip the export, only run the parity check")
+    parser.add_argument("--min-agreement", type=float, default=0.95,
+                        help="exit non-zero if top-1 agreement with Keras is below this")
+    args = parser.parse_args()
+
+    output = args.output or DEFAULT_MODEL_PATHS[args.format]
+    samples = load_samples(args.calibration_dir, args.samples)
+
+    if not args.check_only:
+        if args.format == "tflite":
+            export_tflite(args.keras_model, output, args.quantize, samples, embedding=not args.no_embedding)
+        else:
+            export_onnx(args.keras_model, output, embedding=not args.no_embedding)
+        print(f"Exported {args.format} model to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+    report = check_parity(
+        load_runtime("keras", args.keras_model),
+        load_runtime(args.format, output),
+        samples
+    )
+    print("Parity vs Keras:", report)
+    if report["top1_agreement"] < args.min_agreement:
+        raise SystemExit(f"Top-1 agreement {report['top1_agreement']:.2%} is below {args.min_agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
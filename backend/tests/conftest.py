@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the backend as top-level `app` / `utils` packages, like run.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,90 @@
+import threading
+import time
+import pytest
+from app.pipeline.admission import AdmissionController, AIMDLimit, Overloaded
+
+
+def controller(limit=1, max_queue=1, queue_timeout=0.05):
+    return AdmissionController(AIMDLimit(), initial_limit=limit, min_limit=1, max_limit=limit,
+                               max_queue=max_queue, queue_timeout=queue_timeout)
+
+
+def waiting(admission, count):
+    deadline = time.monotonic() + 5
+    while admission.stats()["queued"] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_sheds_when_the_queue_is_full():
+    admission = controller()
+    admission.acquire()
+    queued = threading.Thread(target=admission.acquire, args=(5.0,))
+    queued.start()
+    waiting(admission, 1)
+
+    with pytest.raises(Overloaded) as shed:
+        admission.acquire(1.0)
+    assert shed.value.reason == "queue_full"
+    assert shed.value.retry_after >= 1
+
+    admission.release(0.01)
+    queued.join()
+
+
+def test_sheds_after_the_queue_timeout():
+    admission = controller()
+    admission.acquire()
+    started = time.monotonic()
+    with pytest.raises(Overloaded) as shed:
+        admission.acquire()
+    assert shed.value.reason == "queue_timeout"
+    assert time.monotonic() - started >= 0.05
+    assert admission.stats()["queued"] == 0
+
+
+def test_release_admits_the_oldest_waiter():
+    admission = controller()
+    admission.acquire()
+    admitted = threading.Event()
+
+    def wait_for_slot():
+        admission.acquire(5.0)
+        admitted.set()
+
+    threading.Thread(target=wait_for_slot).start()
+    waiting(admission, 1)
+    admission.release(0.01)
+    assert admitted.wait(5)
+    assert admission.stats()["in_flight"] == 1
+
+
+def test_background_callers_wait_out_their_timeout_when_the_queue_is_full():
+    admission = controller(max_queue=0)
+    admission.acquire()
+    with pytest.raises(Overloaded):
+        admission.acquire(1.0)
+
+    admitted = threading.Event()
+
+    def job():
+        admission.acquire(5.0, background=True)
+        admitted.set()
+
+    threading.Thread(target=job).start()
+    waiting(admission, 1)
+    # A queued job doesn't take a request's place in the queue
+    with pytest.raises(Overloaded) as shed:
+        admission.acquire(1.0)
+    assert shed.value.reason == "queue_full"
+
+    admission.release(0.01)
+    assert admitted.wait(5)
+
+
+def test_limit_backs_off_on_slow_runs():
+    admission = AdmissionController(AIMDLimit(timeout=1.0, backoff=0.5), initial_limit=8, min_limit=2, max_limit=8)
+    for _ in range(3):
+        admission.acquire()
+        admission.release(5.0)
+    assert admission.limit == 2
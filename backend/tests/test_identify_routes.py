@@ -0,0 +1,152 @@
+import io
+import json
+import os
+from urllib.parse import urlencode
+import pytest
+from bench.fakes import StageRecorder
+from bench.image_server import ImageServer
+from app.pipeline.admission import Overloaded
+from bench.run_bench import build_app, make_parser
+
+IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "public", "civic2021.jpg")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setenv("RESULT_CACHE_BACKEND", "none")
+    monkeypatch.setenv("EXPERT_WARMUP", "0")
+    monkeypatch.setenv("AGGREGATION_LLM_INSIGHTS", "0")
+    monkeypatch.setenv("VECTOR_INDEX", "0")
+    args = make_parser().parse_args([
+        "--cache", "--openai-latency", "0", "--gemini-latency", "0", "--aggregator-latency", "0",
+        "--firestore-latency", "0",
+    ])
+    return build_app(args, StageRecorder())
+
+
+def stored_documents(app):
+    store = app.extensions["identification_store"]
+    store.flush()
+    return store.client.documents
+
+
+def stored_guess(app, user_id, doc_id):
+    documents = stored_documents(app)
+    return documents[(f"users/{user_id}/identifications", doc_id)]["user_guess"]
+
+
+def upload(client, **fields):
+    with open(IMAGE, "rb") as f:
+        image = f.read()
+    return client.post("/identify", data=dict(fields, image=(io.BytesIO(image), "car.jpg")),
+                       content_type="multipart/form-data")
+
+
+def test_upload_parses_a_json_user_guess(app):
+    response = upload(app.test_client(), user_id="u1", user_guess=json.dumps({"make": "Honda", "model": "Civic"}))
+
+    assert response.status_code == 200
+    assert stored_guess(app, "u1", response.get_json()["doc_id"]) == {"make": "Honda", "model": "Civic"}
+
+
+def test_upload_accepts_separate_guess_fields(app):
+    response = upload(app.test_client(), user_id="u1", user_guess_make="Honda", user_guess_model="Civic")
+
+    assert response.status_code == 200
+    assert stored_guess(app, "u1", response.get_json()["doc_id"]) == {"make": "Honda", "model": "Civic"}
+
+
+def test_raw_upload_reads_the_guess_from_query_parameters(app):
+    with open(IMAGE, "rb") as f:
+        response = app.test_client().post(
+            "/identify?user_id=u1&user_guess_make=Honda", data=f.read(), content_type="image/jpeg"
+        )
+
+    assert response.status_code == 200
+    assert stored_guess(app, "u1", response.get_json()["doc_id"]) == {"make": "Honda", "model": ""}
+
+
+def test_upload_without_a_guess_stores_none(app):
+    response = upload(app.test_client(), user_id="u1")
+
+    assert response.status_code == 200
+    assert stored_guess(app, "u1", response.get_json()["doc_id"]) is None
+
+
+@pytest.mark.parametrize("guess", ["Honda Civic", '["Honda", "Civic"]', '{"make": 1, "model": "Civic"}'])
+def test_malformed_user_guess_is_a_400(app, guess):
+    response = upload(app.test_client(), user_id="u1", user_guess=guess)
+
+    assert response.status_code == 400
+    assert "user_guess" in response.get_json()["error"]
+
+
+@pytest.fixture
+def image_server():
+    server = ImageServer(os.path.dirname(IMAGE)).start()
+    yield server
+    server.stop()
+
+
+def stream_events(response):
+    events = []
+    for block in response.get_data(as_text=True).split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_get_parses_the_user_guess_query_parameter(app, image_server):
+    query = urlencode({"image_url": image_server.url("civic2021.jpg"), "user_id": "u1",
+                       "user_guess": json.dumps({"make": "Honda", "model": "Civic"})})
+    response = app.test_client().get(f"/identify/stream?{query}")
+
+    event, payload = stream_events(response)[-1]
+    assert event == "done"
+    assert stored_guess(app, "u1", payload["doc_id"]) == {"make": "Honda", "model": "Civic"}
+
+
+def test_stream_get_rejects_a_malformed_user_guess(app, image_server):
+    query = urlencode({"image_url": image_server.url("civic2021.jpg"), "user_id": "u1", "user_guess": "Honda"})
+    response = app.test_client().get(f"/identify/stream?{query}")
+
+    assert response.status_code == 400
+
+
+def shed_images(monkeypatch, app, nonces):
+    """Make admission control shed the images fetched with these nonces"""
+    service = app.extensions["identification_service"]
+    run_pipeline = service.run_pipeline
+
+    def maybe_shed(image, **kwargs):
+        if any(image.source_url.endswith(f"nonce={nonce}") for nonce in nonces):
+            raise Overloaded("queue full", 2)
+        return run_pipeline(image, **kwargs)
+
+    monkeypatch.setattr(service, "run_pipeline", maybe_shed)
+
+
+def test_batch_stores_the_images_admission_control_did_not_shed(monkeypatch, app, image_server):
+    shed_images(monkeypatch, app, [2])
+    image_urls = [image_server.url("civic2021.jpg", nonce) for nonce in (1, 2, 3)]
+
+    response = app.test_client().post("/identify/batch", json={"image_urls": image_urls, "user_id": "u1"})
+
+    assert response.status_code == 200
+    first, shed, third = response.get_json()["results"]
+    assert "doc_id" in first and "doc_id" in third
+    assert shed["image_url"] == image_urls[1]
+    assert shed["retry_after"] == 2 and "overloaded" in shed["error"]
+    assert len(stored_documents(app)) == 2
+
+
+def test_batch_is_a_503_when_every_image_is_shed(monkeypatch, app, image_server):
+    shed_images(monkeypatch, app, [1, 2])
+    image_urls = [image_server.url("civic2021.jpg", nonce) for nonce in (1, 2)]
+
+    response = app.test_client().post("/identify/batch", json={"image_urls": image_urls, "user_id": "u1"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    assert not stored_documents(app)
@@ -0,0 +1,100 @@
+import pytest
+from app.experts.local_aggregator import LocalAggregator, labels_equivalent
+
+
+def llm(make, model, confidence="high"):
+    return {"make": make, "model": model, "year": "2020", "confidence": confidence}
+
+
+def logo(make, score="90.00%"):
+    return {"make": make, "confidence": score}
+
+
+@pytest.mark.parametrize("a, b", [
+    ("F-150", "F150"),
+    ("f 150", "F-150"),
+    ("3 Series", "3-series"),
+    ("Model 3", "model3"),
+])
+def test_models_match_after_normalising(a, b):
+    assert labels_equivalent(a, b, "model")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("3 Series", "5 Series"),
+    ("Model 3", "Model Y"),
+    ("Model S", "Model X"),
+    ("CX-5", "CX-9"),
+    ("RAV4", "RAV"),
+    ("Santa Fe", "Santa Cruz"),
+    ("Model", "Model S"),
+    ("Cherokee", "Grand Cherokee"),
+    ("Range Rover Sport", "Range Rover Evoque"),
+    ("", "Civic"),
+])
+def test_near_miss_models_do_not_match(a, b):
+    assert not labels_equivalent(a, b, "model")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Civic", "Civic Type R"),
+    ("Mustang GT", "Mustang"),
+    ("Golf", "golf gti"),
+    ("3 Series", "3 Series M Sport"),
+])
+def test_models_may_extend_by_a_trim(a, b):
+    assert labels_equivalent(a, b, "model")
+
+
+@pytest.mark.parametrize("a, b", [("Mercedes", "Mercedes-Benz"), ("mercedes benz", "Mercedes"), ("Land Rover", "LAND ROVER")])
+def test_makes_may_extend_by_whole_words(a, b):
+    assert labels_equivalent(a, b, "make")
+
+
+@pytest.mark.parametrize("a, b", [("Mini", "Mini 2"), ("BMW", "BMW M"), ("Kia", "Tesla"), ("Mercedes", "Merc")])
+def test_makes_differing_in_digits_or_single_letters_do_not_match(a, b):
+    assert not labels_equivalent(a, b, "make")
+
+
+def test_agreement_is_settled_locally():
+    result = LocalAggregator().aggregate_experts(
+        llm("Ford", "F-150"), llm("Ford", "F150"), logo("Ford")
+    )
+    assert not result["conflict"]
+    assert (result["make"], result["confidence"]) == ("Ford", "high")
+
+
+def test_make_extension_counts_as_agreement():
+    result = LocalAggregator().aggregate_experts(
+        llm("Mercedes-Benz", "C-Class"), llm("Mercedes", "C Class"), logo("Mercedes")
+    )
+    assert not result["conflict"]
+    assert result["model"] == "C-Class"
+
+
+def test_trim_counts_as_agreement():
+    result = LocalAggregator().aggregate_experts(llm("Honda", "Civic Type R"), llm("Honda", "Civic"), logo("Honda"))
+    assert not result["conflict"]
+    assert result["make"] == "Honda" and result["model"] in ("Civic", "Civic Type R")
+
+
+@pytest.mark.parametrize("make, a, b", [
+    ("BMW", "3 Series", "5 Series"),
+    ("Tesla", "Model 3", "Model Y"),
+    ("Tesla", "Model S", "Model X"),
+    ("Mazda", "CX-5", "CX-9"),
+])
+def test_model_disagreement_is_a_conflict(make, a, b):
+    result = LocalAggregator().aggregate_experts(llm(make, a), llm(make, b), logo(make))
+    assert result["conflict"]
+    assert result["details"] == "Experts agree on the make but not the model"
+
+
+def test_make_disagreement_is_a_conflict():
+    result = LocalAggregator().aggregate_experts(llm("Kia", "Sportage"), llm("Hyundai", "Tucson"), logo("Toyota", "10.00%"))
+    assert result["conflict"]
+
+
+def test_details_name_the_agreeing_experts():
+    result = LocalAggregator().aggregate_experts(llm("Ford", "F-150"), llm("Ford", "F150"), logo("Ford"))
+    assert result["details"] == "Weighted vote: OpenAI, Gemini, Custom Model agreed on Ford F-150."
@@ -0,0 +1,79 @@
+import threading
+import pytest
+from app.experts.local_aggregator import LocalAggregator
+from app.pipeline import orchestrator as orchestrator_module
+from app.pipeline.orchestrator import ExpertOrchestrator
+from app.pipeline.result_cache import is_cacheable
+
+
+class StubRegistry:
+    def __init__(self):
+        self.local_aggregator = LocalAggregator()
+
+
+def llm(make, model, confidence="high"):
+    return {"make": make, "model": model, "year": "2020", "confidence": confidence, "details": ""}
+
+
+def error(message="Timed out after 30s"):
+    return {"make": "Error", "model": "Error", "year": "Unknown", "confidence": "none", "error": message}
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    monkeypatch.setenv("AGGREGATION_LLM_INSIGHTS", "0")
+    monkeypatch.setenv("VECTOR_INDEX", "0")
+    orchestrator = ExpertOrchestrator(StubRegistry(), max_workers=4)
+    yield orchestrator
+    orchestrator.executor.shutdown(wait=False)
+
+
+@pytest.fixture
+def aggregator_degraded(monkeypatch):
+    monkeypatch.setattr(orchestrator_module, "is_degraded", lambda name: name == "aggregator")
+
+
+def test_degraded_aggregator_falls_back_to_the_strongest_answer(orchestrator, aggregator_degraded):
+    aggregated = orchestrator.aggregate(
+        llm("Kia", "Sportage", "high"), llm("Hyundai", "Tucson", "medium"), {"make": "Hyundai", "confidence": "60.00%"}
+    )
+    assert (aggregated["make"], aggregated["model"]) == ("Kia", "Sportage")
+    assert aggregated["confidence"] == "low"
+    assert aggregated["aggregation_mode"] == "fallback"
+    assert "OpenAI" in aggregated["details"]
+    assert not is_cacheable({"aggregated": aggregated, "process": "single_round"})
+
+
+def test_degraded_aggregator_without_any_answer_is_marked_degraded(orchestrator, aggregator_degraded):
+    aggregated = orchestrator.aggregate(error(), error(), error("model file missing"))
+    assert aggregated["aggregation_mode"] == "degraded"
+    assert aggregated["make"] == "Unknown"
+
+
+def test_identification_without_an_answer_is_marked_degraded(orchestrator, aggregator_degraded):
+    orchestrator._identify = lambda image, on_event, precomputed: {
+        "aggregated": orchestrator.aggregate(error(), error(), error()),
+        "process": "blackboard_two_rounds",
+    }
+    results_payload = orchestrator.identify(image=None)
+    assert results_payload["process"] == "degraded"
+    assert not is_cacheable(results_payload)
+
+
+def test_an_expert_that_times_out_gives_an_error_result(orchestrator):
+    release = threading.Event()
+    orchestrator.timeouts = dict(orchestrator.timeouts, openai=0.05)
+    finished = []
+
+    try:
+        results = orchestrator.run_round({
+            "openai": ("openai", release.wait, (5,)),
+            "gemini": ("gemini", llm, ("Honda", "Civic")),
+        }, on_result=lambda name, result: finished.append(name))
+    finally:
+        release.set()
+
+    assert results["gemini"]["make"] == "Honda"
+    assert results["openai"]["make"] == "Error"
+    assert results["openai"]["error"] == "Timed out after 0.05s"
+    assert finished == ["gemini", "openai"]
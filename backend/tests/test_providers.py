@@ -0,0 +1,121 @@
+import threading
+import pytest
+from app.providers import circuit
+from app.providers.circuit import CircuitBreaker
+from app.providers.client import ProviderClient, ProviderUnavailable
+from app.providers.hedging import Hedger
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit.time, "monotonic", clock.monotonic)
+    return clock
+
+
+class ProviderError(Exception):
+    status_code = 503
+
+
+def answer(make):
+    return {"make": make, "model": "Civic", "year": "2021", "confidence": "high"}
+
+
+@pytest.fixture
+def hedger(monkeypatch):
+    monkeypatch.setenv("OPENAI_HEDGE", "1")
+    monkeypatch.setenv("OPENAI_HEDGE_INITIAL_DELAY", "0.05")
+    return Hedger("openai")
+
+
+def test_a_slow_primary_is_hedged_and_the_hedge_wins(hedger):
+    release = threading.Event()
+    calls = []
+
+    def primary():
+        calls.append("primary")
+        release.wait(5)
+        return answer("Primary")
+
+    def hedge():
+        calls.append("hedge")
+        return answer("Hedge")
+
+    try:
+        result = hedger.call(primary, hedge)
+    finally:
+        release.set()
+
+    assert result["make"] == "Hedge"
+    assert calls == ["primary", "hedge"]
+
+
+def test_a_fast_primary_is_not_hedged(hedger):
+    calls = []
+    result = hedger.call(lambda: answer("Primary"), lambda: calls.append("hedge"))
+
+    assert result["make"] == "Primary"
+    assert calls == []
+
+
+def test_breaker_opens_after_consecutive_failures_then_half_opens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.degraded
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN and not breaker.degraded
+    # One trial call at a time
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_half_open_trial_closes_or_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_open_breaker_refuses_provider_calls_until_it_half_opens(clock):
+    provider = ProviderClient("test", max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ProviderError()
+
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            provider.call("model", failing)
+    assert provider.degraded
+
+    with pytest.raises(ProviderUnavailable):
+        provider.call("model", failing)
+    assert len(calls) == 2
+
+    clock.now += 30
+    assert provider.call("model", lambda: "ok") == "ok"
+    assert not provider.degraded
@@ -0,0 +1,107 @@
+import pytest
+from app.pipeline import result_cache
+from app.pipeline.result_cache import MemoryResultCache, SQLiteResultCache, is_cacheable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(ttl=60, max_entries=10):
+        if request.param == "memory":
+            return MemoryResultCache(ttl, max_entries)
+        return SQLiteResultCache(str(tmp_path / "cache.sqlite3"), ttl, max_entries)
+    return make
+
+
+def payload(make):
+    return {"aggregated": {"make": make}, "process": "single_round"}
+
+
+def test_entries_expire_after_the_ttl(make_cache, clock):
+    cache = make_cache(ttl=60)
+    cache.set("a", payload("Ford"))
+
+    clock.now += 59
+    assert cache.get("a") == payload("Ford")
+    clock.now += 2
+    assert cache.get("a") is None
+
+
+def test_least_recently_used_entry_is_evicted(make_cache, clock):
+    cache = make_cache(max_entries=2)
+    cache.set("a", payload("Ford"))
+    clock.now += 1
+    cache.set("b", payload("Kia"))
+    clock.now += 1
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") is not None
+    clock.now += 1
+    cache.set("c", payload("Tesla"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == payload("Ford")
+    assert cache.get("c") == payload("Tesla")
+
+
+def test_returned_payloads_are_copies(make_cache, clock):
+    cache = make_cache()
+    cache.set("a", payload("Ford"))
+    cache.get("a")["aggregated"]["make"] = "Kia"
+    assert cache.get("a") == payload("Ford")
+
+
+def llm_answer(make="Ford", model="F-150"):
+    return {"make": make, "model": model, "year": "2020", "confidence": "high", "details": ""}
+
+
+def full_payload(**overrides):
+    results_payload = {
+        "aggregated": dict(llm_answer(), aggregation_mode="local", conflict=False),
+        "openai": llm_answer(),
+        "gemini": llm_answer(),
+        "custom_model": {"make": "Ford", "confidence": "91.00%"},
+        "process": "single_round",
+    }
+    results_payload.update(overrides)
+    return results_payload
+
+
+def skipped(details):
+    return {"make": "Skipped", "model": "Skipped", "year": "Unknown", "confidence": "none", "details": details}
+
+
+def test_settled_identifications_are_cacheable():
+    assert is_cacheable(full_payload())
+    # Experts the policy chose not to call don't make a result less trustworthy
+    assert is_cacheable(full_payload(gemini=skipped("Skipped: OpenAI and Custom Model agreed"), process="early_exit"))
+
+
+@pytest.mark.parametrize("results_payload", [
+    full_payload(aggregated={"make": "Unknown", "model": "Unknown", "conflict": True}),
+    full_payload(aggregated=dict(llm_answer(), conflict=True)),
+    full_payload(aggregated={"make": "Error", "model": "Error"}),
+    full_payload(aggregated={"make": "Aggregation Error", "model": "Error"}),
+    full_payload(aggregated={"make": "Skipped", "model": "Skipped"}),
+    full_payload(openai={"make": "Error", "model": "Error", "error": "Timed out after 30s"}),
+    full_payload(gemini=skipped("Skipped: provider is degraded")),
+    full_payload(openai={"first_round": llm_answer(), "second_round": {"make": "Error", "error": "boom"}},
+                 process="blackboard_two_rounds"),
+    full_payload(process="degraded"),
+], ids=["local conflict", "conflict", "error", "aggregation error", "skipped", "expert timeout",
+        "degraded provider", "second round error", "degraded"])
+def test_unsettled_or_failed_identifications_are_not_cacheable(results_payload):
+    assert not is_cacheable(results_payload)
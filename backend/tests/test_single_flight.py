@@ -0,0 +1,86 @@
+import threading
+import pytest
+from app.pipeline.single_flight import SingleFlight
+
+
+def start_followers(flight, key, count, outcomes):
+    def follow():
+        try:
+            outcomes.append(flight.do(key, lambda on_event: pytest.fail("follower ran the work")))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=follow) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def wait_for_followers(flight, key, count):
+    # Followers register under the flight's lock before waiting on it
+    while flight._flights[key].followers < count:
+        threading.Event().wait(0.005)
+
+
+def test_followers_share_the_leaders_result_and_events():
+    flight = SingleFlight()
+    release = threading.Event()
+    outcomes, events = [], []
+
+    def work(on_event):
+        on_event("first_round", {"make": "Ford"})
+        release.wait(5)
+        return {"make": "Ford"}
+
+    leader = threading.Thread(target=lambda: outcomes.append(flight.do("k", work)))
+    leader.start()
+    while not flight.in_flight():
+        threading.Event().wait(0.005)
+    follower = threading.Thread(target=lambda: outcomes.append(
+        flight.do("k", lambda on_event: pytest.fail("follower ran the work"),
+                  on_event=lambda event, data: events.append(event))))
+    follower.start()
+    wait_for_followers(flight, "k", 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert sorted(shared for _, shared in outcomes) == [False, True]
+    assert all(result == {"make": "Ford"} for result, _ in outcomes)
+    assert events == ["first_round"]
+    assert flight.in_flight() == 0
+
+
+def test_leader_exception_is_raised_for_every_follower():
+    flight = SingleFlight()
+    release = threading.Event()
+    outcomes = []
+
+    def work(on_event):
+        release.wait(5)
+        raise TimeoutError("expert timed out")
+
+    leader_outcome = []
+
+    def lead():
+        try:
+            flight.do("k", work)
+        except TimeoutError as e:
+            leader_outcome.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    while not flight.in_flight():
+        threading.Event().wait(0.005)
+    followers = start_followers(flight, "k", 3, outcomes)
+    wait_for_followers(flight, "k", 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(leader_outcome) == 1
+    assert len(outcomes) == 3
+    assert all(isinstance(outcome, TimeoutError) for outcome in outcomes)
+    # Nothing is remembered: the next caller leads a fresh attempt
+    assert flight.in_flight() == 0
+    assert flight.do("k", lambda on_event: "retried") == ("retried", False)
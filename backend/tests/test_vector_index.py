@@ -0,0 +1,79 @@
+import multiprocessing
+import numpy as np
+import pytest
+from app.pipeline.vector_index import VectorIndex
+
+
+def label(make, model):
+    return {"make": make, "model": model, "year": "2020"}
+
+
+def unit(dim, i):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def append_in_child(path, rows):
+    index = VectorIndex(path)
+    index.add_many([unit(8, i) for i in rows], [label("Mazda", f"CX-{i}") for i in rows])
+
+
+def compact_in_child(path):
+    VectorIndex(path).compact()
+
+
+def run_child(target, *args):
+    process = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+def test_add_and_search(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    index.add(unit(8, 0), label("Ford", "F-150"))
+    index.add(unit(8, 1), label("Kia", "Sportage"))
+
+    (similarity, best), = index.search(unit(8, 1) * 3, k=1)
+    assert best["make"] == "Kia"
+    assert similarity == pytest.approx(1.0)
+    assert len(index) == 2
+
+
+def test_sees_rows_appended_by_another_process(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    index.add(unit(8, 0), label("Ford", "F-150"))
+
+    run_child(append_in_child, str(tmp_path), [3, 5])
+
+    assert len(index.search(unit(8, 0), k=5)) == 3
+    assert index.search(unit(8, 5), k=1)[0][1]["model"] == "CX-5"
+
+
+def test_compact_drops_duplicates_and_oldest_rows(tmp_path):
+    index = VectorIndex(str(tmp_path), max_entries=2)
+    for _ in range(3):
+        index.add(unit(8, 0), label("Ford", "F-150"))
+    index.add(unit(8, 1), label("Kia", "Sportage"))
+    index.add(unit(8, 2), label("Tesla", "Model 3"))
+
+    assert index.compact() == 3
+    assert len(index) == 2
+    assert sorted(hit[1]["make"] for hit in index.search(unit(8, 1), k=5)) == ["Kia", "Tesla"]
+
+
+def test_reloads_after_another_process_compacts(tmp_path):
+    index = VectorIndex(str(tmp_path))
+    for _ in range(4):
+        index.add(unit(8, 0), label("Ford", "F-150"))
+    index.add(unit(8, 1), label("Kia", "Sportage"))
+    assert len(index.search(unit(8, 0), k=10)) == 5
+
+    run_child(compact_in_child, str(tmp_path))
+
+    neighbours = index.search(unit(8, 0), k=10)
+    assert [hit[1]["make"] for hit in neighbours] == ["Ford", "Kia"]
+
+    index.add(unit(8, 2), label("Tesla", "Model 3"))
+    assert VectorIndex(str(tmp_path)).search(unit(8, 2), k=1)[0][1]["make"] == "Tesla"
@@ -0,0 +1,19 @@
+from app.warmup import WarmUp
+
+
+def test_deferred_steps_wait_for_run_deferred():
+    ran = []
+    warm_up = WarmUp([(name, lambda name=name: ran.append(name)) for name in ("openai", "custom_model")],
+                     deferred=["custom_model"])
+
+    warm_up.run()
+    assert ran == ["openai"]
+    assert warm_up.ready
+    assert warm_up.report()["steps"] == {"openai": "ready", "custom_model": "deferred"}
+
+    warm_up.run_deferred()
+    assert ran == ["openai", "custom_model"]
+    assert warm_up.report()["steps"]["custom_model"] == "ready"
+
+    warm_up.run_deferred()
+    assert ran == ["openai", "custom_model"]
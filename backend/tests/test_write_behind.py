@@ -0,0 +1,85 @@
+import threading
+from app.persistence import WriteBehindQueue
+
+
+class FakeDoc:
+    def __init__(self, path):
+        self.path = path
+
+
+class FakeFirestore:
+    """Records committed batches; the first `failures` commits raise `error`"""
+
+    def __init__(self, failures=0, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.committed = []
+        self.lock = threading.Lock()
+
+    def batch(self):
+        client, writes = self, []
+
+        class Batch:
+            def set(self, doc_ref, fields, merge=False):
+                writes.append((doc_ref.path, fields))
+
+            def commit(self):
+                with client.lock:
+                    if client.failures:
+                        client.failures -= 1
+                        raise client.error("unavailable")
+                    client.committed.append(list(writes))
+
+        return Batch()
+
+    def paths(self):
+        return [path for batch in self.committed for path, _ in batch]
+
+
+def make_queue(client, **kwargs):
+    queue = WriteBehindQueue(lambda: client, **dict({"max_batch": 10, "max_delay": 0.01, "max_retries": 2}, **kwargs))
+    queue.REQUEUE_DELAY = 0.01
+    return queue
+
+
+def test_transient_failures_are_retried():
+    client = FakeFirestore(failures=2)
+    queue = make_queue(client)
+    queue.set(FakeDoc("users/u/identifications/a"), {"n": 1})
+
+    assert queue.flush(timeout=10)
+    assert client.paths() == ["users/u/identifications/a"]
+    assert not queue.has_pending("users/u/identifications/a")
+
+
+def test_batch_is_requeued_in_order_after_retries_run_out():
+    client = FakeFirestore(failures=7)
+    queue = make_queue(client, max_retries=1)
+    queue.set_many([(FakeDoc(f"users/u/identifications/{i}"), {"n": i}) for i in range(3)])
+
+    assert queue.flush(timeout=10)
+    assert client.paths() == [f"users/u/identifications/{i}" for i in range(3)]
+
+
+def test_permanent_failure_is_dropped_without_blocking_later_writes():
+    client = FakeFirestore(failures=1, error=ValueError)
+    queue = make_queue(client, max_delay=0.5)
+    queue.set(FakeDoc("users/u/identifications/bad"), {})
+    assert queue.flush(timeout=10)
+    queue.set(FakeDoc("users/u/identifications/good"), {})
+
+    assert queue.flush(timeout=10)
+    assert client.paths() == ["users/u/identifications/good"]
+
+
+def test_close_flushes_pending_writes():
+    client = FakeFirestore()
+    # Would otherwise wait a minute for company
+    queue = make_queue(client, max_delay=60)
+    for i in range(5):
+        queue.set(FakeDoc(f"users/u/identifications/{i}"), {"n": i})
+    assert client.committed == []
+
+    queue.close()
+    assert len(client.paths()) == 5
+    assert len(client.committed) == 1
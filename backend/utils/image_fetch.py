@@ -0,0 +1,71 @@
+import os
+import requests
+from requests.adapters import HTTPAdapter
+from utils.image_processing import prepare_image
+
+
+class ImageFetchError(ValueError):
+    """Raised when an image can't be downloaded or decoded"""
+
+
+class ImageFetcher:
+    """
+    Downloads an image once per request through a pooled HTTP session,
+    enforcing a size cap while streaming, and decodes it for the experts.
+    """
+
+    def __init__(self, max_bytes=None, timeout=None, pool_size=None):
+        self.max_bytes = max_bytes or int(os.getenv("IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+        self.timeout = timeout or float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+        pool_size = pool_size or int(os.getenv("IMAGE_FETCH_POOL_SIZE", "16"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch_bytes(self, image_url):
+        try:
+            with self.session.get(image_url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+
+                length = response.headers.get("Content-Length")
+                if length and length.isdigit() and int(length) > self.max_bytes:
+                    raise ImageFetchError(f"Image is larger than {self.max_bytes} bytes")
+
+                buffer = bytearray()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    buffer.extend(chunk)
+                    if len(buffer) > self.max_bytes:
+                        raise ImageFetchError(f"Image is larger than {self.max_bytes} bytes")
+                return bytes(buffer)
+        except requests.RequestException as e:
+            raise ImageFetchError(f"Failed to download image: {e}") from e
+
+    def read_upload(self, stream):
+        """Read an image uploaded in the request body, enforcing the same size cap as downloads"""
+        buffer = bytearray()
+        while True:
+            chunk = stream.read(64 * 1024)
+            if not chunk:
+                break
+            buffer.extend(chunk)
+            if len(buffer) > self.max_bytes:
+                raise ImageFetchError(f"Image is larger than {self.max_bytes} bytes")
+        if not buffer:
+            raise ImageFetchError("Uploaded image is empty")
+        return bytes(buffer)
+
+    def decode(self, data, source_url=None):
+        try:
+            return prepare_image(data, source_url=source_url)
+        except Exception as e:
+            raise ImageFetchError(f"Failed to decode image: {e}") from e
+
+    def fetch(self, image_url):
+        """Download and decode an image, returning a PreparedImage"""
+        return self.decode(self.fetch_bytes(image_url), source_url=image_url)
+
+    def receive(self, stream):
+        """Read and decode an uploaded image, returning a PreparedImage"""
+        return self.decode(self.read_upload(stream))
@@ -1,17 +1,101 @@
-from PIL import Image
+import base64
+import os
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageOps
+
+LOGO_MODEL_SIZE = (224, 224)
+
+ENCODE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
 
 def process_image(image_file):
     """
     Process the uploaded image file.
     Returns a processed image that can be used by the AI models.
     
-    This is a minimal implementation that will be expanded later.
+    Applies the EXIF orientation so phone photos are upright, and converts to RGB.
     """
     # Read the image
-    image = Image.open(image_file)
+    image = image_file if isinstance(image_file, Image.Image) else Image.open(image_file)
+
+    # Rotate according to the EXIF orientation tag, as phone galleries do
+    image = ImageOps.exif_transpose(image)
     
     # Convert to RGB if necessary
     if image.mode != 'RGB':
         image = image.convert('RGB')
     
-    return image 
\ No newline at end of file
+    return image
+
+
+class PreparedImage:
+    """
+    An image decoded once and shared by every expert.
+
+    Keeps the original bytes (for hashing) and the decoded, upright RGB image,
+    plus the expert-specific views built from it: a downscaled, re-encoded copy
+    for the LLM experts and a 224x224 array for the logo model.
+    """
+
+    def __init__(self, data, mime_type, image, source_url=None, llm_data=None, llm_mime_type=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.image = image
+        self.source_url = source_url
+        self.llm_data = llm_data if llm_data is not None else data
+        self.llm_mime_type = llm_mime_type or mime_type
+        self.logo_array = np.asarray(image.resize(LOGO_MODEL_SIZE, Image.NEAREST), dtype=np.float32)
+        # Set by the logo model when its runtime exposes the penultimate layer
+        self.logo_embedding = None
+        self._data_url = None
+
+    @property
+    def llm_data_url(self):
+        """base64 data URL of the LLM view, for OpenAI"""
+        if self._data_url is None:
+            encoded = base64.b64encode(self.llm_data).decode('ascii')
+            self._data_url = f"data:{self.llm_mime_type};base64,{encoded}"
+        return self._data_url
+
+
+def encode_for_llm(image, max_edge, encode_format, quality):
+    """Downscale so the long edge is at most max_edge and re-encode compactly"""
+    if max(image.size) > max_edge:
+        image = image.copy()
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    pil_format, mime_type = ENCODE_FORMATS[encode_format]
+    buffer = BytesIO()
+    image.save(buffer, format=pil_format, quality=quality)
+    return buffer.getvalue(), mime_type, image.size
+
+
+def prepare_image(data, source_url=None, max_edge=None, encode_format=None, quality=None):
+    """
+    Decode raw image bytes once, detecting the real format, and build the
+    views the experts need. LLM_IMAGE_MAX_EDGE / LLM_IMAGE_FORMAT /
+    LLM_IMAGE_QUALITY control the LLM copy.
+    """
+    max_edge = max_edge or int(os.getenv("LLM_IMAGE_MAX_EDGE", "1024"))
+    encode_format = encode_format or os.getenv("LLM_IMAGE_FORMAT", "jpeg")
+    quality = quality or int(os.getenv("LLM_IMAGE_QUALITY", "85"))
+
+    original = Image.open(BytesIO(data))
+    mime_type = Image.MIME.get(original.format, 'image/jpeg')
+    original_size = original.size
+    # JPEGs can be decoded straight at a reduced scale, which is far cheaper for phone photos
+    original.draft('RGB', (max_edge, max_edge))
+    original.load()
+    image = process_image(original)
+
+    llm_data, llm_mime_type, llm_size = encode_for_llm(image, max_edge, encode_format, quality)
+    # Already small and upright in a format the LLMs take: keep the original bytes if they're smaller
+    upright = original.getexif().get(0x0112, 1) == 1
+    unchanged = upright and llm_size == original_size
+    if unchanged and len(data) <= len(llm_data) and mime_type in ("image/jpeg", "image/webp", "image/png"):
+        llm_data, llm_mime_type = data, mime_type
+
+    return PreparedImage(data, mime_type, image, source_url, llm_data, llm_mime_type)
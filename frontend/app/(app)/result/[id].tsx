@@ -11,7 +11,7 @@ import {
 	Platform,
 } from 'react-native';
 import { useLocalSearchParams, Stack, router } from 'expo-router';
-import { getIdentificationById } from '@/lib/identification/IdentificationService';
+import { subscribeToIdentification } from '@/lib/identification/IdentificationService';
 import { MaterialIcons } from '@expo/vector-icons';
 import { useSession } from '../../../ctx';
 import { MyDarkTheme } from '@/assets/theme';
@@ -31,7 +31,7 @@ type ExpertResults = {
 	gemini: ResultData | { first_round: ResultData; second_round: ResultData };
 	custom_model: ResultData;
 	aggregated: ResultData;
-	process: 'single_round' | 'blackboard_two_rounds';
+	process: 'single_round' | 'blackboard_two_rounds' | 'degraded';
 };
 
 type UserGuess = {
@@ -110,28 +110,26 @@ export default function ResultScreen() {
 	const [activeTab, setActiveTab] = useState('aggregated');
 	const [expandedSections, setExpandedSections] = useState<string[]>(['main']);
 
-	// Fetch from Firestore instead of parsing params
+	// Listen on Firestore instead of parsing params: the backend can return the
+	// id before the document is written, so keep loading until it shows up
 	useEffect(() => {
-		async function fetchData() {
-			if (!identificationId || !session?.uid) return;
-			setLoading(true);
-			try {
-				const record = await getIdentificationById(
-					session.uid,
-					identificationId
-				);
-				if (record) {
-					setImageUri(record.imageUrl);
-					setUserGuess(record.userGuess);
-					setResults(record.results as ExpertResults);
-				}
-			} catch (error) {
+		if (!identificationId || !session?.uid) return;
+		setLoading(true);
+		return subscribeToIdentification(
+			session.uid,
+			identificationId,
+			(record) => {
+				if (!record) return;
+				setImageUri(record.imageUrl);
+				setUserGuess(record.userGuess);
+				setResults(record.results as ExpertResults);
+				setLoading(false);
+			},
+			(error) => {
 				console.error('Failed to load Firestore result:', error);
-			} finally {
 				setLoading(false);
 			}
-		}
-		fetchData();
+		);
 	}, [identificationId, session?.uid]);
 
 	// Get confidence color
@@ -232,7 +230,7 @@ export default function ResultScreen() {
 					<View style={styles.imageOverlay} />
 					<View style={styles.imageTextContainer}>
 						<Text style={styles.makeModel}>
-							{mainResult.make !== 'Error'
+							{mainResult.make !== 'Error' && mainResult.make !== 'Unknown'
 								? `${mainResult.make} ${mainResult.model}`
 								: 'Unable to identify'}
 						</Text>
@@ -316,7 +314,11 @@ export default function ResultScreen() {
 							<View style={styles.resultRow}>
 								<Text style={styles.resultLabel}>Identification Process:</Text>
 								<Text style={styles.resultValue}>
-									{isBlackboard ? 'Two-round Blackboard' : 'Single round'}
+									{isBlackboard
+										? 'Two-round Blackboard'
+										: results.process === 'degraded'
+										? 'Degraded (experts unavailable)'
+										: 'Single round'}
 								</Text>
 							</View>
 							<View style={styles.detailsContainer}>
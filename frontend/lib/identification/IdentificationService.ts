@@ -7,7 +7,10 @@ import {
 	getDocs,
 	doc,
 	getDoc,
+	onSnapshot,
 	serverTimestamp,
+	DocumentSnapshot,
+	Unsubscribe,
 } from 'firebase/firestore';
 import { db } from '../firebase';
 import { uploadImageToFirebase } from '../image/upload';
@@ -117,25 +120,51 @@ export async function getIdentificationById(
 		);
 		const docSnap = await getDoc(docRef);
 
-		if (docSnap.exists()) {
-			const data = docSnap.data();
-			return {
-				id: docSnap.id,
-				timestamp: data.timestamp,
-				imageUrl: data.imageUrl || data.image_url,
-				userGuess: data.userGuess || data.user_guess,
-				correctGuess: data.correctGuess,
-				results: data.results,
-			};
-		}
-
-		return null;
+		return toIdentificationRecord(docSnap);
 	} catch (error) {
 		console.error('Error fetching identification:', error);
 		throw error;
 	}
 }
 
+/**
+ * Listen to a specific identification. The backend may return the id before
+ * the document is committed, so `onRecord` is called with null until it exists
+ * and again whenever it changes. Returns the function that stops listening.
+ */
+export function subscribeToIdentification(
+	userId: string,
+	identificationId: string,
+	onRecord: (record: IdentificationRecord | null) => void,
+	onError: (error: Error) => void
+): Unsubscribe {
+	const docRef = doc(db, `users/${userId}/identifications/${identificationId}`);
+	return onSnapshot(
+		docRef,
+		(docSnap) => onRecord(toIdentificationRecord(docSnap)),
+		(error) => {
+			console.error('Error listening to identification:', error);
+			onError(error);
+		}
+	);
+}
+
+function toIdentificationRecord(
+	docSnap: DocumentSnapshot
+): IdentificationRecord | null {
+	if (!docSnap.exists()) return null;
+
+	const data = docSnap.data();
+	return {
+		id: docSnap.id,
+		timestamp: data.timestamp,
+		imageUrl: data.imageUrl || data.image_url,
+		userGuess: data.userGuess || data.user_guess,
+		correctGuess: data.correctGuess,
+		results: data.results,
+	};
+}
+
 /**
  * Check if user's guess matches the identified car
  */